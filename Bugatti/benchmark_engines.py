@@ -0,0 +1,91 @@
+# Benchmark of the transform engines on a synthetic inbox
+#
+#   python benchmark_engines.py [--rows 1000000] [--repeat 3]
+#
+# Times the whole-frame stages (group, and enrich with the customer mapping
+# join) of every installed engine on the same rows and checks that their outputs
+# are equal.
+import os
+import io
+import sys
+import time
+import argparse
+import contextlib
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if script_dir not in sys.path:
+    sys.path.insert(0, script_dir)
+
+import numpy as np
+import pandas as pd
+
+from etl.schema import apply_schema
+from etl.stages import get_engine
+from etl.polars_stages import POLARS_ENGINE
+
+def synthetic_rows(rows, customers=5000, models=20000, seed=1):
+    """Extracted rows of a large inbox (about 20 rows per form)."""
+    rng = np.random.default_rng(seed)
+    customer = rng.integers(0, customers, rows)
+    df = pd.DataFrame({
+        'Customer Name': pd.Series(customer).map(lambda i: f"CUSTOMER {i}"),
+        'Customer Code': pd.Series(customer).map(lambda i: f"GB{i:05d}"),
+        'Model Code': pd.Series(rng.integers(0, models, rows)).map(lambda i: f"M{i:06d}.AEK"),
+        'Start Date': rng.choice(['20261101', '20261201', '20270101'], rows),
+        'End Date': rng.choice(['20270131', '20270228', '20270331'], rows),
+        'Additional SOA': rng.integers(100, 5000, rows) / 100,
+        'Source File': pd.Series(np.arange(rows) // 20).map(lambda i: f"form_{i}.xlsx"),
+        'Name of Promotion': rng.choice(['Spring', 'Xmas', 'Black Friday'], rows),
+        'Is WBW': rng.choice(['YES', 'NO'], rows),
+        'Type of Support': rng.choice(['SOA', 'Price Protection', 'Sell Out'], rows),
+        'Expected Sell-Out': rng.integers(0, 100, rows),
+        'Original Row Index': np.arange(rows),
+    })
+    # Repeat a share of the rows so grouping has work to do
+    df = pd.concat([df, df.sample(frac=0.2, random_state=seed)], ignore_index=True)
+    mapping = pd.DataFrame({
+        'Customer Code': [f"GB{i:05d}" for i in range(customers)],
+        'Customer Name': [f"Customer {i}" for i in range(customers)],
+        'Customer Type': 'Retail', 'Requestor': 'Bob', 'Currency': 'GBP',
+    })
+    return apply_schema(df), mapping
+
+def time_stage(func, *args, repeat=3):
+    """Best wall time of a stage over a number of runs, and its last output (stage prints are silenced)."""
+    best, result = None, None
+    for _ in range(repeat):
+        copies = [arg.copy() if isinstance(arg, pd.DataFrame) else arg for arg in args]
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func(*copies)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, apply_schema(result)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the transform engines on synthetic rows.")
+    parser.add_argument("--rows", type=int, default=1000000, help="Extracted rows before duplicates are added")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage (the best time is kept)")
+    args = parser.parse_args(argv)
+
+    engines = ['optimized'] + (['polars'] if POLARS_ENGINE is not None else [])
+    if POLARS_ENGINE is None:
+        print("Polars is not installed; only the pandas engine is timed")
+
+    extracted, mapping = synthetic_rows(args.rows)
+    print(f"{len(extracted)} extracted rows, {len(mapping)} customers")
+
+    outputs = {}
+    for engine in engines:
+        stages = get_engine(engine)
+        group_seconds, grouped = time_stage(stages['group'], extracted, repeat=args.repeat)
+        enrich_seconds, enriched = time_stage(stages['enrich'], grouped, mapping, repeat=args.repeat)
+        outputs[engine] = (grouped, enriched)
+        print(f"  {engine:<10} group {group_seconds:>7.2f}s | enrich {enrich_seconds:>7.2f}s | {len(grouped)} grouped rows")
+
+    if 'polars' in outputs:
+        same = all(a.equals(b) for a, b in zip(outputs['optimized'], outputs['polars']))
+        print(f"Outputs equal: {same}")
+
+if __name__ == "__main__":
+    main()
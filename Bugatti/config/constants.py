@@ -1,79 +1,9 @@
 
 # Constants used across scripts
 
-# Sales PGM Reason Code mapping with all possible input variations
-SALES_PGM_REASON_VARIATIONS = [
-    {"reason_code": "TM_R03", "variations": ["TM_R03", "DISPLAY SUPPORT REBATE"], "pgm_type": "Lumpsum", "product_type": "Division"},
-    {"reason_code": "TM_R12", "variations": ["TM_R12", "NTSI", "ADDITIONAL SELL IN REBATE"], "pgm_type": "Lumpsum", "product_type": "Division"},
-    {"reason_code": "TM_C01", "variations": ["TM_C01", "CO-OP", "COOP", "CO-OP AD", "CO-OP AD.", "CO-OP ADVERTISING", "COP"], "pgm_type": "Lumpsum", "product_type": "Division"},
-    {"reason_code": "TM_P01", "variations": ["TM_P01", "PRICE PROTECTION"], "pgm_type": "Lumpsum", "product_type": "Model"},
-    {"reason_code": "TM_Z02", "variations": ["TM_Z02", "SOA", "SELL OUT SUPPORT REBATE", "A SOA"], "pgm_type": "Lumpsum", "product_type": "Model"},
-]
-
-# Division Prefix map expect GLT and PNT
-DIVISION_PREFIX_MAP = {
-    "CDT": ["DB", "DF"],
-    "CNT": ["GB", "GM", "GS"],
-    "DFT": ["F4", "FW", "FD", "F2", "FH", "LS", "WT", "S3", "W4"]
-}
-
-# Valid Budget Allocations = Divisions
-DIVISION_BUDGET_ALLOCATIONS = {"GNT", "GJT", "GLT", "DFT", "CNT", "GTT", "PNT", "CDT", "PCT", "GKT"}
-
-# AV and TV suffix logic
-AV_SUFFIXES = {
-    "PNT", "DGBRLLK", "CEUSCL2", ".ABEUBK", "AGBRLLK",
-    ".ABEUWH", ".ABSWBK", ".ABSWWH", "AGBRLLX", "BGBRLLK",
-    "EGBRLLK", "BGBRJJK", "ABEUWHF", "CGBRLLK", "AGBRLLZ",
-    "CGBRLBI", "CGBRLBK", "CEUSLLK", "AEUSLLA", "AEUSLLB"
-}
-
-TV_SUFFIXES = {
-    "GLT", ".AEK", "AEKQ", "AEKW", "AEKM", "AEKD"
-}
-
-HS_CODES = {"CDT", "CNT", "DFT"}
-
-# Formatting constants
-ABBREVIATIONS = {"AV", "TV", "SOA", "UK", "EE", "QNED", "OLED", "HDR", "UHD", "AI", "LG", "FOC", "WBW"}
-REMOVE_WORDS = {"CIH", "EXRTIS"}
-
-# Column mapping configuration
-COLUMN_MAPPING_DF_CONFIG = {
-    'Standard Column': [
-        'Customer Code', 'Customer Name', 'Model Code',
-        'Type of Support', 'Additional SOA', 'Expected Sell-Out',
-        'Start Date', 'End Date', 'Expected Cost', 'Name of Promotion'
-    ],
-    'Possible Variations': [
-        ['Customer Code', 'CustomerCode'],
-        ['Customer Name', 'Account', 'CustomerName'],
-        ['Model Code', 'Model.Suffix', 'Model', 'Product Code', 'SKU', 'Product'],
-        ['Type Of Support'],
-        ['SOA/Unit','SOA / unit','Additional SOA', 'DC/Unit',  'DC'],
-        ['Expected Sell-Out', 'Sell-out Estimated QTY','Sell-Out Expected', 'Sell Out', 
-         'Projected Sell', 'QTY', 'Quantity', 'Expected'],
-        ['StartDate'],
-        ['End Date'],
-        ['Expected Cost', 'Total Additional Support AMT'],
-        ['Name of promotion', 'Details', 'Comments']
-    ],
-    'Exclusion Variations': [
-        [],  # Customer Code
-        [],  # Customer Name
-        [],  # Model Code
-        ['SOA', 'INVOICE BEFORE SOA', '① SOA'],  # Type of Support
-        ['Invoice before SOA', 'Current SOA', 'Total SOA''① SOA'],  # Additional SOA
-        ['Expected Sell-In', 'Sell-In Quantity'],  # Expected Sell-Out
-        ['Request Date'],  # Start Date
-        ['Request Date'],  # End Date
-        ['Total SOA'],  # Expected Cost
-        []   # Name of Promotion
-    ]
-}
-
-# Expected keywords for detecting the header row
-EXPECTED_KEYWORDS = ["customer", "account", "model", "sell", "soa", "code", "date"]
+# Business rules (reason code variations, division prefixes, AV/TV suffixes, naming
+# words, column variations, sheet and header keywords) are in config/rules.json
+# and compiled by config/rules.py
 
 # Placeholder counter initialization
 PLACEHOLDER_COUNTERS = {
@@ -85,4 +15,47 @@ PLACEHOLDER_COUNTERS = {
     'End Date': 0,
     'Expected Sell-Out': 0,
     'Additional SOA': 0
-}
\ No newline at end of file
+}
+
+# Per-file budgets for supervised workers (None disables a limit); the memory budget
+# is what a warm worker's memory may grow by during one file
+FILE_TIME_BUDGET_SECONDS = 600
+FILE_MEMORY_BUDGET_MB = 2048
+
+# Streaming: rows per enrich/name/write chunk and rows the workers may hold at once
+STREAM_CHUNK_ROWS = 5000
+MAX_ROWS_IN_FLIGHT = 200000
+
+# PET forms copied to the local scratch directory ahead of processing (0 disables)
+PREFETCH_DEPTH = 2
+
+# Watch mode: seconds between polls of the PetForms folders, and seconds a form's
+# size and modification time must stay unchanged before it is processed
+WATCH_POLL_SECONDS = 10
+WATCH_SETTLE_SECONDS = 30
+
+# Shared work queue: seconds a claim may go untouched before another machine takes
+# the form back, seconds between checks of the queue, and seconds a worker waits
+# on an empty queue before it stops
+QUEUE_LEASE_SECONDS = 300
+QUEUE_POLL_SECONDS = 2
+QUEUE_IDLE_SECONDS = 60
+
+# Concurrent runs: seconds a run waits for another run of the same member to
+# finish, and seconds a member lock may go untouched before it is taken over
+MEMBER_LOCK_TIMEOUT_SECONDS = 1800
+MEMBER_LOCK_STALE_SECONDS = 120
+
+# Locked files (an output open in Excel): attempts, first delay and longest delay
+# between attempts (the delay doubles each time)
+IO_RETRY_ATTEMPTS = 6
+IO_RETRY_DELAY_SECONDS = 0.5
+IO_RETRY_MAX_DELAY_SECONDS = 8
+
+# Rows parsed at a time when reading a CSV PET form
+CSV_CHUNK_ROWS = 50000
+
+# Writer processes: outputs of members with at least this many rows are written
+# in separate processes (smaller ones are written faster than a process starts)
+WRITER_PROCESSES = 2
+WRITER_PROCESS_MIN_ROWS = 20000
@@ -1,40 +1,100 @@
 import sys
 import os
 
-def get_team_member():
-    # Check command line arguments first
-    if len(sys.argv) > 1 and not sys.argv[1].endswith(".py"):
-        return sys.argv[1]
-    
+# Shared drive holding team member folders, CustomerMapping.xlsx and the scripts
+DEFAULT_BASE_DIR = "J:\\SPMS_Registration_Structured"
+
+def get_team_member(argv=None):
+    """
+    Resolve the team member from the command line, the TEAM_MEMBER environment
+    variable or the default.
+
+    Args:
+        argv: Command line arguments to search (defaults to sys.argv[1:])
+    """
+    argv = sys.argv[1:] if argv is None else argv
+
+    # Check command line arguments first (options such as --shadow and
+    # numeric option values such as --time-budget 300 are not member names)
+    for arg in argv:
+        if arg.startswith("-") or arg.endswith(".py") or arg.replace(".", "", 1).isdigit():
+            continue
+        return arg
+
     # Check environment variable
     if "TEAM_MEMBER" in os.environ:
         return os.environ["TEAM_MEMBER"]
-    
+
     # Default to Tima if not specified
     return "Tima"
 
-# Get team member
-TEAM_MEMBER = get_team_member()
+def get_base_dir():
+    """Return the shared base directory (SPMS_BASE_DIR overrides the default drive)."""
+    return os.environ.get("SPMS_BASE_DIR", DEFAULT_BASE_DIR)
+
+def get_scratch_dir():
+    """Return the local scratch directory for prefetched forms and outputs (SPMS_SCRATCH_DIR overrides it)."""
+    import tempfile
+    return os.environ.get("SPMS_SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "spms_scratch"))
+
+def get_checkpoint_dir():
+    """Return the local directory holding the stage checkpoints of runs (SPMS_CHECKPOINT_DIR overrides it)."""
+    return os.environ.get("SPMS_CHECKPOINT_DIR", os.path.join(get_scratch_dir(), "checkpoints"))
+
+def get_snapshot_dir():
+    """Return the local directory holding read snapshots of shared reference files (CustomerMapping.xlsx)."""
+    return os.path.join(get_scratch_dir(), "snapshots")
 
-# Create standard paths used across scripts
-def get_paths():
-    base_dir = "J:\\SPMS_Registration_Structured"
-    member_dir = os.path.join(base_dir, "Team Members", TEAM_MEMBER)
-    
-    paths = {
+def get_queue_dir(base_dir=None):
+    """Return the work queue directory shared by all machines (SPMS_QUEUE_DIR overrides it)."""
+    return os.environ.get("SPMS_QUEUE_DIR", os.path.join(base_dir or get_base_dir(), "Queue"))
+
+def get_history_db():
+    """Return the local SQLite file holding registered promotions (SPMS_HISTORY_DB overrides it)."""
+    return os.environ.get("SPMS_HISTORY_DB", os.path.join(os.path.expanduser("~"), ".spms", "history.sqlite"))
+
+# Standard paths used across scripts
+def get_paths(team_member=None, base_dir=None):
+    """
+    Build the path dictionary for a team member. Nothing is created on disk;
+    call ensure_directories when the folders are needed.
+
+    Args:
+        team_member: Team member folder name (defaults to get_team_member())
+        base_dir: Shared base directory (defaults to get_base_dir())
+    """
+    base_dir = base_dir or get_base_dir()
+    team_member = team_member or get_team_member()
+    member_dir = os.path.join(base_dir, "Team Members", team_member)
+
+    return {
+        "team_member": team_member,
         "base_dir": base_dir,
         "member_dir": member_dir,
         "pet_forms": os.path.join(member_dir, "PetForms"),
         "uploads": os.path.join(member_dir, "Uploads"),
+        "quarantine": os.path.join(member_dir, "Quarantine"),
+        "delta_cache": os.path.join(member_dir, "DeltaCache"),
+        "member_lock": os.path.join(member_dir, "outputs.lock"),
         "scripts_dir": os.path.join(base_dir, "Bugatti")
     }
-    
-    # Create directories if they don't exist
-    for path in paths.values():
-        if path != base_dir and not os.path.isdir(path) and not path.endswith(".py"):
-            os.makedirs(path, exist_ok=True)
-    
-    return paths
-
-# Paths dictionary to use in scripts
-PATHS = get_paths()
\ No newline at end of file
+
+def list_team_members(base_dir=None):
+    """Return the name of every folder under 'Team Members'."""
+    members_dir = os.path.join(base_dir or get_base_dir(), "Team Members")
+    if not os.path.isdir(members_dir):
+        return []
+    return sorted(entry.name for entry in os.scandir(members_dir) if entry.is_dir())
+
+def ensure_directories(paths, keys=("member_dir", "pet_forms", "uploads")):
+    """Create the given member directories if they don't exist."""
+    for key in keys:
+        os.makedirs(paths[key], exist_ok=True)
+
+def __getattr__(name):
+    # TEAM_MEMBER and PATHS are resolved on first use instead of at import
+    if name == "TEAM_MEMBER":
+        return get_team_member()
+    if name == "PATHS":
+        return get_paths()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
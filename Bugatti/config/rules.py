@@ -0,0 +1,187 @@
+# Business rules loaded from a versioned rules file and compiled into lookups
+#
+# The rules (reason code variations, division prefixes, AV/TV suffixes, naming
+# words, column variations, sheet and header keywords) live in a JSON file
+# (YAML when PyYAML is installed) so a rule change needs no code deploy. The file
+# is looked up in SPMS_RULES_FILE, then Rules.json in the shared base directory,
+# then config/rules.json next to this module.
+#
+# At load the rules are compiled into the structures the stages query: reverse
+# dictionaries, frozensets, suffix sets by length and precompiled regexes. The
+# compiled rules are pickled in the scratch directory under the hash of the rules
+# file, so a run only parses and compiles a rules file it has not seen before.
+import os
+import re
+import json
+import pickle
+import hashlib
+
+# Bumped when the compiled structure changes (older cached artifacts are ignored)
+COMPILER_VERSION = 1
+
+RULES_FILE_NAMES = ["Rules.json", "Rules.yaml", "Rules.yml"]
+BUNDLED_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
+REQUIRED_KEYS = [
+    'version', 'sales_pgm_reasons', 'division_prefixes', 'division_budget_allocations', 'av_suffixes',
+    'tv_suffixes', 'hs_codes', 'abbreviations', 'remove_words', 'column_mapping', 'sheet_keywords',
+    'header_keywords',
+]
+
+_current = None
+
+def find_rules_file(base_dir=None):
+    """Return the rules file in use (SPMS_RULES_FILE, the share's Rules.json, or the bundled file)."""
+    from config.paths import get_base_dir
+
+    if os.environ.get("SPMS_RULES_FILE"):
+        return os.environ["SPMS_RULES_FILE"]
+    base_dir = base_dir or get_base_dir()
+    for name in RULES_FILE_NAMES:
+        path = os.path.join(base_dir, name)
+        if os.path.exists(path):
+            return path
+    return BUNDLED_RULES_FILE
+
+def parse_rules(content, file_name):
+    """
+    Parse the text of a rules file.
+
+    Raises:
+        ValueError: If the file cannot be parsed or misses a rule
+    """
+    if file_name.lower().endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{file_name} is YAML but PyYAML is not installed")
+        raw = yaml.safe_load(content)
+    else:
+        raw = json.loads(content)
+    missing = [key for key in REQUIRED_KEYS if key not in (raw or {})]
+    if missing:
+        raise ValueError(f"{file_name} misses: {', '.join(missing)}")
+    return raw
+
+def _suffix_index(suffixes):
+    """Suffixes grouped by length: a code is checked with one set lookup per length."""
+    index = {}
+    for suffix in suffixes:
+        index.setdefault(len(suffix), set()).add(suffix)
+    return [(length, frozenset(group)) for length, group in sorted(index.items())]
+
+def ends_with_any(code, suffix_index):
+    """Whether a code ends with one of the suffixes of a suffix index."""
+    return any(code[-length:] in group for length, group in suffix_index if len(code) >= length)
+
+def _alternation(words):
+    # Longest first, so a word is never shadowed by one of its prefixes
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+def compile_rules(raw, content_hash):
+    """
+    Compile parsed rules into lookup structures.
+
+    Args:
+        raw: Parsed rules file
+        content_hash: Hash of the rules file content
+
+    Returns:
+        Dictionary of compiled rules
+    """
+    # Variation -> (reason code, program type); the first rule listing a variation wins
+    reason_by_variation = {}
+    for item in raw['sales_pgm_reasons']:
+        for variation in item['variations']:
+            reason_by_variation.setdefault(variation, (item['reason_code'], item['pgm_type']))
+
+    # One named group per division, in file order, so the first matching division wins
+    divisions = list(raw['division_prefixes'].items())
+    division_prefix = re.compile("|".join(f"(?P<d{i}>{_alternation(prefixes)})"
+                                          for i, (_, prefixes) in enumerate(divisions) if prefixes))
+
+    column_mapping = raw['column_mapping']
+    return {
+        'version': str(raw['version']),
+        'hash': content_hash,
+        'reason_by_variation': reason_by_variation,
+        'division_prefix': division_prefix,
+        'division_by_group': {f"d{i}": division for i, (division, _) in enumerate(divisions)},
+        'budget_allocations': frozenset(raw['division_budget_allocations']),
+        'budget_allocation_pattern': re.compile(_alternation(raw['division_budget_allocations'])),
+        'av_suffixes': _suffix_index(raw['av_suffixes']),
+        'tv_suffixes': _suffix_index(raw['tv_suffixes']),
+        'hs_codes': frozenset(raw['hs_codes']),
+        'abbreviations': frozenset(raw['abbreviations']),
+        'remove_words': frozenset(raw['remove_words']),
+        'column_mapping_config': {
+            'Standard Column': [entry['standard'] for entry in column_mapping],
+            'Possible Variations': [list(entry['variations']) for entry in column_mapping],
+            'Exclusion Variations': [list(entry.get('exclusions', [])) for entry in column_mapping],
+        },
+        'sheet_keywords': list(raw['sheet_keywords']),
+        'sheet_pattern': re.compile(_alternation(raw['sheet_keywords'])),
+        'header_keywords': list(raw['header_keywords']),
+    }
+
+def load_rules(rules_file, cache_dir=None, current=None):
+    """
+    Load and compile a rules file, reusing its compiled artifact when cached.
+
+    Args:
+        rules_file: JSON (or YAML) rules file
+        cache_dir: Directory of the compiled artifacts (None disables the cache)
+        current: Compiled rules already loaded, returned as they are if the file
+            has not changed
+
+    Returns:
+        Dictionary of compiled rules
+    """
+    with open(rules_file, 'rb') as f:
+        content = f.read()
+    content_hash = hashlib.sha1(content + f"\n{COMPILER_VERSION}".encode()).hexdigest()[:16]
+    if current is not None and current['hash'] == content_hash:
+        return current
+
+    cache_file = os.path.join(cache_dir, f"rules_{content_hash}.pkl") if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass  # Damaged artifact; compiled again below
+
+    rules = compile_rules(parse_rules(content.decode("utf-8-sig"), rules_file), content_hash)
+    if cache_file:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'wb') as f:
+                pickle.dump(rules, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, cache_file)
+        except OSError:
+            pass  # The cache is only a shortcut
+    return rules
+
+def get_rules(base_dir=None, refresh=False):
+    """
+    Compiled rules of the rules file in use. They are loaded once per process;
+    refresh=True reads the rules file again (a run start picks up rule changes).
+
+    Args:
+        base_dir: Shared base directory holding Rules.json (defaults to get_base_dir())
+        refresh: Read the rules file again
+
+    Returns:
+        Dictionary of compiled rules
+    """
+    from config.paths import get_scratch_dir
+
+    global _current
+    if _current is None or refresh:
+        _current = load_rules(find_rules_file(base_dir), os.path.join(get_scratch_dir(), "rules"), _current)
+    return _current
+
+def describe_rules(rules):
+    """Version stamp of compiled rules for the run report."""
+    return f"{rules['version']} ({rules['hash']})"
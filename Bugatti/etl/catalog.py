@@ -0,0 +1,288 @@
+# Inbox catalog: a fast pre-scan of PET forms that reads only the workbook's zip
+# directory and the start of each sheet's XML (no cell data is parsed). Other
+# formats (.xlsb, .xls, .csv) get a coarser entry from their reader.
+import os
+import re
+import json
+import zipfile
+import hashlib
+import posixpath
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from config.rules import get_rules
+from etl.readers import get_reader
+
+# Formats whose sheets are XML parts of a zip (the others are scanned by their reader)
+OPEN_XML_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Bytes of sheet XML read at most while looking for <dimension> and <cols>
+SHEET_HEADER_BYTES = 64 * 1024
+
+# Threads scanning files at the same time (scanning is I/O bound)
+MAX_SCAN_THREADS = 8
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+DIMENSION_PATTERN = re.compile(rb'<(?:\w+:)?dimension\s+ref="([^"]+)"')
+COL_PATTERN = re.compile(rb'<(?:\w+:)?col\s([^>]*)/?>')
+SHEET_DATA_PATTERN = re.compile(rb'<(?:\w+:)?sheetData')
+CELL_REF_PATTERN = re.compile(r'^([A-Z]+)(\d+)$')
+
+def find_matching_sheet(sheet_names):
+    """Return the first sheet whose name contains one of the expected keywords, or None."""
+    sheet_pattern = get_rules()['sheet_pattern']
+    for name in sheet_names:
+        if sheet_pattern.search(name.lower()):
+            return name
+    return None
+
+def _column_number(letters):
+    number = 0
+    for char in letters:
+        number = number * 26 + ord(char) - ord('A') + 1
+    return number
+
+def parse_dimension(ref):
+    """
+    Turn a sheet dimension such as 'A1:T45' into (rows, columns).
+
+    Returns:
+        Tuple (rows, columns), or (None, None) when the reference is missing
+    """
+    if not ref:
+        return None, None
+    cells = ref.upper().replace('$', '').split(':')
+    first = CELL_REF_PATTERN.match(cells[0])
+    last = CELL_REF_PATTERN.match(cells[-1])
+    if not first or not last:
+        return None, None
+    rows = int(last.group(2)) - int(first.group(2)) + 1
+    columns = _column_number(last.group(1)) - _column_number(first.group(1)) + 1
+    return rows, columns
+
+def _part_name(target):
+    """Resolve a relationship target of xl/workbook.xml to a zip member name."""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', target))
+
+def _workbook_parts(zf):
+    """
+    Find the worksheet parts and the shared strings part inside the zip.
+
+    Returns:
+        Tuple (dictionary of sheet name to part, shared strings part or None)
+    """
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    rels = list(ET.fromstring(zf.read('xl/_rels/workbook.xml.rels')).iter(f'{PKG_REL_NS}Relationship'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels}
+
+    parts = {}
+    for sheet in workbook.iter(f'{MAIN_NS}sheet'):
+        parts[sheet.get('name')] = _part_name(targets.get(sheet.get(f'{REL_NS}id'), ''))
+
+    shared_strings = next((_part_name(rel.get('Target')) for rel in rels
+                           if rel.get('Type', '').endswith('/sharedStrings')), None)
+    return parts, shared_strings
+
+def _read_sheet_header(zf, part):
+    """Read the XML before <sheetData> of a worksheet (dimension and column layout)."""
+    header = b''
+    with zf.open(part) as f:
+        while len(header) < SHEET_HEADER_BYTES:
+            block = f.read(4096)
+            if not block:
+                break
+            header += block
+            if SHEET_DATA_PATTERN.search(header):
+                break
+    match = SHEET_DATA_PATTERN.search(header)
+    return header[:match.start()] if match else header
+
+def scan_workbook(file_path):
+    """
+    Pre-scan one PET form without loading its cell data.
+
+    Args:
+        file_path: Path to the PET form
+
+    Returns:
+        Catalog entry: file_path, file_bytes, sheet_names, sheet_name (matching
+        sheet or None), dimension, rows, columns, sheet_bytes (uncompressed XML of
+        the matching sheet, the size estimate), fingerprint, sheet_part,
+        shared_strings_part, data_key (zip CRCs and sizes of the sheet and its
+        shared strings, equal for identical sheet data) and error
+    """
+    entry = {
+        'file_path': file_path,
+        'file_bytes': 0,
+        'sheet_names': [],
+        'sheet_name': None,
+        'dimension': None,
+        'rows': None,
+        'columns': None,
+        'sheet_bytes': 0,
+        'fingerprint': None,
+        'sheet_part': None,
+        'shared_strings_part': None,
+        'data_key': None,
+        'error': None,
+    }
+    if not file_path.lower().endswith(OPEN_XML_EXTENSIONS):
+        return _scan_with_reader(entry)
+    try:
+        entry['file_bytes'] = os.path.getsize(file_path)
+        with zipfile.ZipFile(file_path) as zf:
+            parts, shared_strings = _workbook_parts(zf)
+            entry['sheet_names'] = list(parts)
+            entry['sheet_name'] = find_matching_sheet(entry['sheet_names'])
+
+            cols = []
+            if entry['sheet_name'] is not None:
+                part = parts[entry['sheet_name']]
+                info = zf.getinfo(part)
+                entry['sheet_part'] = part
+                entry['sheet_bytes'] = info.file_size
+                data_key = [info.CRC, info.file_size]
+                if shared_strings is not None and shared_strings in zf.namelist():
+                    strings_info = zf.getinfo(shared_strings)
+                    entry['shared_strings_part'] = shared_strings
+                    data_key += [strings_info.CRC, strings_info.file_size]
+                entry['data_key'] = tuple(data_key)
+                header = _read_sheet_header(zf, part)
+                dimension = DIMENSION_PATTERN.search(header)
+                if dimension:
+                    entry['dimension'] = dimension.group(1).decode()
+                    entry['rows'], entry['columns'] = parse_dimension(entry['dimension'])
+                cols = [match.group(1).decode().strip() for match in COL_PATTERN.finditer(header)]
+
+        # Template fingerprint: sheet names, matching sheet, column count and column layout
+        layout = [entry['sheet_names'], entry['sheet_name'], entry['columns'], cols]
+        entry['fingerprint'] = hashlib.sha1(json.dumps(layout).encode()).hexdigest()[:12]
+    except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError) as e:
+        entry['error'] = f"{type(e).__name__}: {e}"
+
+    return entry
+
+def _scan_with_reader(entry):
+    """
+    Catalog entry of a form that is not Office Open XML: sheet names from its
+    reader (the file name for a CSV), the file size as the size estimate and no
+    dimension or data key.
+    """
+    file_path = entry['file_path']
+    try:
+        entry['file_bytes'] = entry['sheet_bytes'] = os.path.getsize(file_path)
+        reader = get_reader(file_path)
+        if reader is None:
+            raise ValueError("unsupported file type")
+        book = reader.open(file_path)
+        try:
+            entry['sheet_names'] = list(reader.sheet_names(book))
+        finally:
+            reader.close(book)
+        entry['sheet_name'] = entry['sheet_names'][0] if reader.single_sheet \
+            else find_matching_sheet(entry['sheet_names'])
+        layout = [os.path.splitext(file_path)[1].lower(),
+                  [] if reader.single_sheet else entry['sheet_names'], entry['sheet_name'] is not None]
+        entry['fingerprint'] = hashlib.sha1(json.dumps(layout).encode()).hexdigest()[:12]
+    except Exception as e:
+        entry['error'] = f"{type(e).__name__}: {e}"
+    return entry
+
+def sheet_data_digest(entry):
+    """
+    Hash the matching sheet and the shared strings of a catalogued file (cell
+    data only; document properties such as author or save time are ignored).
+
+    Returns:
+        Hex digest, or None if the file cannot be read
+    """
+    digest = hashlib.sha1()
+    try:
+        with zipfile.ZipFile(entry['file_path']) as zf:
+            for part in (entry['sheet_part'], entry['shared_strings_part']):
+                if part is None:
+                    continue
+                with zf.open(part) as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(block)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+    return digest.hexdigest()
+
+def build_catalog(file_paths, max_threads=MAX_SCAN_THREADS):
+    """
+    Pre-scan every PET form of the inbox.
+
+    Args:
+        file_paths: PET forms to scan
+        max_threads: Number of files scanned at the same time
+
+    Returns:
+        Dictionary mapping each file path to its catalog entry
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_threads, len(file_paths))) as executor:
+        entries = list(executor.map(scan_workbook, file_paths))
+    return {entry['file_path']: entry for entry in entries}
+
+def plan_schedule(catalog, file_paths):
+    """
+    Order the files for processing from their catalog entries.
+
+    Files without a matching sheet are left out. The others are batched by
+    template fingerprint, and both the batches and the files within a batch run
+    largest first (by uncompressed sheet size), so the longest files start early
+    on the workers. Files the pre-scan could not read are kept at the end and
+    left to the loader.
+
+    Args:
+        catalog: Dictionary from build_catalog
+        file_paths: PET forms in their original order
+
+    Returns:
+        Tuple (scheduled file paths, skipped catalog entries)
+    """
+    batches = {}
+    unreadable = []
+    skipped = []
+    for file_path in file_paths:
+        entry = catalog.get(file_path)
+        if entry is None or entry['error']:
+            unreadable.append(file_path)
+        elif entry['sheet_name'] is None:
+            skipped.append(entry)
+        else:
+            batches.setdefault(entry['fingerprint'], []).append(entry)
+
+    for entries in batches.values():
+        entries.sort(key=lambda e: e['sheet_bytes'], reverse=True)
+    ordered = sorted(batches.values(), key=lambda entries: entries[0]['sheet_bytes'], reverse=True)
+
+    scheduled = [entry['file_path'] for entries in ordered for entry in entries]
+    return scheduled + unreadable, skipped
+
+def print_catalog_summary(catalog, skipped):
+    """Print the number of files, templates and skipped files of the inbox."""
+    entries = list(catalog.values())
+    templates = {e['fingerprint'] for e in entries if not e['error'] and e['sheet_name'] is not None}
+    total_rows = sum(e['rows'] or 0 for e in entries if e['sheet_name'] is not None)
+    largest = max(entries, key=lambda e: e['sheet_bytes'], default=None)
+
+    print(f"📋 Catalog: {len(entries)} file(s), {len(templates)} template(s), ~{total_rows} rows, "
+          f"{len(skipped)} without a matching sheet")
+    if largest is not None and largest['sheet_bytes']:
+        print(f"   Largest: {os.path.basename(largest['file_path'])} "
+              f"({largest['dimension'] or 'no dimension'}, {largest['sheet_bytes'] / (1024 * 1024):.1f} MB of sheet XML)")
+    for entry in skipped:
+        print(f"No matching sheet found in {os.path.basename(entry['file_path'])}. "
+              f"Sheets: {', '.join(entry['sheet_names'])}")
+    for entry in entries:
+        if entry['error']:
+            print(f"⚠️ Could not pre-scan {os.path.basename(entry['file_path'])}: {entry['error']}")
@@ -0,0 +1,250 @@
+# Stage checkpoints of a run, so a crashed run resumes from its last completed stage
+#
+# With --checkpoint two outputs of every file are saved in a run directory: its
+# expanded rows (what the workers return after extract, group and expand) and
+# its named rows (after enrich and name), with a manifest listing what each file
+# and member has reached. Frames are saved as Arrow IPC files (read back
+# memory-mapped) when pyarrow is installed, and pickled otherwise. --resume
+# continues the latest run from the furthest checkpoint of each file;
+# --from-stage re-runs from a given stage, e.g. only the writers after a
+# MassUpload template change.
+import os
+import json
+import shutil
+import pickle
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from etl.schema import apply_schema
+
+# Checkpointed stages in pipeline order: 'expanded' rows come out of the workers,
+# 'named' rows are ready for the writers
+CHECKPOINT_STAGES = ['expanded', 'named']
+
+# First stage re-run by --from-stage, and the checkpoint it starts from
+FROM_STAGES = {'extract': None, 'enrich': 'expanded', 'write': 'named'}
+
+# Checkpoint runs kept in the checkpoint directory (oldest are removed first)
+KEEP_CHECKPOINT_RUNS = 3
+
+MANIFEST_FILE = "manifest.json"
+
+def _file_stamp(file_path):
+    """Size and modification time of a PET form (a checkpoint is only reused for the same file)."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def save_frame(df, path_base):
+    """
+    Save a DataFrame as an Arrow IPC file, or a pickle when pyarrow is missing or
+    cannot hold a column.
+
+    Returns:
+        File name of the saved frame
+    """
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            path = f"{path_base}.arrow"
+            with pa.OSFile(f"{path}.tmp", 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(f"{path}.tmp", path)
+            return os.path.basename(path)
+        except (pa.ArrowException, TypeError, ValueError):
+            pass
+    path = f"{path_base}.pkl"
+    with open(f"{path}.tmp", 'wb') as f:
+        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{path}.tmp", path)
+    return os.path.basename(path)
+
+def load_frame(path):
+    """Load a frame saved by save_frame (Arrow files are memory-mapped), with the compact dtypes."""
+    if path.endswith('.arrow'):
+        with pa.memory_map(path, 'r') as source:
+            df = pa.ipc.open_file(source).read_all().to_pandas()
+    else:
+        with open(path, 'rb') as f:
+            df = pickle.load(f)
+    return apply_schema(df)
+
+def _run_names(root):
+    """Names of the checkpoint runs under root, oldest first."""
+    return sorted(entry.name for entry in os.scandir(root) if entry.is_dir() and entry.name.startswith("run_"))
+
+def _read_manifest(run_dir):
+    """Manifest of a checkpoint directory, or None if it has none."""
+    try:
+        with open(os.path.join(run_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class CheckpointStore:
+    """Run directory holding the stage checkpoints of one run and their manifest."""
+
+    def __init__(self, run_dir, manifest=None):
+        """
+        Args:
+            run_dir: Directory of the run's checkpoints
+            manifest: Manifest of a previous run continued in this directory
+        """
+        self.run_dir = run_dir
+        self.manifest = manifest or {'created': datetime.now().isoformat(timespec='seconds'),
+                                     'files': {}, 'published': []}
+        os.makedirs(run_dir, exist_ok=True)
+
+    @classmethod
+    def create(cls, root, engine):
+        """Start a new checkpoint run under root, removing the oldest runs."""
+        os.makedirs(root, exist_ok=True)
+        runs = _run_names(root)
+        for name in runs[:max(0, len(runs) - KEEP_CHECKPOINT_RUNS + 1)]:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        store = cls(os.path.join(root, datetime.now().strftime("run_%Y%m%d_%H%M%S_%f")))
+        store.manifest['engine'] = engine
+        store._save_manifest()
+        return store
+
+    @classmethod
+    def latest(cls, root):
+        """Open the latest checkpoint run under root, or return None."""
+        if not os.path.isdir(root):
+            return None
+        for name in reversed(_run_names(root)):
+            manifest = _read_manifest(os.path.join(root, name))
+            if manifest is not None:
+                return cls(os.path.join(root, name), manifest)
+        return None
+
+    @classmethod
+    def open(cls, run_dir):
+        """Open a checkpoint directory kept across runs (watch mode), creating it if needed."""
+        store = cls(run_dir, _read_manifest(run_dir))
+        store._save_manifest()
+        return store
+
+    def _save_manifest(self):
+        """Rewrite the manifest atomically."""
+        temp_file = os.path.join(self.run_dir, f"{MANIFEST_FILE}.tmp")
+        with open(temp_file, 'w', encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(temp_file, os.path.join(self.run_dir, MANIFEST_FILE))
+
+    def _record(self, file_path):
+        """Manifest record of a file, reset when the file changed since it was checkpointed."""
+        stamp = _file_stamp(file_path)
+        record = self.manifest['files'].get(file_path)
+        if record is None or record.get('stamp') != stamp:
+            record = self.manifest['files'][file_path] = {'stamp': stamp, 'stages': {}}
+        record.pop('registered', None)
+        return record
+
+    def save(self, file_path, stage, df, meta=None):
+        """
+        Checkpoint a stage output of one file.
+
+        Args:
+            file_path: PET form the rows come from
+            stage: One of CHECKPOINT_STAGES
+            df: Rows of the file at the end of the stage
+            meta: Optional picklable dictionary saved with the rows (content
+                signature and delta of the form)
+        """
+        record = self._record(file_path)
+        key = hashlib.sha1(file_path.encode()).hexdigest()[:16]
+        if meta:
+            record['meta'] = f"{key}_meta.pkl"
+            with open(os.path.join(self.run_dir, record['meta']), 'wb') as f:
+                pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        record['stages'][stage] = {'file': save_frame(df, os.path.join(self.run_dir, f"{key}_{stage}")),
+                                   'rows': len(df)}
+        self._save_manifest()
+
+    def record_chunks(self, file_path, stage, chunks):
+        """
+        Pass chunks through and checkpoint them together once the last one is out.
+
+        Yields:
+            The chunks unchanged
+        """
+        seen = []
+        for chunk in chunks:
+            seen.append(chunk.copy())
+            yield chunk
+        if seen:
+            self.save(file_path, stage, apply_schema(pd.concat(seen, ignore_index=True)))
+
+    def forget(self, file_path):
+        """Remove the checkpoints of a form (it left the inbox)."""
+        record = self.manifest['files'].pop(file_path, None)
+        if record is None:
+            return
+        names = [entry['file'] for entry in record['stages'].values()] + ([record['meta']] if 'meta' in record else [])
+        for name in names:
+            try:
+                os.remove(os.path.join(self.run_dir, name))
+            except OSError:
+                pass
+        self._save_manifest()
+
+    def mark_registered(self, file_paths):
+        """Record that the checkpointed rows of these forms were added to the history."""
+        for file_path in file_paths:
+            record = self.manifest['files'].get(file_path)
+            if record is not None and 'named' in record['stages']:
+                record['registered'] = True
+        self._save_manifest()
+
+    def mark_published(self, team_member):
+        """Record that a member's outputs are on the share."""
+        if team_member not in self.manifest['published']:
+            self.manifest['published'].append(team_member)
+            self._save_manifest()
+
+    def is_published(self, team_member):
+        return team_member in self.manifest['published']
+
+    def outcome(self, file_path, stages=CHECKPOINT_STAGES):
+        """
+        Rebuild the outcome of a file from its furthest checkpoint.
+
+        Args:
+            file_path: PET form to look up
+            stages: Checkpoint stages that may be used
+
+        Returns:
+            Outcome dictionary ('checkpoint' gives the stage the rows come from),
+            or None if the file has no usable checkpoint
+        """
+        record = self.manifest['files'].get(file_path)
+        if record is None or record.get('stamp') != _file_stamp(file_path):
+            return None
+        for stage in reversed(CHECKPOINT_STAGES):
+            entry = record['stages'].get(stage)
+            if stage not in stages or entry is None:
+                continue
+            try:
+                df = load_frame(os.path.join(self.run_dir, entry['file']))
+                meta = {}
+                if 'meta' in record:
+                    with open(os.path.join(self.run_dir, record['meta']), 'rb') as f:
+                        meta = pickle.load(f)
+            except Exception as e:
+                print(f"⚠️ Checkpoint of {os.path.basename(file_path)} could not be read: {e}")
+                continue
+            return {'file_path': file_path, 'status': 'ok', 'result': df, 'checkpoint': stage,
+                    'shadow': None, 'footprint': None, 'signature': meta.get('signature'),
+                    'delta': meta.get('delta'), 'registered': record.get('registered', False) and stage == 'named',
+                    'note': f'Resumed from {stage} checkpoint'}
+        return None
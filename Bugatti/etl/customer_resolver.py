@@ -0,0 +1,141 @@
+# Resolve rows whose Customer Code is missing or unknown from their Customer Name
+#
+# The names of CustomerMapping.xlsx are indexed once by character trigram
+# (blocking): a name is only scored against the accounts sharing the most
+# trigrams with it, never against the whole mapping. Names sharing a block are
+# scored against it in one matrix call (rapidfuzz's process.cdist).
+import re
+from collections import Counter
+
+try:
+    from rapidfuzz import fuzz, process
+    from rapidfuzz.process import cdist
+except ImportError:
+    # Fallback to fuzzywuzzy if rapidfuzz is not available (no matrix scorer)
+    from fuzzywuzzy import fuzz, process
+    cdist = None
+
+# Minimum score (0-100) for a name to be resolved
+CUSTOMER_MATCH_THRESHOLD = 90
+
+# Candidate accounts scored per name (those sharing the most trigrams)
+MAX_CANDIDATES = 50
+
+# Trigrams found in more than this share of the names are too common to block on
+MAX_BUCKET_SHARE = 0.2
+
+# Words that do not tell accounts apart
+NAME_STOPWORDS = {'ltd', 'limited', 'plc', 'inc', 'llc', 'gmbh', 'ag', 'sa', 'sas', 'bv', 'nv', 'co', 'company',
+                  'the', 'and', 'uk', 'group'}
+
+def normalize_customer_name(name):
+    """Lowercase a customer name and drop punctuation and legal-form words."""
+    words = re.sub(r'[^0-9a-z]+', ' ', str(name).lower()).split()
+    kept = [word for word in words if word not in NAME_STOPWORDS]
+    return " ".join(kept or words)
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class CustomerNameIndex:
+    """Blocking index of the customer names of the mapping."""
+
+    def __init__(self, df_mapping):
+        """
+        Args:
+            df_mapping: Customer mapping DataFrame with Customer Code and Customer Name
+        """
+        self.codes = []
+        self.names = []
+        self.buckets = {}
+        if 'Customer Name' not in df_mapping.columns:
+            return
+
+        accounts = df_mapping[['Customer Code', 'Customer Name']].dropna()
+        for code, name in accounts.itertuples(index=False, name=None):
+            normalized = normalize_customer_name(name)
+            if not normalized:
+                continue
+            position = len(self.names)
+            self.codes.append(code)
+            self.names.append(normalized)
+            for gram in _trigrams(normalized):
+                self.buckets.setdefault(gram, []).append(position)
+
+        # Drop buckets shared by too many names to narrow anything down
+        limit = max(MAX_CANDIDATES, int(MAX_BUCKET_SHARE * len(self.names)))
+        self.buckets = {gram: positions for gram, positions in self.buckets.items() if len(positions) <= limit}
+
+    def candidates(self, normalized):
+        """Positions of the names sharing the most trigrams with a normalized name."""
+        shared = Counter()
+        for gram in _trigrams(normalized):
+            shared.update(self.buckets.get(gram, ()))
+        return [position for position, _ in shared.most_common(MAX_CANDIDATES)]
+
+    def best_matches(self, queries, block, threshold):
+        """
+        Score normalized names against one block of the mapping.
+
+        Args:
+            queries: Normalized names sharing the block
+            block: Positions of the candidate names
+            threshold: Minimum score for a match
+
+        Returns:
+            (position, score) of the best candidate of each query, None when none reaches the threshold
+        """
+        choices = [self.names[p] for p in block]
+        if cdist is None:
+            # One extractOne per name; choices keyed by position give the position back
+            keyed = dict(zip(block, choices))
+            matches = [process.extractOne(query, keyed, scorer=fuzz.WRatio, score_cutoff=threshold)
+                       for query in queries]
+            return [(match[2], match[1]) if match else None for match in matches]
+
+        # Scores below the cutoff come back as 0
+        scores = cdist(queries, choices, scorer=fuzz.WRatio, score_cutoff=threshold)
+        best = scores.argmax(axis=1)
+        return [(block[j], scores[i, j]) if scores[i, j] else None for i, j in enumerate(best)]
+
+    def resolve(self, names, threshold=CUSTOMER_MATCH_THRESHOLD):
+        """
+        Match customer names against the mapping.
+
+        Args:
+            names: Customer names to resolve
+            threshold: Minimum score for a match
+
+        Returns:
+            Dictionary mapping each resolved name to (Customer Code, score)
+        """
+        # Names normalizing alike are scored once, names with the same block together
+        by_normalized = {}
+        for name in set(names):
+            normalized = normalize_customer_name(name)
+            if normalized:
+                by_normalized.setdefault(normalized, []).append(name)
+        by_block = {}
+        for normalized in by_normalized:
+            block = tuple(sorted(self.candidates(normalized)))
+            if block:
+                by_block.setdefault(block, []).append(normalized)
+
+        resolved = {}
+        for block, queries in by_block.items():
+            for normalized, match in zip(queries, self.best_matches(queries, block, threshold)):
+                if match is None:
+                    continue
+                position, score = match
+                for name in by_normalized[normalized]:
+                    resolved[name] = (self.codes[position], round(float(score), 1))
+        return resolved
+
+_index_cache = []
+
+def get_customer_index(df_mapping):
+    """Return the index of a mapping, building it on first use (the mapping is loaded once per run)."""
+    if not _index_cache or _index_cache[0][0] is not df_mapping:
+        _index_cache[:] = [(df_mapping, CustomerNameIndex(df_mapping))]
+    return _index_cache[0][1]
@@ -0,0 +1,169 @@
+# Duplicate PET forms: the same form sent twice under different file names
+#
+# Two levels are checked:
+#   - identical sheet data, found from the catalog (zip CRCs of the sheet and its
+#     shared strings) before anything is processed
+#   - identical cleaned content (header-aligned cell values, ignoring file
+#     metadata and title rows), found from the content signature each file gets
+#     right after loading; near-identical forms are reported with their differing rows
+import os
+import hashlib
+from collections import Counter
+
+import pandas as pd
+
+# Share of rows two forms must have in common to be reported as near-identical
+NEAR_DUPLICATE_SHARE = 0.8
+
+# Columns shown to identify a differing row in the report
+ROW_LABEL_COLUMNS = ['Customer Code', 'Model Code', 'Start Date', 'End Date', 'Expected Sell-Out', 'Additional SOA']
+
+def form_signature(cleaned_df):
+    """
+    Build the content signature of a cleaned PET form.
+
+    Args:
+        cleaned_df: DataFrame returned by load_and_clean_excel
+
+    Returns:
+        Dictionary with content_hash, row_hashes (one per data row) and
+        row_labels (key values of each row, for the report)
+    """
+    values = cleaned_df.astype(str)
+    row_hashes = pd.util.hash_pandas_object(values, index=False).tolist()
+
+    digest = hashlib.sha1()
+    digest.update("|".join(map(str, cleaned_df.columns)).encode())
+    digest.update(pd.Series(row_hashes, dtype='uint64').to_numpy().tobytes())
+
+    label_columns = [col for col in ROW_LABEL_COLUMNS if col in values.columns]
+    labels = [" | ".join(row) for row in zip(*(values[col].tolist() for col in label_columns))] if label_columns else [""] * len(values)
+
+    return {'content_hash': digest.hexdigest(), 'row_hashes': row_hashes, 'row_labels': labels}
+
+def identical_sheet_groups(catalog, file_paths):
+    """
+    Group files whose matching sheet holds byte-identical data.
+
+    Candidates share the zip CRC and size of the sheet and its shared strings;
+    they are confirmed by hashing the parts.
+
+    Args:
+        catalog: Dictionary from etl.catalog.build_catalog
+        file_paths: Files to compare, in their original order
+
+    Returns:
+        List of groups (lists of file paths in original order, first one kept)
+    """
+    from etl.catalog import sheet_data_digest
+
+    candidates = {}
+    for file_path in file_paths:
+        entry = catalog.get(file_path)
+        if entry and not entry['error'] and entry.get('data_key'):
+            candidates.setdefault(entry['data_key'], []).append(file_path)
+
+    groups = []
+    for paths in candidates.values():
+        if len(paths) < 2:
+            continue
+        confirmed = {}
+        for file_path in paths:
+            digest = sheet_data_digest(catalog[file_path])
+            if digest is not None:
+                confirmed.setdefault(digest, []).append(file_path)
+        groups.extend(group for group in confirmed.values() if len(group) > 1)
+    return groups
+
+def _row_differences(signature, other_signature):
+    """Rows present in only one of two forms (as many times as they are missing)."""
+    rows, other_rows = Counter(signature['row_hashes']), Counter(other_signature['row_hashes'])
+    only_here, only_there = rows - other_rows, other_rows - rows
+
+    def pick(sig, missing):
+        picked = []
+        for position, row_hash in enumerate(sig['row_hashes']):
+            if missing.get(row_hash, 0) > 0:
+                missing[row_hash] -= 1
+                picked.append((position + 1, sig['row_labels'][position]))
+        return picked
+
+    return pick(signature, dict(only_here)), pick(other_signature, dict(only_there))
+
+class DuplicateTracker:
+    """
+    Keeps the content signatures of one member's accepted forms.
+
+    When two forms have identical content the one earliest in the inbox order is
+    kept, whatever order they finish in.
+    """
+
+    def __init__(self, near_share=NEAR_DUPLICATE_SHARE):
+        self.near_share = near_share
+        self.accepted = {}
+        self.duplicates = []
+        self.near_duplicates = []
+
+    def add_identical(self, file_path, kept_path, reason):
+        """Record a file dropped before processing."""
+        self.duplicates.append({'File': os.path.basename(file_path), 'Duplicate Of': os.path.basename(kept_path),
+                                'Reason': reason})
+
+    def check(self, file_path, order, signature):
+        """
+        Check a processed form against the accepted ones.
+
+        Args:
+            file_path: Path of the form
+            order: Position of the form in the inbox order
+            signature: Dictionary from form_signature
+
+        Returns:
+            Tuple (status, other_path): ('new', None), ('duplicate', kept path) when
+            the form must be dropped, or ('replaces', dropped path) when an accepted
+            later form must be dropped in favour of this one
+        """
+        for other_path, (other_order, other_signature) in self.accepted.items():
+            if other_signature['content_hash'] != signature['content_hash']:
+                continue
+            if order > other_order:
+                self.add_identical(file_path, other_path, 'Identical content')
+                return 'duplicate', other_path
+            del self.accepted[other_path]
+            self.accepted[file_path] = (order, signature)
+            self.add_identical(other_path, file_path, 'Identical content')
+            return 'replaces', other_path
+
+        self._record_near_duplicates(file_path, signature)
+        self.accepted[file_path] = (order, signature)
+        return 'new', None
+
+    def _record_near_duplicates(self, file_path, signature):
+        rows = len(signature['row_hashes'])
+        for other_path, (_, other_signature) in self.accepted.items():
+            other_rows = len(other_signature['row_hashes'])
+            if not rows or not other_rows or min(rows, other_rows) < self.near_share * max(rows, other_rows):
+                continue
+            shared = sum((Counter(signature['row_hashes']) & Counter(other_signature['row_hashes'])).values())
+            if shared < self.near_share * max(rows, other_rows):
+                continue
+
+            only_here, only_there = _row_differences(signature, other_signature)
+            for name, diff in ((file_path, only_here), (other_path, only_there)):
+                for row_number, label in diff:
+                    self.near_duplicates.append({
+                        'File': os.path.basename(file_path), 'Similar To': os.path.basename(other_path),
+                        'Shared Rows': shared, 'Row Only In': os.path.basename(name),
+                        'Form Row': row_number, 'Row': label,
+                    })
+            print(f"🔁 {os.path.basename(file_path)} is nearly identical to {os.path.basename(other_path)} "
+                  f"({shared} shared rows, {len(only_here) + len(only_there)} differing)")
+
+    def duplicates_df(self):
+        """Files dropped as duplicates."""
+        return pd.DataFrame(self.duplicates, columns=['File', 'Duplicate Of', 'Reason'])
+
+    def near_duplicates_df(self):
+        """Differing rows of near-identical forms."""
+        return pd.DataFrame(self.near_duplicates, columns=['File', 'Similar To', 'Shared Rows', 'Row Only In',
+                                                           'Form Row', 'Row'])
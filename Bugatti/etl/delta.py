@@ -0,0 +1,202 @@
+# Row-level delta processing: a revised version of a PET form only registers the
+# lines that are new or changed since the version processed before
+#
+# The grouped rows of every processed form are cached per member. A new form is
+# matched to its previous version by its customer codes and promotion names, or
+# else by its file name without the version suffix ("Argos Xmas v2.xlsx" ->
+# "argos xmas"), and diffed on the group_similar_rows key columns.
+import os
+import re
+import json
+import pickle
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+
+from etl.schema import to_output
+
+# group_similar_rows key columns identifying a line (Source File changes between versions)
+DELTA_KEY_COLUMNS = ['Customer Name', 'Customer Code', 'Model Code', 'Start Date', 'End Date',
+                     'Additional SOA', 'Name of Promotion', 'Is WBW']
+
+# Values of a line compared between versions
+DELTA_VALUE_COLUMNS = ['Expected Sell-Out', 'Type of Support', 'WBW TV MODEL']
+
+# Version suffixes stripped from file names: "v2", "ver 3", "rev2", "(1)", "final", ...
+VERSION_SUFFIX_PATTERN = re.compile(
+    r'(?:[\s_\-.]*\b(?:v|ver|version|rev|revision)[\s_\-.]*\d+|\s*\(\d+\)|[\s_\-.]+(?:final|updated|revised|new))$',
+    re.IGNORECASE
+)
+
+CACHE_INDEX_FILE = "index.json"
+
+def version_name_key(file_path):
+    """Return the file name without extension and version suffixes, lowercased."""
+    name = os.path.splitext(os.path.basename(file_path))[0].strip().lower()
+    while True:
+        stripped = VERSION_SUFFIX_PATTERN.sub('', name).strip(' _-.')
+        if stripped == name or not stripped:
+            return name
+        name = stripped
+
+def form_identity(grouped_df):
+    """Identify a form by its customer codes and promotion names."""
+    def values(col):
+        if col not in grouped_df.columns:
+            return ''
+        return ",".join(sorted({str(v).strip().upper() for v in grouped_df[col].dropna().tolist()}))
+    return f"{values('Customer Code')}|{values('Name of Promotion')}"
+
+def _line_keys(df, columns):
+    """Text version of the given columns (output values, so dtypes do not matter)."""
+    columns = [col for col in columns if col in df.columns]
+    return to_output(df[columns]).astype(str).reset_index(drop=True)
+
+def diff_grouped(grouped_df, previous_df):
+    """
+    Diff the grouped rows of a form against its previous version.
+
+    Args:
+        grouped_df: Output of the group stage for the new version
+        previous_df: Cached output of the group stage for the previous version
+
+    Returns:
+        Tuple (positions of new rows, positions of changed rows, positions of
+        removed previous rows, number of unchanged rows)
+    """
+    key_cols = [col for col in DELTA_KEY_COLUMNS if col in grouped_df.columns and col in previous_df.columns]
+    value_cols = [col for col in DELTA_VALUE_COLUMNS if col in grouped_df.columns and col in previous_df.columns]
+
+    new_lines = _line_keys(grouped_df, key_cols + value_cols)
+    old_lines = _line_keys(previous_df, key_cols + value_cols)
+    new_lines['_new'] = range(len(new_lines))
+    old_lines['_old'] = range(len(old_lines))
+
+    merged = new_lines.merge(old_lines, on=key_cols, how='outer', suffixes=('', ' (Previous)'), indicator=True)
+    both = merged[merged['_merge'] == 'both']
+    differs = pd.Series(False, index=both.index)
+    for col in value_cols:
+        differs |= both[col] != both[f"{col} (Previous)"]
+
+    added = merged.loc[merged['_merge'] == 'left_only', '_new'].astype(int).tolist()
+    changed = both.loc[differs, '_new'].astype(int).tolist()
+    removed = merged.loc[merged['_merge'] == 'right_only', '_old'].astype(int).tolist()
+    return sorted(added), sorted(changed), sorted(removed), int((~differs).sum())
+
+def _read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, CACHE_INDEX_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def find_previous_version(cache_dir, identity, name_key):
+    """
+    Find the cached previous version of a form.
+
+    Returns:
+        Tuple (index record, matched by 'customer and promotion' or 'file name'),
+        or (None, None)
+    """
+    index = _read_index(cache_dir)
+    for matched_by, field, value in (('customer and promotion', 'identity', identity),
+                                     ('file name', 'name_key', name_key)):
+        for record in index.values():
+            if record.get(field) == value:
+                return record, matched_by
+    return None, None
+
+def diff_against_previous(grouped_df, file_path, cache_dir):
+    """
+    Reduce the grouped rows of a form to the lines that are new or changed since
+    its previous version.
+
+    Args:
+        grouped_df: Output of the group stage
+        file_path: Path to the PET form (its name is used for version matching)
+        cache_dir: Member folder caching the grouped rows of processed forms
+
+    Returns:
+        Tuple (grouped rows to expand, delta dictionary with identity, name_key,
+        previous (source file or None), matched_by, the New/Changed/Unchanged/Removed
+        counts, removed (previous rows no longer present) and grouped (all rows,
+        cached once the member's outputs are published))
+    """
+    identity, name_key = form_identity(grouped_df), version_name_key(file_path)
+    delta = {'identity': identity, 'name_key': name_key, 'previous': None, 'matched_by': None,
+             'New': len(grouped_df), 'Changed': 0, 'Unchanged': 0, 'Removed': 0,
+             'removed': None, 'grouped': grouped_df}
+
+    record, matched_by = find_previous_version(cache_dir, identity, name_key)
+    if record is None:
+        return grouped_df, delta
+    try:
+        with open(os.path.join(cache_dir, record['cache_file']), 'rb') as f:
+            previous_df = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        print(f"⚠️ Could not read the previous version of {os.path.basename(file_path)}: {e}; processing all lines")
+        return grouped_df, delta
+
+    added, changed, removed, unchanged = diff_grouped(grouped_df, previous_df)
+    delta.update(previous=record['source_file'], matched_by=matched_by, New=len(added), Changed=len(changed),
+                 Unchanged=unchanged, Removed=len(removed), removed=previous_df.iloc[removed].reset_index(drop=True))
+    print(f"➡️ Delta against {record['source_file']} (matched by {matched_by}): {len(added)} new, "
+          f"{len(changed)} changed, {unchanged} unchanged, {len(removed)} removed")
+    return grouped_df.iloc[sorted(added + changed)].reset_index(drop=True), delta
+
+def save_versions(cache_dir, deltas):
+    """
+    Cache the grouped rows of processed forms as the previous version of their
+    next revision (each replaces the cached version it was matched with).
+
+    Args:
+        cache_dir: Member folder caching the grouped rows of processed forms
+        deltas: Dictionary mapping each file path to its delta dictionary
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index = _read_index(cache_dir)
+    for file_path, delta in deltas.items():
+        for key, record in list(index.items()):
+            if record.get('identity') == delta['identity'] or record.get('name_key') == delta['name_key']:
+                del index[key]
+                try:
+                    os.remove(os.path.join(cache_dir, record['cache_file']))
+                except OSError:
+                    pass
+
+        key = hashlib.sha1(f"{delta['identity']}\n{delta['name_key']}".encode()).hexdigest()[:16]
+        cache_file = f"{key}.pkl"
+        temp_file = os.path.join(cache_dir, f"{cache_file}.{os.getpid()}.tmp")
+        with open(temp_file, 'wb') as f:
+            pickle.dump(delta['grouped'], f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, os.path.join(cache_dir, cache_file))
+        index[key] = {'identity': delta['identity'], 'name_key': delta['name_key'], 'cache_file': cache_file,
+                      'source_file': os.path.basename(file_path), 'saved': datetime.now().isoformat(timespec='seconds')}
+
+    temp_index = os.path.join(cache_dir, f"{CACHE_INDEX_FILE}.{os.getpid()}.tmp")
+    with open(temp_index, 'w', encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(temp_index, os.path.join(cache_dir, CACHE_INDEX_FILE))
+
+def delta_summary_df(deltas):
+    """One row per processed form with the line counts of its delta."""
+    rows = [
+        {'File': os.path.basename(file_path), 'Previous Version': delta['previous'] or '',
+         'Matched By': delta['matched_by'] or '', 'New': delta['New'], 'Changed': delta['Changed'],
+         'Unchanged': delta['Unchanged'], 'Removed': delta['Removed']}
+        for file_path, delta in deltas.items()
+    ]
+    return pd.DataFrame(rows, columns=['File', 'Previous Version', 'Matched By', 'New', 'Changed', 'Unchanged', 'Removed'])
+
+def removed_lines_df(deltas):
+    """Lines of previous versions that are no longer in their new version."""
+    frames = []
+    for file_path, delta in deltas.items():
+        if delta['removed'] is not None and not delta['removed'].empty:
+            removed = to_output(delta['removed'])
+            removed.insert(0, 'Removed In', os.path.basename(file_path))
+            frames.append(removed)
+    if not frames:
+        return pd.DataFrame(columns=['Removed In'] + DELTA_KEY_COLUMNS + DELTA_VALUE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
@@ -2,6 +2,13 @@ import pandas as pd
 from datetime import datetime
 import calendar
 
+# Columns identifying similar rows (Is WBW is added when present)
+GROUP_COLUMNS = [
+    'Customer Name', 'Customer Code', 'Model Code',
+    'Start Date', 'End Date', 'Additional SOA',
+    'Source File', 'Name of Promotion'
+]
+
 def get_apply_months_and_days(start, end):
     """
     Calculate the months and days covered by a date range.
@@ -57,6 +64,68 @@ def get_apply_months_and_days(start, end):
         
     return months
 
+def split_quantity_by_month(qty, months):
+    """
+    Split a quantity across apply months.
+    Handles special cases for 1–5 units and uses proportional logic for larger quantities.
+
+    Args:
+        qty: Whole number of units to distribute
+        months: List of (month_string, days_in_month) tuples
+
+    Returns:
+        List with the quantity for each month
+    """
+    total_days = sum(d for _, d in months)
+    month_count = len(months)
+
+    # Distribution logic
+    dist_qty = []
+
+    if qty == 1:
+        dist_qty = [1] * month_count
+    elif qty == 2:
+        if month_count == 1:
+            dist_qty = [2]
+        elif month_count == 2:
+            dist_qty = [1, 1]
+        else:
+            dist_qty = [1] * min(qty, month_count) + [0] * (month_count - qty)
+    elif qty == 3:
+        if month_count == 1:
+            dist_qty = [3]
+        elif month_count == 2:
+            dist_qty = [2, 1]
+        else:
+            dist_qty = [1] * 3 + [0] * (month_count - 3)
+    elif qty == 4:
+        if month_count >= 4:
+            dist_qty = [1] * 4 + [0] * (month_count - 4)
+        else:
+            dist_qty = [0] * month_count
+            month_indices = sorted(range(month_count), key=lambda i: months[i][1], reverse=True)
+            for i in range(qty):
+                dist_qty[month_indices[i % month_count]] += 1
+    elif qty == 5:
+        if month_count >= 5:
+            dist_qty = [1] * 5 + [0] * (month_count - 5)
+        else:
+            dist_qty = [0] * month_count
+            month_indices = sorted(range(month_count), key=lambda i: months[i][1], reverse=True)
+            for i in range(qty):
+                dist_qty[month_indices[i % month_count]] += 1
+    else:
+        # For larger quantities, distribute proportionally based on days
+        dist_qty = []
+        remaining = qty
+        for i, (_, days) in enumerate(months[:-1]):
+            part = round(qty * days / total_days)
+            dist_qty.append(part)
+            remaining -= part
+        dist_qty.append(max(0, remaining))  # ensure total matches qty
+
+    return dist_qty
+
 def group_similar_rows(extracted_df):
     """
     Group similar rows using the original logic.
@@ -71,11 +140,7 @@ def group_similar_rows(extracted_df):
     extracted_df = extracted_df.copy()
     
     # Define grouping columns
-    group_cols = [
-        'Customer Name', 'Customer Code', 'Model Code', 
-        'Start Date', 'End Date', 'Additional SOA', 
-        'Source File', 'Name of Promotion'
-    ]
+    group_cols = list(GROUP_COLUMNS)
     
     # Add 'Is WBW' to grouping if it exists
     if 'Is WBW' in extracted_df.columns:
@@ -94,8 +159,9 @@ def group_similar_rows(extracted_df):
     # Print before grouping stats
     print(f"➡️ Before grouping: {len(extracted_df)} rows, {extracted_df['Expected Sell-Out'].sum()} units")
     
-    # Perform the grouping
-    grouped_df = extracted_df.groupby(group_cols, as_index=False).agg(agg_dict)
+    # Perform the grouping (observed=True: only combinations present in the data
+    # when the keys are categorical)
+    grouped_df = extracted_df.groupby(group_cols, as_index=False, observed=True).agg(agg_dict)
     
     # Print after grouping stats
     print(f"➡️ After grouping: {len(grouped_df)} rows, {grouped_df['Expected Sell-Out'].sum()} units")
@@ -126,54 +192,8 @@ def distribute_quantities_by_month(grouped_df):
                 expanded_rows.append(row_copy)
                 continue
 
-            total_days = sum(d for _, d in months)
             qty = int(row['Expected Sell-Out'])
-            month_count = len(months)
-
-            # Distribution logic
-            dist_qty = []
-
-            if qty == 1:
-                dist_qty = [1] * month_count
-            elif qty == 2:
-                if month_count == 1:
-                    dist_qty = [2]
-                elif month_count == 2:
-                    dist_qty = [1, 1]
-                else:
-                    dist_qty = [1] * min(qty, month_count) + [0] * (month_count - qty)
-            elif qty == 3:
-                if month_count == 1:
-                    dist_qty = [3]
-                elif month_count == 2:
-                    dist_qty = [2, 1]
-                else:
-                    dist_qty = [1] * 3 + [0] * (month_count - 3)
-            elif qty == 4:
-                if month_count >= 4:
-                    dist_qty = [1] * 4 + [0] * (month_count - 4)
-                else:
-                    dist_qty = [0] * month_count
-                    month_indices = sorted(range(month_count), key=lambda i: months[i][1], reverse=True)
-                    for i in range(qty):
-                        dist_qty[month_indices[i % month_count]] += 1
-            elif qty == 5:
-                if month_count >= 5:
-                    dist_qty = [1] * 5 + [0] * (month_count - 5)
-                else:
-                    dist_qty = [0] * month_count
-                    month_indices = sorted(range(month_count), key=lambda i: months[i][1], reverse=True)
-                    for i in range(qty):
-                        dist_qty[month_indices[i % month_count]] += 1
-            else:
-                # For larger quantities, distribute proportionally based on days
-                dist_qty = []
-                remaining = qty
-                for i, (_, days) in enumerate(months[:-1]):
-                    part = round(qty * days / total_days)
-                    dist_qty.append(part)
-                    remaining -= part
-                dist_qty.append(max(0, remaining))  # ensure total matches qty
+            dist_qty = split_quantity_by_month(qty, months)
 
             # Create new rows
             for (month, _), qty_month in zip(months, dist_qty):
@@ -194,3 +214,55 @@ def distribute_quantities_by_month(grouped_df):
         return expanded_df.sort_values(by='Original Row Index').reset_index(drop=True)
     else:
         return pd.DataFrame()
+
+def expand_by_apply_month(grouped_df):
+    """
+    Expands a grouped DataFrame by apply month and distributes quantities.
+    Same rules as distribute_quantities_by_month, but apply months are calculated
+    once per distinct date range and the output is built with a single take.
+
+    Args:
+        grouped_df: Grouped DataFrame with Start Date and End Date columns
+
+    Returns:
+        Expanded DataFrame with apply month and distributed quantities
+    """
+    if grouped_df.empty:
+        return pd.DataFrame()
+
+    months_cache = {}
+    positions, apply_months, quantities, errors = [], [], [], []
+
+    rows = zip(grouped_df['Start Date'].tolist(), grouped_df['End Date'].tolist(), grouped_df['Expected Sell-Out'].tolist())
+    for pos, (start, end, qty) in enumerate(rows):
+        try:
+            key = (start, end)
+            if key not in months_cache:
+                months_cache[key] = get_apply_months_and_days(start, end)
+            months = months_cache[key]
+            if not months:
+                positions.append(pos)
+                apply_months.append('NA')
+                quantities.append(qty)
+                errors.append('Could not calculate apply months')
+                continue
+
+            dist_qty = split_quantity_by_month(int(qty), months)
+            for (month, _), qty_month in zip(months, dist_qty):
+                positions.append(pos)
+                apply_months.append(month)
+                quantities.append(qty_month)
+                errors.append('')
+
+        except Exception as e:
+            positions.append(pos)
+            apply_months.append('NA')
+            quantities.append(qty)
+            errors.append(f"Expansion error: {e}")
+
+    expanded_df = grouped_df.iloc[positions].copy()
+    expanded_df['Expected Sell-Out'] = quantities
+    expanded_df['Apply Month'] = apply_months
+    expanded_df['Errors in Combined Extract'] = errors
+    # Same (unstable) sort as the legacy expansion, so the months of a line come out in the same order
+    return expanded_df.sort_values(by='Original Row Index').reset_index(drop=True)
@@ -0,0 +1,155 @@
+# History of registered promotions: an embedded SQLite store of every combined
+# row written to MassUpload, so later runs can flag (or leave out) rows that were
+# already uploaded
+import os
+import sqlite3
+from datetime import datetime
+
+from etl.schema import to_output
+
+# Columns identifying a registered row, as stored in the history
+HISTORY_KEY_COLUMNS = ['Customer Code', 'Model Code', 'Apply Month', 'PromotionName']
+
+# Extra columns kept with each row for lookups by hand
+HISTORY_DETAIL_COLUMNS = ['Source File', 'Expected Sell-Out', 'Additional SOA']
+
+# Seconds a run waits for another run holding the write lock
+BUSY_TIMEOUT_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registered_rows (
+    id INTEGER PRIMARY KEY,
+    customer_code TEXT NOT NULL,
+    model_code TEXT NOT NULL,
+    apply_month TEXT NOT NULL,
+    promotion_name TEXT NOT NULL,
+    source_file TEXT,
+    expected_sell_out TEXT,
+    additional_soa TEXT,
+    team_member TEXT,
+    run_id TEXT NOT NULL,
+    registered_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS registered_rows_key
+    ON registered_rows (customer_code, model_code, apply_month, promotion_name);
+"""
+
+class HistoryStore:
+    """
+    Rows registered by earlier runs, in a local SQLite database.
+
+    Rows of the current run are staged in a temporary table and only become
+    history once their member's MassUpload has been published (commit_member), so
+    a failed run never marks rows as uploaded. Lookups only see earlier runs.
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: SQLite database file (created if missing)
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.run_id = f"{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}"
+        self.flagged = {}
+        self.conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript("""
+            CREATE TEMP TABLE pending_rows (
+                team_member TEXT, customer_code TEXT, model_code TEXT, apply_month TEXT, promotion_name TEXT,
+                source_file TEXT, expected_sell_out TEXT, additional_soa TEXT
+            );
+            CREATE TEMP TABLE chunk_keys (
+                position INTEGER, customer_code TEXT, model_code TEXT, apply_month TEXT, promotion_name TEXT
+            );
+        """)
+
+    @staticmethod
+    def _values(chunk, columns):
+        """Output text of the given columns (missing columns become 'NA')."""
+        out = to_output(chunk[[col for col in columns if col in chunk.columns]])
+        return [out[col].astype(str).tolist() if col in out.columns else ['NA'] * len(chunk) for col in columns]
+
+    def previously_uploaded(self, chunk):
+        """
+        Check which rows of a chunk were registered by an earlier run.
+
+        Args:
+            chunk: Enriched and named rows
+
+        Returns:
+            List of booleans, one per row
+        """
+        keys = self._values(chunk, HISTORY_KEY_COLUMNS)
+        self.conn.execute("DELETE FROM chunk_keys")
+        self.conn.executemany("INSERT INTO chunk_keys VALUES (?, ?, ?, ?, ?)", zip(range(len(chunk)), *keys))
+        found = {position for (position,) in self.conn.execute("""
+            SELECT k.position FROM chunk_keys k
+            WHERE EXISTS (
+                SELECT 1 FROM registered_rows r
+                WHERE r.customer_code = k.customer_code AND r.model_code = k.model_code
+                  AND r.apply_month = k.apply_month AND r.promotion_name = k.promotion_name
+            )
+        """)}
+        return [position in found for position in range(len(chunk))]
+
+    def stage(self, team_member, chunk):
+        """Stage the rows of a chunk for the member's commit."""
+        values = self._values(chunk, HISTORY_KEY_COLUMNS + HISTORY_DETAIL_COLUMNS)
+        self.conn.executemany("INSERT INTO pending_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              zip([team_member] * len(chunk), *values))
+
+    def discard(self, team_member, source_file):
+        """Drop the staged rows of one file (a file found to be a duplicate)."""
+        self.conn.execute("DELETE FROM pending_rows WHERE team_member = ? AND source_file = ?",
+                          (team_member, source_file))
+
+    def commit_member(self, team_member):
+        """
+        Move the member's staged rows into the history.
+
+        Returns:
+            Number of rows registered
+        """
+        registered_at = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            cursor = self.conn.execute("""
+                INSERT INTO registered_rows (customer_code, model_code, apply_month, promotion_name, source_file,
+                                             expected_sell_out, additional_soa, team_member, run_id, registered_at)
+                SELECT customer_code, model_code, apply_month, promotion_name, source_file,
+                       expected_sell_out, additional_soa, team_member, ?, ?
+                FROM pending_rows WHERE team_member = ?
+            """, (self.run_id, registered_at, team_member))
+            self.conn.execute("DELETE FROM pending_rows WHERE team_member = ?", (team_member,))
+        return cursor.rowcount
+
+    def drop_member(self, team_member):
+        """Forget the member's staged rows (its outputs were not published)."""
+        self.conn.execute("DELETE FROM pending_rows WHERE team_member = ?", (team_member,))
+
+    def close(self):
+        """Close the database (staged rows not committed are forgotten)."""
+        self.conn.close()
+
+def mark_previously_uploaded(chunks, store, team_member):
+    """
+    Add the 'Previously Uploaded' flag to each chunk and stage the rows not
+    registered yet (flagged rows are already in the history, whether or not
+    they go to MassUpload again).
+
+    Args:
+        chunks: Iterable of enriched and named chunks
+        store: HistoryStore
+        team_member: Member the rows belong to
+
+    Yields:
+        The chunks with a 'Previously Uploaded' column
+    """
+    for chunk in chunks:
+        chunk['Previously Uploaded'] = store.previously_uploaded(chunk)
+        store.flagged[team_member] = store.flagged.get(team_member, 0) + int(chunk['Previously Uploaded'].sum())
+        store.stage(team_member, chunk[~chunk['Previously Uploaded']])
+        yield chunk
@@ -4,47 +4,76 @@ import os
 import glob
 import sys
 
-from config.constants import EXPECTED_KEYWORDS, COLUMN_MAPPING_DF_CONFIG
+from config.rules import get_rules
+from etl.readers import get_reader
 from utils.fuzzy_match import find_header_row, clean_column_name, get_single_fuzzy_match, fuzzy_match_columns
 
+_column_mapping_dfs = {}
+
 def init_column_mapping_df():
-    """Create the column mapping DataFrame from configuration."""
-    df = pd.DataFrame(COLUMN_MAPPING_DF_CONFIG)
-    
-    # Clean variations in mapping table
-    df['Possible Variations'] = df['Possible Variations'].apply(
-        lambda lst: [clean_column_name(x) for x in lst]
-    )
+    """Create the column mapping DataFrame from the rules (built once per rules version and reused)."""
+    rules = get_rules()
+    if rules['hash'] not in _column_mapping_dfs:
+        df = pd.DataFrame(rules['column_mapping_config'])
+        
+        # Clean variations in mapping table
+        df['Possible Variations'] = df['Possible Variations'].apply(
+            lambda lst: [clean_column_name(x) for x in lst]
+        )
+        _column_mapping_dfs[rules['hash']] = df
     
-    return df
+    return _column_mapping_dfs[rules['hash']]
 
-def load_and_clean_excel(filepath, expected_keywords=EXPECTED_KEYWORDS, threshold=85):
+def load_and_clean_excel(filepath, expected_keywords=None, threshold=85, sheet_name=None):
     """
-    Load an Excel file and clean it by finding the header row and standardizing column names.
+    Load a PET form and clean it by finding the header row and standardizing column names.
+    
+    The form is read by the reader of its extension (etl.readers: .xlsx, .xlsm,
+    .xlsb, .xls or .csv); every format goes through the same header detection and
+    column mapping.
     
     Args:
-        filepath: Path to the Excel file
-        expected_keywords: Keywords to detect header row
+        filepath: Path to the PET form
+        expected_keywords: Keywords to detect header row (defaults to the rules' header keywords)
         threshold: Fuzzy matching threshold
+        sheet_name: Matching sheet found by the catalog pre-scan (skips the
+            sheet lookup)
         
     Returns:
         Cleaned DataFrame or None if processing failed
     """
     column_mapping_df = init_column_mapping_df()
+    if expected_keywords is None:
+        expected_keywords = get_rules()['header_keywords']
+    
+    reader = get_reader(filepath)
+    if reader is None:
+        print(f"Unsupported file type: {os.path.basename(filepath)}")
+        return None
     
     try:
-        # Try to find the correct sheet
-        xl = pd.ExcelFile(filepath)
-        expected_sheet_keywords = ['pet form', 'spgm request', 'av spgm']
-        matching_sheets = [s for s in xl.sheet_names if any(keyword in s.lower() for keyword in expected_sheet_keywords)]
-        
-        if not matching_sheets:
-            print(f"No matching sheet found in {os.path.basename(filepath)}.")
-            return None
-            
-        sheet_to_use = matching_sheets[0]
-        print(f"Reading sheet: {sheet_to_use}")
-        raw_df = pd.read_excel(filepath, sheet_name=sheet_to_use, header=None)
+        book = reader.open(filepath)
+        try:
+            sheet_names = reader.sheet_names(book)
+            if reader.single_sheet:
+                sheet_to_use = sheet_names[0]
+            elif sheet_name is not None and sheet_name in sheet_names:
+                sheet_to_use = sheet_name
+            else:
+                # Try to find the correct sheet (no hint, or a stale one: the sheet
+                # was renamed since the pre-scan)
+                sheet_pattern = get_rules()['sheet_pattern']
+                matching_sheets = [s for s in sheet_names if sheet_pattern.search(s.lower())]
+                
+                if not matching_sheets:
+                    print(f"No matching sheet found in {os.path.basename(filepath)}.")
+                    return None
+                
+                sheet_to_use = matching_sheets[0]
+            print(f"Reading sheet: {sheet_to_use}")
+            raw_df = reader.read(book, sheet_to_use)
+        finally:
+            reader.close(book)
     except Exception as e:
         print(f"Error reading {filepath}: {e}")
         return None
@@ -95,4 +124,25 @@ def load_and_clean_excel(filepath, expected_keywords=EXPECTED_KEYWORDS, threshol
     # Standardize column names
     df = fuzzy_match_columns(df, column_mapping_df, threshold=threshold)
     
-    return df
\ No newline at end of file
+    return df
+
+def load_customer_mapping(mapping_file):
+    """
+    Load the customer mapping used to enrich rows with Customer Type, Requestor and Currency.
+    
+    Args:
+        mapping_file: Path to CustomerMapping.xlsx
+        
+    Returns:
+        DataFrame with one row per Customer Code (empty mapping if the file cannot be read)
+    """
+    try:
+        df_mapping = pd.read_excel(mapping_file)
+        df_mapping['Customer Code'] = df_mapping['Customer Code'].astype(str).str.strip().str.upper()
+        # Drop duplicates from mapping to keep only the first match
+        df_mapping = df_mapping.drop_duplicates(subset='Customer Code', keep='first')
+    except Exception as e:
+        print(f"Error loading customer mapping: {e}")
+        df_mapping = pd.DataFrame(columns=['Customer Code', 'Customer Type', 'Requestor', 'Currency'])
+    
+    return df_mapping
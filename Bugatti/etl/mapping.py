@@ -1,11 +1,5 @@
 # Functions for mapping metadata and handling suffix rules
-from config.constants import (
-    SALES_PGM_REASON_VARIATIONS,
-    DIVISION_PREFIX_MAP,
-    DIVISION_BUDGET_ALLOCATIONS,
-    AV_SUFFIXES,
-    TV_SUFFIXES
-)
+from config.rules import get_rules, ends_with_any
 
 def map_all_promo_metadata(model_code, support_input):
     """
@@ -18,26 +12,25 @@ def map_all_promo_metadata(model_code, support_input):
     Returns:
         Tuple of (budget_allocation, product_type, reason_code, pgm_type)
     """
+    rules = get_rules()
     try:
         model_code = str(model_code).strip().upper()
         support_input = str(support_input).strip().upper()
 
         # Step 1: Identify Budget Allocation
-        if any(model_code.endswith(suffix) for suffix in AV_SUFFIXES):
+        if ends_with_any(model_code, rules['av_suffixes']):
             budget_allocation = "PNT"
-        elif any(model_code.endswith(suffix) for suffix in TV_SUFFIXES):
+        elif ends_with_any(model_code, rules['tv_suffixes']):
             budget_allocation = "GLT"
-        elif model_code in DIVISION_BUDGET_ALLOCATIONS:
+        elif model_code in rules['budget_allocations']:
             budget_allocation = model_code
         else:
-            budget_allocation = "NA"
-            for division, prefixes in DIVISION_PREFIX_MAP.items():
-                if any(model_code.startswith(prefix) for prefix in prefixes):
-                    budget_allocation = division
-                    break
+            # First division (in rules order) with a matching prefix
+            match = rules['division_prefix'].match(model_code)
+            budget_allocation = rules['division_by_group'].get(match.lastgroup, "NA") if match else "NA"
 
         # Step 2: Determine Product Type directly from Product Code content
-        product_type = "Division" if any(div in model_code for div in DIVISION_BUDGET_ALLOCATIONS) else "Model"
+        product_type = "Division" if rules['budget_allocation_pattern'].search(model_code) else "Model"
 
         # Step 3: Map Reason Code and Sales PGM Type
         reason_code = "NA"
@@ -49,11 +42,7 @@ def map_all_promo_metadata(model_code, support_input):
             pgm_type = "Lumpsum"
         else:
             # Normal mapping logic
-            for item in SALES_PGM_REASON_VARIATIONS:
-                if support_input in item["variations"]:
-                    reason_code = item["reason_code"]
-                    pgm_type = item["pgm_type"]
-                    break
+            reason_code, pgm_type = rules['reason_by_variation'].get(support_input, ("NA", "NA"))
 
         return budget_allocation, product_type, reason_code, pgm_type
 
@@ -75,11 +64,12 @@ def classify_model_code(model_code):
     """
     if not isinstance(model_code, str):
         return "UNKNOWN"
-        
-    if any(model_code.endswith(sfx) for sfx in AV_SUFFIXES):
+    
+    rules = get_rules()
+    if ends_with_any(model_code, rules['av_suffixes']):
         return "AV"
         
-    if any(model_code.endswith(sfx) for sfx in TV_SUFFIXES):
+    if ends_with_any(model_code, rules['tv_suffixes']):
         return "TV"
         
     return "NA"
\ No newline at end of file
@@ -0,0 +1,384 @@
+# The work of one team member in a run
+#
+# A MemberJob collects the outcomes of the member's forms into its writers,
+# closes the writers once every form is done, and publishes the outputs to the
+# share. The history, delta cache and checkpoints are committed only when every
+# output was written and published.
+import os
+
+from config.paths import ensure_directories
+from config.constants import STREAM_CHUNK_ROWS, WRITER_PROCESS_MIN_ROWS
+
+# Added to the output names of a member of which only some forms are processed
+# (--files/--since), so the outputs holding all of its forms are not replaced
+SELECTION_SUFFIX = " - Selection"
+
+def output_names(output_format='xlsx', partial=False):
+    """
+    File names of the combined file and of MassUpload.
+
+    Args:
+        output_format: Format of the combined rows ('xlsx' or 'csv')
+        partial: Whether only some of the member's forms are processed
+
+    Returns:
+        Tuple (combined file name, MassUpload file name)
+    """
+    suffix = SELECTION_SUFFIX if partial else ""
+    return f"CombinedExtractedColumns{suffix}.{output_format}", f"MassUpload{suffix}.xlsx"
+
+class MemberJob:
+    """Forms, writers and reports of one team member in a run."""
+
+    def __init__(self, paths, excel_files, local_dir, shadow=False, memory_report=False, delta=False,
+                 history=None, suppress_uploaded=False, checkpoints=None, output_format='xlsx', last_stage='write',
+                 partial=False):
+        """
+        Create the member's folders. The previous outputs stay in place until
+        the new ones are published over them.
+
+        Args:
+            paths: Path dictionary from config.paths.get_paths
+            excel_files: PET forms of this member
+            local_dir: Local folder the outputs are written to before they are published
+            shadow: Whether a shadow report is produced
+            memory_report: Whether the memory footprint of the stages is reported
+            delta: Whether only lines changed since a form's previous version are registered
+            history: HistoryStore flagging rows uploaded by earlier runs, or None
+            suppress_uploaded: Whether rows uploaded by earlier runs are left out of MassUpload
+            checkpoints: CheckpointStore of the run, or None
+            output_format: Format of the combined rows ('xlsx' or 'csv')
+            last_stage: Last stage run; before 'write' only the checkpoints are saved
+            partial: Whether only some of the member's forms are processed
+        """
+        from etl.stages import ENGINES
+        from etl.shadow import ShadowRecorder
+        from etl.dedup import DuplicateTracker
+        from etl.overlaps import OverlapIndex
+
+        print(f"Running script for team member: {paths['team_member']}")
+        print(f"Source folder: {paths['pet_forms']}")
+        print(f"Output folder: {paths['uploads']}")
+
+        # Make sure output directories exist
+        ensure_directories(paths)
+        os.makedirs(local_dir, exist_ok=True)
+
+        combined_name, mass_upload_name = output_names(output_format, partial)
+        self.paths = paths
+        self.team_member = paths['team_member']
+        self.files = list(excel_files)
+        self.order = {file_path: index for index, file_path in enumerate(excel_files)}
+        self.local_dir = local_dir
+        self.output_format = output_format
+        self.partial = partial
+        self.last_stage = last_stage
+        self.combined_file = os.path.join(paths['member_dir'], combined_name)
+        self.mass_upload_file = os.path.join(paths['uploads'], mass_upload_name)
+        self.mass_upload_template = os.path.join(paths['uploads'], "MassUpload.xlsx")
+        self.shadow_report_file = os.path.join(paths['member_dir'], "ShadowReport.xlsx")
+        self.duplicate_report_file = os.path.join(paths['member_dir'], "DuplicateForms.xlsx")
+        self.delta_report_file = os.path.join(paths['member_dir'], "DeltaReport.xlsx")
+        self.recorder = ShadowRecorder(ENGINES['legacy'], ENGINES['optimized']) if shadow else None
+        self.footprint = [] if memory_report else None
+        self.dedup = DuplicateTracker()
+        self.overlaps = OverlapIndex()
+        self.deltas = {} if delta else None
+        self.history = history
+        self.suppress_uploaded = suppress_uploaded
+        self.checkpoints = checkpoints
+        self.unknown_models = {}
+        self.writers = None
+        self.writes = []
+        self.unpublished = []
+        self.quarantined = []
+        self.rows = 0
+        self.remaining = len(excel_files)
+
+        print(f"Found {len(excel_files)} files. Processing...")
+
+    def local_output(self, output_file):
+        """Local path an output is written to before it is published."""
+        return os.path.join(self.local_dir, os.path.basename(output_file))
+
+    def collect(self, outcome, df_mapping, engine='legacy', chunk_rows=STREAM_CHUNK_ROWS, product_master=None):
+        """
+        Stream the result of one processed file into the writers, chunk by chunk.
+
+        A form with the same content as another form of the member is written
+        once, and outcomes rebuilt from a 'named' checkpoint go straight to the
+        writers.
+
+        Args:
+            outcome: Outcome dictionary of one file
+            df_mapping: Customer mapping DataFrame (shared by all members)
+            engine: Stage implementations to use ('legacy', 'optimized' or 'polars')
+            chunk_rows: Maximum rows per enrich/name/write chunk
+            product_master: ModelCodeIndex validating the model codes, or None
+        """
+        from etl.history import mark_previously_uploaded
+        from etl.product_master import check_model_codes
+        from etl.pipeline import make_stage_runner, stream_rows, write_rows, iter_chunks
+
+        self.remaining -= 1
+        file_path = outcome['file_path']
+        source_file = os.path.basename(file_path)
+        if outcome['status'] == 'quarantined':
+            self.quarantined.append(source_file)
+            return
+        if self.recorder is not None and outcome['shadow']:
+            self.recorder.timings.extend(outcome['shadow'][0])
+            self.recorder.mismatches.extend(outcome['shadow'][1])
+        if self.footprint is not None and outcome['footprint']:
+            self.footprint.extend(outcome['footprint'])
+        delta = outcome.get('delta')
+        if self.deltas is not None and delta and 'identity' in delta:
+            self.deltas[file_path] = delta
+
+        expanded_df = outcome['result']
+        if expanded_df is None:
+            return
+        checkpoints = self.checkpoints
+        if checkpoints is not None and not outcome.get('checkpoint'):
+            checkpoints.save(file_path, 'expanded', expanded_df,
+                             meta={'signature': outcome.get('signature'), 'delta': delta})
+        if expanded_df.empty:
+            if delta and delta.get('previous'):
+                print(f"No new or changed lines in: {source_file}")
+            else:
+                print(f"No valid rows found for expansion in: {source_file}")
+            return
+
+        # Stopped before the writers (--only-stage/--skip-stage): only checkpoints are kept
+        if self.last_stage != 'write':
+            if self.last_stage == 'enrich' and outcome.get('checkpoint') != 'named':
+                run_stage = make_stage_runner(engine, self.recorder, self.footprint)
+                chunks = stream_rows([(source_file, expanded_df)], run_stage, df_mapping, chunk_rows)
+                if product_master is not None:
+                    chunks = check_model_codes(chunks, product_master, self.unknown_models)
+                self.rows += sum(len(chunk) for chunk in checkpoints.record_chunks(file_path, 'named', chunks))
+            else:
+                self.rows += len(expanded_df)
+            return
+
+        if outcome.get('signature') and not self._keep_form(file_path, outcome['signature']):
+            return
+
+        # Open the writers on the first rows of the member
+        if self.writers is None:
+            self.writers = self._open_writers()
+
+        if outcome.get('checkpoint') == 'named':
+            # Columns added by options of the checkpointed run that are off in this one
+            optional = {'Model Code Suggestion': product_master, 'Previously Uploaded': self.history}
+            expanded_df = expanded_df.drop(columns=[col for col, on in optional.items() if on is None], errors='ignore')
+            chunks = iter_chunks(expanded_df, chunk_rows)
+        else:
+            run_stage = make_stage_runner(engine, self.recorder, self.footprint)
+            chunks = stream_rows([(source_file, expanded_df)], run_stage, df_mapping, chunk_rows)
+        if product_master is not None:
+            chunks = check_model_codes(chunks, product_master, self.unknown_models)
+        # Rows of a checkpointed form already in the history keep the flag they were written with
+        if self.history is not None and not outcome.get('registered'):
+            chunks = mark_previously_uploaded(chunks, self.history, self.team_member)
+        if checkpoints is not None and outcome.get('checkpoint') != 'named':
+            chunks = checkpoints.record_chunks(file_path, 'named', chunks)
+        chunks = self.overlaps.track(chunks, source_file, self.order[file_path])
+        self.rows += write_rows(chunks, self.writers, order=self.order[file_path])
+
+    def _keep_form(self, file_path, signature):
+        """Check a form against the member's other forms; the one earliest in the inbox order is kept."""
+        status, other_path = self.dedup.check(file_path, self.order[file_path], signature)
+        source_file, other_file = os.path.basename(file_path), os.path.basename(other_path or "")
+        if status == 'duplicate':
+            print(f"🔁 {source_file} has the same content as {other_file}; not written again")
+            return False
+        if status == 'replaces':
+            print(f"🔁 {other_file} has the same content as {source_file}; keeping {source_file}")
+            for writer in self.writers:
+                writer.discard(self.order[other_path])
+            self.overlaps.discard(self.order[other_path])
+            self.rows = self.writers[0].rows
+            if self.history is not None:
+                self.history.discard(self.team_member, other_file)
+        return True
+
+    def _open_writers(self):
+        from writers.excel_writer import CombinedWriter, CombinedCsvWriter, MassUploadWriter
+
+        combined_writer = CombinedCsvWriter if self.output_format == 'csv' else CombinedWriter
+        return [
+            combined_writer(self.local_output(self.combined_file)),
+            MassUploadWriter(self.local_output(self.mass_upload_file), template_file=self.mass_upload_template,
+                             skip_previously_uploaded=self.suppress_uploaded),
+        ]
+
+    def finalize(self, report, writer_pool=None):
+        """
+        Write the outputs in the local scratch directory once every file is done.
+        With a writer pool, the outputs of a member with at least
+        WRITER_PROCESS_MIN_ROWS rows are written in writer processes and this
+        returns at once; publish() then waits for them.
+
+        Args:
+            report: RunReport receiving the writing time
+            writer_pool: WriterPool of the run, or None to write in this process
+        """
+        from etl.overlaps import OVERLAP_SHEET_NAME
+        from writers.excel_writer import csv_sheet_file
+
+        if self.last_stage == 'write':
+            print(f"Writing outputs for team member: {self.team_member}")
+        if self.quarantined:
+            print(f"⛔ {len(self.quarantined)} file(s) moved to {self.paths['quarantine']}: {', '.join(self.quarantined)}")
+        if self.last_stage != 'write':
+            print(f"Stopped after the {self.last_stage} stage for team member {self.team_member}: "
+                  f"{self.rows} row(s) checkpointed, outputs left as they are")
+            return
+        if not self.writers:
+            return
+
+        overlaps_df = self.overlaps.conflicts_df()
+        if not overlaps_df.empty:
+            where = os.path.basename(csv_sheet_file(self.combined_file, OVERLAP_SHEET_NAME)) \
+                if self.output_format == 'csv' else f"the '{OVERLAP_SHEET_NAME}' sheet of the combined file"
+            total = overlaps_df.attrs['total']
+            listed = f", first {len(overlaps_df)} listed" if total > len(overlaps_df) else ""
+            print(f"⚠️ {total} overlap(s) between promotions of different forms for the same "
+                  f"customer and model (see {where}{listed})")
+            self.writers[0].add_sheet(OVERLAP_SHEET_NAME, overlaps_df)
+        if writer_pool is not None and self.rows >= WRITER_PROCESS_MIN_ROWS:
+            print(f"✍️ Writing {self.rows} rows of {self.team_member} in writer processes")
+            self.writes = [writer_pool.submit(writer) for writer in self.writers]
+        else:
+            for writer in self.writers:
+                with report.measure("Writing outputs"):
+                    try:
+                        writer.close()
+                    except Exception:
+                        self.unpublished.append(writer.output_file)
+
+    def outputs_written(self):
+        """Whether the writer processes of the member are done."""
+        return all(future.done() for future in self.writes)
+
+    def _publish(self, output_file, report):
+        """Copy a local output to the share, keeping track of outputs not written or not published."""
+        from writers.excel_writer import publish_output
+
+        with report.measure("Publishing outputs"):
+            local_file = self.local_output(output_file)
+            if local_file in self.unpublished:
+                return  # Its writer failed; the previous output stays on the share
+            if not os.path.exists(local_file):
+                print(f"⛔ {os.path.basename(output_file)} was not written; the previous one stays on the share")
+                self.unpublished.append(local_file)
+            elif not publish_output(local_file, output_file):
+                self.unpublished.append(local_file)
+
+    def publish(self, report):
+        """
+        Publish the finalized outputs to the share (waiting for the writer
+        processes), commit the history, delta cache and checkpoints when every
+        output is on the share, and save the reports.
+
+        Args:
+            report: RunReport receiving the writing and publishing time
+
+        Returns:
+            True if every output was written and published (or none was due)
+        """
+        from writers.excel_writer import reset_outputs, csv_sheet_file
+
+        if self.last_stage != 'write':
+            return True
+
+        if self.writers:
+            if self.writes:
+                with report.measure("Waiting on writer processes"):
+                    for writer, future in zip(self.writers, self.writes):
+                        try:
+                            report.add("Writing outputs", future.result())
+                        except Exception as e:
+                            print(f"⛔ Writing {os.path.basename(writer.output_file)} failed in its writer process: {e}")
+                            self.unpublished.append(writer.output_file)
+            if self.output_format == 'csv':
+                for sheet_name, _ in self.writers[0].sheets:
+                    self._publish(csv_sheet_file(self.combined_file, sheet_name), report)
+            self.writers = None
+            self._publish(self.combined_file, report)
+            self._publish(self.mass_upload_file, report)
+            if self.unpublished:
+                print(f"⛔ Processing finished, but {len(self.unpublished)} output(s) were not written or published: "
+                      f"{', '.join(os.path.basename(f) for f in self.unpublished)}")
+            else:
+                print(f"Processing completed successfully ({self.rows} rows).")
+        else:
+            print("No valid data found for processing.")
+            reset_outputs(self.combined_file, self.mass_upload_file)
+
+        self._commit()
+        self._save_reports(report)
+        return not self.unpublished
+
+    def _commit(self):
+        """Commit the checkpoints and history of the member, or drop its staged history rows."""
+        # A selection does not give the member's full outputs, which --resume would then skip
+        if self.checkpoints is not None and not self.unpublished and not self.partial:
+            self.checkpoints.mark_published(self.team_member)
+
+        history = self.history
+        if history is None:
+            return
+        flagged = history.flagged.get(self.team_member, 0)
+        if flagged:
+            action = "left out of MassUpload" if self.suppress_uploaded else "flagged 'Previously Uploaded'"
+            print(f"🗄️ {flagged} row(s) already uploaded by earlier runs {action}")
+        # Rows become history only once the outputs registering them are on the share
+        if self.unpublished:
+            history.drop_member(self.team_member)
+            print("⚠️ History not updated because some outputs could not be written or published")
+        else:
+            print(f"🗄️ {history.commit_member(self.team_member)} row(s) added to the history")
+            if self.checkpoints is not None:
+                self.checkpoints.mark_registered(self.files)
+
+    def _save_reports(self, report):
+        """Print and publish the memory, model code, duplicate, delta and shadow reports of the member."""
+        from etl.schema import print_footprint_report
+        from writers.excel_writer import save_shadow_report, save_duplicate_report, save_delta_report
+
+        if self.footprint is not None:
+            print_footprint_report(self.footprint)
+
+        if self.unknown_models:
+            print(f"⚠️ {len(self.unknown_models)} model code(s) not in the product master "
+                  f"(see 'Model Code Suggestion' in the combined file):")
+            for code, suggestions in sorted(self.unknown_models.items())[:10]:
+                print(f"   {code} -> {suggestions}")
+
+        dedup = self.dedup
+        if dedup.duplicates or dedup.near_duplicates:
+            print(f"🔁 {len(dedup.duplicates)} duplicate form(s) skipped, "
+                  f"{len(dedup.near_duplicates)} differing row(s) in near-identical forms")
+            save_duplicate_report(dedup.duplicates_df(), dedup.near_duplicates_df(),
+                                  self.local_output(self.duplicate_report_file))
+            self._publish(self.duplicate_report_file, report)
+
+        if self.deltas:
+            from etl.delta import delta_summary_df, removed_lines_df, save_versions
+            save_delta_report(delta_summary_df(self.deltas), removed_lines_df(self.deltas),
+                              self.local_output(self.delta_report_file))
+            self._publish(self.delta_report_file, report)
+            # Forms become the previous version of their next revision only once
+            # the outputs registering them are on the share
+            if self.unpublished:
+                print("⚠️ Delta cache not updated because some outputs could not be published")
+            else:
+                save_versions(self.paths['delta_cache'], self.deltas)
+
+        if self.recorder is not None:
+            self.recorder.print_summary()
+            save_shadow_report(self.recorder.timings_df(), self.recorder.mismatches_df(),
+                               self.local_output(self.shadow_report_file))
+            self._publish(self.shadow_report_file, report)
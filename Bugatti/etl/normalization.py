@@ -0,0 +1,132 @@
+# Column normalization of the extracted rows, driven by a table of normalizers
+#
+# Each normalizer describes one column: where its values come from, how they are
+# compared (upper-cased, stripped), which values are placeholders for "nothing
+# given", the default that replaces them and an optional flag derived from the
+# cleaned values. A column is normalized in one vectorized pass: the rules are
+# evaluated once per distinct value with isin masks and the result is written
+# back with whole-column operations. It runs once per file at the end of the
+# extract stage (both engines), so the combined frame needs no second fix.
+import pandas as pd
+
+# One entry per normalized column:
+#   column:            column written
+#   source_words:      take the values from the first column of the cleaned form
+#                      whose name contains all these words (None: the extracted column)
+#   clean:             'upper' compares and keeps stripped upper-case values;
+#                      None compares upper-case values and keeps the text as given
+#   placeholders:      values meaning "nothing given" (compared after clean)
+#   blank:             blank or whitespace-only values are placeholders too
+#   numeric:           numbers (e.g. a quantity typed in the wrong column) are placeholders too
+#   default:           value written over placeholders, and used when there is no source column
+#   flag:              optional derived flag: YES where the value is not a placeholder
+#                      and longer than min_length - 1 characters
+#   append_to:         optional (target column, column appended to it) for flagged rows
+#   label:             name of the column in the progress messages
+COLUMN_NORMALIZERS = [
+    {
+        'column': 'Type of Support',
+        'source_words': None,
+        'clean': None,
+        'placeholders': frozenset({'NA', 'N/A', 'NONE', '-', 'NULL'}),
+        'blank': True,
+        'numeric': True,
+        'default': 'A SOA',
+    },
+    {
+        'column': 'WBW TV MODEL',
+        'source_words': ('WBW', 'MODEL'),
+        'clean': 'upper',
+        'placeholders': frozenset({'NA', 'NA1', 'NA2', 'NA3', 'NO TV MODEL', '', 'NONE', 'N/A', 'NO', 'NULL'}),
+        'blank': False,
+        'numeric': False,
+        'default': 'NO TV MODEL',
+        'flag': {'column': 'Is WBW', 'min_length': 4},
+        'append_to': ('Name of Promotion', 'Model Code'),
+        'label': 'WBW',
+    },
+]
+
+def _find_source(cleaned_df, words):
+    """First column of the cleaned form whose name contains all the words."""
+    return next((col for col in cleaned_df.columns if all(word in str(col).upper() for word in words)), None)
+
+def normalize_values(values, normalizer):
+    """
+    Normalize the values of one column.
+
+    Args:
+        values: Series of raw values
+        normalizer: Entry of COLUMN_NORMALIZERS
+
+    Returns:
+        Tuple (normalized Series, boolean mask of the placeholder rows)
+    """
+    # Rules are evaluated on the distinct values only
+    codes, uniques = pd.factorize(values.astype(str), use_na_sentinel=False)
+    text = pd.Series(uniques, dtype=object)
+    if normalizer['clean'] == 'upper':
+        text = text.str.strip().str.upper()
+        key = text
+    else:
+        key = text.str.upper()
+
+    placeholder = key.isin(normalizer['placeholders'])
+    if normalizer['blank']:
+        placeholder |= text.str.strip() == ''
+    if normalizer['numeric']:
+        placeholder |= text.str.replace('.', '', regex=False).str.isnumeric()
+
+    normalized = text.mask(placeholder, normalizer['default'])
+    mask = placeholder.to_numpy()[codes]
+    return pd.Series(normalized.to_numpy()[codes], index=values.index, dtype=object), \
+        pd.Series(mask, index=values.index)
+
+def normalize_columns(extracted_df, cleaned_df, normalizers=COLUMN_NORMALIZERS):
+    """
+    Apply the column normalizers to the rows extracted from one PET form.
+
+    Args:
+        extracted_df: Rows extracted from the form
+        cleaned_df: Form as cleaned by the loader (source of columns that are not extracted)
+        normalizers: Table of column normalizers
+
+    Returns:
+        extracted_df with the normalized columns and their flags
+    """
+    for normalizer in normalizers:
+        column = normalizer['column']
+        flag = normalizer.get('flag')
+        if normalizer['source_words'] is None:
+            source = column if column in extracted_df.columns else None
+            values = extracted_df[column] if source else None
+        else:
+            source = _find_source(cleaned_df, normalizer['source_words'])
+            values = cleaned_df[source] if source is not None else None
+            if source is not None:
+                print(f"Found {normalizer.get('label', column)} column: '{source}'")
+
+        if values is None:
+            extracted_df[column] = normalizer['default']
+            if flag:
+                extracted_df[flag['column']] = "NO"
+            continue
+
+        extracted_df[column], placeholder = normalize_values(values, normalizer)
+        if not flag:
+            continue
+
+        flagged = ~placeholder & (extracted_df[column].str.len() >= flag['min_length'])
+        extracted_df[flag['column']] = "NO"
+        extracted_df.loc[flagged, flag['column']] = "YES"
+
+        append_to = normalizer.get('append_to')
+        if append_to and flagged.any():
+            target, appended = append_to
+            extracted_df.loc[flagged, target] = (
+                extracted_df.loc[flagged, target].fillna('').astype(str).str.strip() + " " +
+                extracted_df.loc[flagged, appended].fillna('').astype(str).str.strip()
+            ).str.strip()
+            print(f"Updated {flagged.sum()} promotion names for {normalizer.get('label', column)} rows")
+
+    return extracted_df
@@ -0,0 +1,140 @@
+# Overlapping promotions across PET forms
+#
+# Two forms of a member often claim the same model for the same customer over
+# date ranges that overlap, which counts the SOA twice. While the rows of each
+# form are written, the index keeps one compact entry per form line (customer,
+# model, date range, source file and row). Once all forms are in, the entries
+# are sorted by (Customer Code, Model Code, Start Date) and swept once: an entry
+# overlaps the entries of the same key still active (ending on or after its
+# start), so the whole check costs O(n log n) plus the conflicts found. Only
+# conflicts between different forms are reported; lines of one form are the
+# form author's business.
+import heapq
+
+import pandas as pd
+
+from etl.schema import to_output
+
+# Key of the promotions compared with each other
+OVERLAP_KEY_COLUMNS = ['Customer Code', 'Model Code']
+
+# Columns kept per form line (besides the key and the date range)
+OVERLAP_DETAIL_COLUMNS = ['Name of Promotion', 'Additional SOA']
+
+# Sheet of the combined file listing the conflicts
+OVERLAP_SHEET_NAME = "Overlaps"
+
+# Conflicts listed in the sheet (forms repeating one model for many lines can
+# overlap pairwise by the hundred thousand; the total is still counted)
+OVERLAP_MAX_ROWS = 10000
+
+# Date written for a missing date; such ranges are not compared
+MISSING_DATE = 19000101
+
+def _date_number(values):
+    """YYYYMMDD dates as numbers (NaN for missing or unparsed dates)."""
+    numbers = pd.to_numeric(values, errors='coerce')
+    return numbers.where(numbers > MISSING_DATE)
+
+class OverlapIndex:
+    """Form lines of one member, indexed for the cross-form overlap sweep."""
+
+    def __init__(self):
+        self.entries = []
+
+    def track(self, chunks, source_file, order):
+        """
+        Record the lines of a form as its chunks go by.
+
+        Args:
+            chunks: Iterable of enriched and named chunks of one form
+            source_file: File name of the form
+            order: Position of the form in the member's inbox
+
+        Yields:
+            The chunks, unchanged
+        """
+        for chunk in chunks:
+            if all(col in chunk.columns for col in OVERLAP_KEY_COLUMNS + ['Start Date', 'End Date']):
+                columns = OVERLAP_KEY_COLUMNS + OVERLAP_DETAIL_COLUMNS + ['Original Row Index', 'Start Date', 'End Date']
+                entries = to_output(chunk.reindex(columns=columns))
+                entries['Start'] = _date_number(entries.pop('Start Date'))
+                entries['End'] = _date_number(entries.pop('End Date'))
+                entries = entries.dropna(subset=['Start', 'End'])
+                # Rows expanded by apply month share the line's date range
+                entries = entries.drop_duplicates(subset=OVERLAP_KEY_COLUMNS + ['Original Row Index', 'Start', 'End'])
+                entries['Source File'] = source_file
+                entries['Order'] = order
+                self.entries.append((order, entries))
+            yield chunk
+
+    def discard(self, order):
+        """Forget the lines of a form dropped as a duplicate."""
+        self.entries = [(key, entries) for key, entries in self.entries if key != order]
+
+    def conflicts(self, limit=None):
+        """
+        Sweep the indexed lines for promotions overlapping across forms.
+
+        Args:
+            limit: Maximum number of conflicts returned (None for all)
+
+        Returns:
+            Tuple (conflicts, total): list of (earlier line, later line) pairs of
+            dictionaries, the earlier line belonging to the form earlier in the
+            inbox, and the number of conflicts found
+        """
+        if not self.entries:
+            return [], 0
+        entries = pd.concat([entries for _, entries in self.entries], ignore_index=True)
+        entries[OVERLAP_KEY_COLUMNS] = entries[OVERLAP_KEY_COLUMNS].astype(str)
+        entries = entries.sort_values(OVERLAP_KEY_COLUMNS + ['Start', 'End'], kind='stable')
+        records = entries.to_dict('records')
+
+        conflicts, total = [], 0
+        key, active = None, []
+        for position, line in enumerate(records):
+            line_key = tuple(line[col] for col in OVERLAP_KEY_COLUMNS)
+            if line_key != key:
+                key, active = line_key, []
+            # Lines ended before this one starts can no longer overlap anything
+            while active and active[0][0] < line['Start']:
+                heapq.heappop(active)
+            for _, other_position in active:
+                other = records[other_position]
+                if other['Order'] != line['Order']:
+                    total += 1
+                    if limit is None or len(conflicts) < limit:
+                        conflicts.append((other, line) if other['Order'] < line['Order'] else (line, other))
+            heapq.heappush(active, (line['End'], position))
+        return conflicts, total
+
+    def conflicts_df(self, limit=OVERLAP_MAX_ROWS):
+        """
+        Conflicts as the rows of the overlap sheet (at most limit rows; the
+        number of conflicts found is in df.attrs['total']).
+        """
+        rows = []
+        conflicts, total = self.conflicts(limit)
+        for first, second in conflicts:
+            start, end = max(first['Start'], second['Start']), min(first['End'], second['End'])
+            row = {col: first[col] for col in OVERLAP_KEY_COLUMNS}
+            for label, line in (("", first), ("Overlapping ", second)):
+                row.update({
+                    f"{label}Source File": line['Source File'],
+                    f"{label}Original Row Index": line['Original Row Index'],
+                    f"{label}Start Date": int(line['Start']),
+                    f"{label}End Date": int(line['End']),
+                    **{f"{label}{col}": line[col] for col in OVERLAP_DETAIL_COLUMNS},
+                })
+            row['Overlap Start'], row['Overlap End'] = int(start), int(end)
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            days = pd.to_datetime(df['Overlap End'].astype(str), format='%Y%m%d', errors='coerce') - \
+                pd.to_datetime(df['Overlap Start'].astype(str), format='%Y%m%d', errors='coerce')
+            df['Overlap Days'] = days.dt.days + 1
+            df = df.sort_values(['Source File', 'Original Row Index', 'Overlapping Source File',
+                                 'Overlapping Original Row Index'], kind='stable', ignore_index=True)
+        df.attrs['total'] = total
+        return df
@@ -0,0 +1,160 @@
+# Streaming pipeline: per-file stages, then per-chunk enrich/name/write
+import os
+
+from etl.loader import load_and_clean_excel
+from etl.stages import get_engine
+from etl.schema import apply_schema
+from etl.dedup import form_signature
+
+def make_stage_runner(engine='legacy', recorder=None, footprint=None):
+    """
+    Build the function used to run a stage. Every stage output gets the
+    compact dtypes of etl.schema.
+
+    Args:
+        engine: Stage implementations to use ('legacy', 'optimized' or 'polars')
+        recorder: ShadowRecorder running both engines, or None
+        footprint: Optional list receiving a memory record per stage output
+
+    Returns:
+        Function run_stage(stage, source_file, *args)
+    """
+    if recorder is not None:
+        run = recorder.run
+    else:
+        stages = get_engine(engine)
+        run = lambda stage, source_file, *args: stages[stage](*args)
+
+    def run_stage(stage, source_file, *args):
+        return apply_schema(run(stage, source_file, *args), stage, source_file, footprint)
+
+    return run_stage
+
+def process_form(file_path, run_stage, progress=None, sheet_name=None, signature=None, delta=None):
+    """
+    Load one PET form and run the per-file stages: extract, group and expand.
+
+    Args:
+        file_path: Path to the PET form
+        run_stage: Function returned by make_stage_runner
+        progress: Optional callback progress(stage, rows_seen) called before each stage
+        sheet_name: Matching sheet from the catalog pre-scan, if known
+        signature: Optional dictionary receiving the content signature of the
+            cleaned form (see etl.dedup.form_signature)
+        delta: Optional dictionary with the member's cache_dir; only the lines that
+            are new or changed since the form's previous version are expanded and
+            the dictionary receives the delta (see etl.delta.diff_against_previous)
+
+    Returns:
+        Expanded DataFrame, or None if the file could not be read
+    """
+    source_file = os.path.basename(file_path)
+    if progress is None:
+        progress = lambda stage, rows: None
+
+    # Step 1: Load and clean Excel
+    progress('load', 0)
+    cleaned_df = load_and_clean_excel(file_path, sheet_name=sheet_name)
+    if cleaned_df is None:
+        print("Skipping due to read/clean error.")
+        return None
+
+    print(f"➡️ Loaded rows: {len(cleaned_df)} from {file_path}")
+    if signature is not None:
+        signature.update(form_signature(cleaned_df))
+
+    # Step 2: Extract required columns and correct customer codes, dates and WBW flags
+    # (each intermediate is released as soon as the next stage has it)
+    progress('extract', len(cleaned_df))
+    df = run_stage('extract', source_file, cleaned_df, file_path)
+    del cleaned_df
+
+    # Group similar rows
+    progress('group', len(df))
+    df = run_stage('group', source_file, df)
+    print(f"➡️ After grouping: {len(df)} rows, {df['Expected Sell-Out'].sum()} units")
+    
+    if delta is not None:
+        from etl.delta import diff_against_previous
+        df, changes = diff_against_previous(df, file_path, delta['cache_dir'])
+        delta.update(changes)
+
+    # Expand by Apply Month & Distribute Quantity
+    progress('expand', len(df))
+    expanded_df = run_stage('expand', source_file, df)
+    del df
+
+    progress('done', len(expanded_df))
+    return expanded_df
+
+def run_in_process(excel_files, runner_for, prefetcher=None, catalog=None, delta_dirs=None):
+    """Process files one by one in this process (no budgets), yielding outcomes like etl.supervisor."""
+    for file_path in excel_files:
+        local_path = prefetcher.get(file_path) if prefetcher is not None else file_path
+        sheet_name = ((catalog or {}).get(file_path) or {}).get('sheet_name')
+        signature = {}
+        delta_dir = (delta_dirs or {}).get(file_path)
+        delta = {'cache_dir': delta_dir} if delta_dir else None
+        print(f"Processing: {os.path.basename(file_path)}")
+        result = process_form(local_path, runner_for(file_path), sheet_name=sheet_name, signature=signature, delta=delta)
+        if prefetcher is not None:
+            prefetcher.release(file_path)
+        yield {'file_path': file_path, 'status': 'ok', 'result': result,
+               'shadow': None, 'footprint': None, 'signature': signature, 'delta': delta, 'note': None}
+
+def iter_chunks(df, chunk_rows):
+    """
+    Split a DataFrame into consecutive chunks of at most chunk_rows rows.
+
+    Args:
+        df: DataFrame to split
+        chunk_rows: Maximum rows per chunk (None or 0 for a single chunk)
+
+    Yields:
+        DataFrame chunks with a fresh index
+    """
+    if not chunk_rows or len(df) <= chunk_rows:
+        yield df.reset_index(drop=True)
+        return
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+
+def stream_rows(expanded_frames, run_stage, df_mapping, chunk_rows):
+    """
+    Enrich and name expanded rows chunk by chunk.
+
+    Args:
+        expanded_frames: Iterable of (source_file, expanded DataFrame)
+        run_stage: Function returned by make_stage_runner
+        df_mapping: Customer mapping DataFrame
+        chunk_rows: Maximum rows per chunk
+
+    Yields:
+        Enriched and named DataFrame chunks, in input order
+    """
+    for source_file, expanded_df in expanded_frames:
+        for chunk in iter_chunks(expanded_df, chunk_rows):
+            # Customer mapping, Total SOA and promotion metadata
+            chunk = run_stage('enrich', source_file, chunk, df_mapping)
+
+            # Build promotion names
+            yield run_stage('name', source_file, chunk)
+
+def write_rows(chunks, writers, order=None):
+    """
+    Append every chunk to each writer.
+
+    Args:
+        chunks: Iterable of DataFrame chunks
+        writers: Objects with an append(df, order) method
+        order: Position of the chunks' source file in the outputs
+
+    Returns:
+        Number of rows written
+    """
+    rows = 0
+    for chunk in chunks:
+        for writer in writers:
+            writer.append(chunk, order)
+        rows += len(chunk)
+    return rows
@@ -0,0 +1,163 @@
+# Polars backend for the transform stages
+#
+# The 'polars' engine is the optimized engine with its whole-frame steps (the
+# grouping of similar rows and the customer mapping join) run as lazy,
+# multi-threaded Polars queries. Cell values never leave pandas: key columns are
+# factorized to integer codes, Polars groups or joins the codes and returns row
+# positions, and the pandas frame is built with a take. The output is the same
+# as the pandas engines' (values, dtypes and row order), which the parity tests
+# in tests/test_polars_backend.py check.
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+from etl.grouping import GROUP_COLUMNS, group_similar_rows, expand_by_apply_month
+from etl.stages import extract_columns_optimized, enrich_optimized, name_optimized
+
+def _factorize_keys(df, columns):
+    """
+    Integer codes of the key columns, ordered like the sorted key values.
+
+    When the number of possible key combinations fits in 64 bits the codes are
+    packed into a single group id (in mixed radix, so ids sort like the keys).
+
+    Returns:
+        Tuple (dictionary of code arrays, boolean array of rows without a missing key)
+    """
+    codes, sizes, complete = {}, [], np.ones(len(df), dtype=bool)
+    for i, col in enumerate(columns):
+        values, uniques = pd.factorize(df[col], sort=True)
+        codes[f"_k{i}"] = values
+        sizes.append(max(len(uniques), 1))
+        complete &= values >= 0
+
+    if float(np.prod(sizes, dtype='float64')) < 2 ** 62:
+        group_id = np.zeros(len(df), dtype='int64')
+        for values, size in zip(codes.values(), sizes):
+            group_id = group_id * size + np.maximum(values, 0)
+        codes = {'_group': group_id}
+    return codes, complete
+
+def _take(series, positions):
+    """Values of a column at row positions (-1 gives a missing value), with a fresh index."""
+    found = positions >= 0
+    taken = series.iloc[np.where(found, positions, 0)].reset_index(drop=True) if len(series) else \
+        pd.Series([np.nan] * len(positions), dtype=object)
+    return taken if found.all() else taken.where(pd.Series(found))
+
+def group_similar_rows_polars(extracted_df):
+    """
+    Group similar rows like group_similar_rows, with the grouping run by Polars.
+
+    Rows with a missing key are dropped and groups are ordered by their keys (as
+    pandas does), other columns keep their first non-missing value and
+    Expected Sell-Out is summed.
+
+    Args:
+        extracted_df: DataFrame with extracted data
+
+    Returns:
+        DataFrame with grouped rows
+    """
+    sell_out = extracted_df.get('Expected Sell-Out')
+    if sell_out is None or not pd.api.types.is_numeric_dtype(sell_out) or extracted_df.empty:
+        return group_similar_rows(extracted_df)
+
+    extracted_df = extracted_df.copy()
+    group_cols = list(GROUP_COLUMNS)
+    if 'Is WBW' in extracted_df.columns:
+        group_cols.append('Is WBW')
+    for col in group_cols:
+        if col not in extracted_df.columns:
+            print(f"⚠️ Missing column for grouping: {col}")
+            extracted_df[col] = 'NA'  # Add placeholder
+    first_cols = [col for col in extracted_df.columns if col not in group_cols and col != 'Expected Sell-Out']
+
+    print(f"➡️ Before grouping: {len(extracted_df)} rows, {extracted_df['Expected Sell-Out'].sum()} units")
+
+    codes, complete = _factorize_keys(extracted_df, group_cols)
+    columns = [pl.Series('_row', np.arange(len(extracted_df))),
+               pl.Series('_qty', sell_out.to_numpy(dtype='float64', na_value=np.nan), nan_to_null=True),
+               pl.Series('_complete', complete)]
+    columns += [pl.Series(name, values) for name, values in codes.items()]
+
+    # First non-missing value of each other column (the first row when it has no missing values)
+    firsts = []
+    for j, col in enumerate(first_cols):
+        present = extracted_df[col].notna().to_numpy()
+        if present.all():
+            firsts.append(pl.col('_row').first().alias(f"_p{j}"))
+        else:
+            columns.append(pl.Series(f"_n{j}", present))
+            firsts.append(pl.col('_row').filter(pl.col(f"_n{j}")).first().alias(f"_p{j}"))
+
+    key_names = list(codes)
+    grouped = (
+        pl.DataFrame(columns).lazy()
+        .filter(pl.col('_complete'))
+        .group_by(key_names)
+        .agg([pl.col('_row').first().alias('_first'), pl.col('_qty').sum().alias('_qty')] + firsts)
+        .sort(key_names)
+        .collect()
+    )
+
+    first_rows = grouped['_first'].to_numpy()
+    result = {col: _take(extracted_df[col], first_rows) for col in group_cols}
+    for col in extracted_df.columns:
+        if col == 'Expected Sell-Out':
+            totals = pd.Series(grouped['_qty'].to_numpy())
+            result[col] = totals.astype('int64') if pd.api.types.is_integer_dtype(sell_out) else totals
+        elif col not in group_cols:
+            result[col] = _take(extracted_df[col], grouped[f"_p{first_cols.index(col)}"].fill_null(-1).to_numpy())
+    grouped_df = pd.DataFrame(result)
+
+    print(f"➡️ After grouping: {len(grouped_df)} rows, {grouped_df['Expected Sell-Out'].sum()} units")
+    return grouped_df
+
+def join_customer_mapping_polars(combined_df, mapping_df):
+    """
+    Left join of the customer mapping on Customer Code, run by Polars.
+
+    Args:
+        combined_df: Rows to enrich
+        mapping_df: Customer Code plus the mapped columns (one row per code)
+
+    Returns:
+        combined_df with the mapped columns, in its original row order
+    """
+    keys = pd.concat([combined_df['Customer Code'].astype(object), mapping_df['Customer Code'].astype(object)],
+                     ignore_index=True)
+    codes, _ = pd.factorize(keys, use_na_sentinel=False)
+    left = pl.DataFrame([pl.Series('_row', np.arange(len(combined_df))), pl.Series('_key', codes[:len(combined_df)])])
+    right = pl.DataFrame([pl.Series('_map', np.arange(len(mapping_df))), pl.Series('_key', codes[len(combined_df):])])
+
+    joined = (
+        left.lazy()
+        .join(right.lazy().unique(subset='_key', keep='first', maintain_order=True), on='_key', how='left')
+        .sort('_row')
+        .collect()
+    )
+
+    positions = joined['_map'].fill_null(-1).to_numpy()
+    combined_df = combined_df.reset_index(drop=True)
+    for col in mapping_df.columns:
+        if col != 'Customer Code':
+            combined_df[col] = _take(mapping_df[col], positions)
+    return combined_df
+
+def enrich_polars(combined_df, df_mapping):
+    """Enrich like enrich_optimized, with the customer mapping join run by Polars."""
+    return enrich_optimized(combined_df, df_mapping, join=join_customer_mapping_polars)
+
+# Stage functions of the polars engine (None when Polars is not installed)
+POLARS_ENGINE = None if pl is None else {
+    'extract': extract_columns_optimized,
+    'group': group_similar_rows_polars,
+    'expand': expand_by_apply_month,
+    'enrich': enrich_polars,
+    'name': name_optimized,
+}
@@ -0,0 +1,104 @@
+# Prefetch PET forms from the network share to a local scratch directory
+import os
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads copying files at the same time (the share is the bottleneck, not the CPU)
+MAX_COPY_THREADS = 4
+
+class Prefetcher:
+    """
+    Copies PET forms to a local scratch directory a few files ahead of processing.
+
+    Files are requested in the order given; while one file is processed the next
+    `depth` files are already being copied by a thread pool, so parsing never
+    waits on the share unless the copy has not finished yet. That waiting time is
+    recorded in the run report.
+    """
+
+    def __init__(self, file_paths, scratch_dir, depth=2, report=None):
+        """
+        Args:
+            file_paths: PET forms in the order they will be requested
+            scratch_dir: Local folder receiving the copies
+            depth: Number of files copied ahead of the one being processed
+            report: Optional RunReport receiving the I/O wait time
+        """
+        self.file_paths = list(file_paths)
+        self.scratch_dir = scratch_dir
+        self.depth = max(1, depth)
+        self.report = report
+        self.futures = {}
+        self.taken = set()
+        self.next_index = 0
+        self.executor = ThreadPoolExecutor(max_workers=min(self.depth, MAX_COPY_THREADS),
+                                           thread_name_prefix="prefetch")
+        self._fill()
+
+    def _local_path(self, index, file_path):
+        # One folder per file keeps the original name (used as Source File) even
+        # when two members have files with the same name
+        return os.path.join(self.scratch_dir, str(index), os.path.basename(file_path))
+
+    def _copy(self, index, file_path):
+        local_path = self._local_path(index, file_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        shutil.copyfile(file_path, local_path)
+        return local_path
+
+    def _fill(self):
+        """Keep `depth` copies (running or finished but not yet requested) ahead of the consumer."""
+        ahead = sum(1 for file_path in self.futures if file_path not in self.taken)
+        while self.next_index < len(self.file_paths) and ahead < self.depth:
+            file_path = self.file_paths[self.next_index]
+            self.futures[file_path] = self.executor.submit(self._copy, self.next_index, file_path)
+            self.next_index += 1
+            ahead += 1
+
+    def ready(self, file_path):
+        """Whether the local copy of a file is available without waiting."""
+        self._fill()
+        future = self.futures.get(file_path)
+        return future is not None and future.done()
+
+    def get(self, file_path):
+        """
+        Return the local copy of a file, waiting for the copy if needed.
+
+        Falls back to the original path when the file was not scheduled or the
+        copy failed.
+        """
+        self._fill()
+        future = self.futures.get(file_path)
+        if future is None:
+            return file_path
+        self.taken.add(file_path)
+
+        start = time.perf_counter()
+        try:
+            local_path = future.result()
+        except Exception as e:
+            print(f"⚠️ Could not copy {os.path.basename(file_path)} to the local cache ({e}); reading it from the share")
+            local_path = file_path
+        if self.report is not None:
+            self.report.add("Waiting on input I/O", time.perf_counter() - start)
+
+        self._fill()
+        return local_path
+
+    def release(self, file_path):
+        """Delete the local copy of a processed file."""
+        future = self.futures.pop(file_path, None)
+        self.taken.discard(file_path)
+        self._fill()
+        if future is None or not future.done() or future.exception() is not None:
+            return
+        try:
+            os.remove(future.result())
+        except OSError:
+            pass
+
+    def close(self):
+        """Stop copying and wait for running copies to finish."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
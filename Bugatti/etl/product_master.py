@@ -0,0 +1,148 @@
+# Model code validation against an optional product master
+#
+# ProductMaster.xlsx (or .csv) next to CustomerMapping.xlsx lists the valid model
+# codes. It is compiled once per run into a set (membership) and a trie; unknown
+# codes get nearest-match suggestions from a bounded edit-distance walk of the
+# trie, which only visits branches that can still be within the distance.
+import os
+
+import pandas as pd
+
+PRODUCT_MASTER_FILES = ["ProductMaster.xlsx", "ProductMaster.csv"]
+
+# Largest edit distance of a suggestion, and suggestions kept per unknown code
+MAX_SUGGESTION_DISTANCE = 2
+MAX_SUGGESTIONS = 3
+
+# Trie key holding the code that ends at a node
+_END = ''
+
+def normalize_model_code(code):
+    """Model codes are compared stripped and uppercased."""
+    return str(code).strip().upper()
+
+class ModelCodeIndex:
+    """Valid model codes as a set and a trie (nested dictionaries keyed by character)."""
+
+    def __init__(self, codes):
+        """
+        Args:
+            codes: Valid model codes
+        """
+        self.codes = set()
+        self.trie = {}
+        self.verdicts = {}
+        for code in sorted({normalize_model_code(c) for c in codes if pd.notna(c)} - {'', 'NAN'}):
+            self.codes.add(code)
+            node = self.trie
+            for char in code:
+                node = node.setdefault(char, {})
+            node[_END] = code
+
+    def __len__(self):
+        return len(self.codes)
+
+    def suggest(self, code, max_distance=MAX_SUGGESTION_DISTANCE, limit=MAX_SUGGESTIONS):
+        """
+        Find the valid codes closest to a code.
+
+        Walks the trie keeping one row of the Levenshtein table per node, computed
+        only within max_distance of the diagonal; a branch is abandoned as soon as
+        every cell of its row exceeds max_distance.
+
+        Returns:
+            List of (distance, code), closest first
+        """
+        code = normalize_model_code(code)
+        size, beyond = len(code), max_distance + 1
+        found = []
+        first_row = [i if i <= max_distance else beyond for i in range(size + 1)]
+        stack = [(1, char, child, first_row) for char, child in self.trie.items() if char != _END]
+        while stack:
+            depth, char, node, previous = stack.pop()
+            row = [beyond] * (size + 1)
+            row[0] = depth if depth <= max_distance else beyond
+            best = row[0]
+            for i in range(max(1, depth - max_distance), min(size, depth + max_distance) + 1):
+                cell = min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (code[i - 1] != char), beyond)
+                row[i] = cell
+                if cell < best:
+                    best = cell
+            if _END in node and row[size] <= max_distance:
+                found.append((row[size], node[_END]))
+            if best <= max_distance:
+                stack.extend((depth + 1, next_char, child, row) for next_char, child in node.items() if next_char != _END)
+        return sorted(found)[:limit]
+
+    def validate(self, codes):
+        """
+        Check model codes in bulk; each distinct code is checked once per run.
+
+        Args:
+            codes: Model codes to check
+
+        Returns:
+            Dictionary mapping each code to '' when it is valid, or to its
+            suggestions ('NONE' when nothing is close)
+        """
+        for code in set(codes) - set(self.verdicts):
+            normalized = normalize_model_code(code)
+            if normalized in self.codes:
+                self.verdicts[code] = ''
+            else:
+                suggestions = [match for _, match in self.suggest(normalized)]
+                self.verdicts[code] = ", ".join(suggestions) or 'NONE'
+        return {code: self.verdicts[code] for code in set(codes)}
+
+def find_product_master(base_dir):
+    """Return the product master file of the base directory, or None."""
+    for name in PRODUCT_MASTER_FILES:
+        path = os.path.join(base_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+def load_product_master(path):
+    """
+    Compile the product master into a ModelCodeIndex.
+
+    Args:
+        path: ProductMaster.xlsx or .csv with a 'Model Code' column (else the
+            first column is used)
+
+    Returns:
+        ModelCodeIndex, or None if the file cannot be read
+    """
+    try:
+        if path.lower().endswith('.csv'):
+            df = pd.read_csv(path, dtype=str)
+        else:
+            df = pd.read_excel(path, dtype=str)
+    except Exception as e:
+        print(f"Error loading product master: {e}")
+        return None
+    column = 'Model Code' if 'Model Code' in df.columns else df.columns[0]
+    index = ModelCodeIndex(df[column].tolist())
+    print(f"📦 Product master: {len(index)} model codes from {os.path.basename(path)}")
+    return index
+
+def check_model_codes(chunks, index, unknown):
+    """
+    Add 'Model Code Suggestion' to each chunk: empty for valid codes and
+    division-level rows (Product Type 'Division'), else the closest valid codes.
+
+    Args:
+        chunks: Iterable of enriched and named chunks
+        index: ModelCodeIndex
+        unknown: Dictionary receiving each unknown code and its suggestions
+
+    Yields:
+        The chunks with a 'Model Code Suggestion' column
+    """
+    for chunk in chunks:
+        codes = chunk['Model Code'].astype(str)
+        models = ~chunk['Product Type'].astype(str).eq('Division') if 'Product Type' in chunk.columns else codes.notna()
+        verdicts = index.validate(codes[models].unique().tolist())
+        unknown.update({code: verdict for code, verdict in verdicts.items() if verdict})
+        chunk['Model Code Suggestion'] = codes.map(verdicts).where(models, '').astype(object)
+        yield chunk
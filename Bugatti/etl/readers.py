@@ -0,0 +1,183 @@
+# Readers of PET forms by file extension
+#
+# Every reader returns the raw cells of the form's sheet (header=None), which the
+# loader then runs through the same header detection and column mapping whatever
+# the format. Workbook formats are read by a pandas Excel engine: openpyxl for
+# .xlsx/.xlsm, calamine or pyxlsb for .xlsb and xlrd (or calamine) for legacy .xls,
+# the optional engines being used only when they are installed. CSV exports are
+# read by the pandas C parser in chunks. Other formats are added with register_reader.
+import os
+import csv
+import zipfile
+import importlib
+
+from config.constants import CSV_CHUNK_ROWS
+
+# Python module providing each pandas Excel engine
+ENGINE_MODULES = {
+    'openpyxl': 'openpyxl',
+    'calamine': 'python_calamine',
+    'pyxlsb': 'pyxlsb',
+    'xlrd': 'xlrd',
+}
+
+# First bytes of a legacy .xls (OLE2 compound document)
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# Bytes of a CSV file read to detect its encoding and delimiter
+CSV_SAMPLE_BYTES = 64 * 1024
+CSV_DELIMITERS = [',', ';', '\t', '|']
+
+_installed = {}
+
+def engine_installed(engine):
+    """Whether the module of a pandas Excel engine can be imported."""
+    if engine not in _installed:
+        try:
+            importlib.import_module(ENGINE_MODULES[engine])
+            _installed[engine] = True
+        except ImportError:
+            _installed[engine] = False
+    return _installed[engine]
+
+class ExcelReader:
+    """Workbook format read with the first installed of several pandas Excel engines."""
+
+    single_sheet = False
+
+    def __init__(self, engines, container='zip'):
+        """
+        Args:
+            engines: pandas Excel engines able to read the format, fastest first
+            container: 'zip' (Office Open XML and .xlsb) or 'ole2' (legacy .xls),
+                used to tell a complete file from one still being copied
+        """
+        self.engines = engines
+        self.container = container
+
+    def engine(self):
+        """Engine used to read the format, or None if none is installed."""
+        return next((engine for engine in self.engines if engine_installed(engine)), None)
+
+    def open(self, file_path):
+        import pandas as pd
+
+        engine = self.engine()
+        if engine is None:
+            raise ImportError(f"Reading {os.path.splitext(file_path)[1]} files needs one of: "
+                              f"{', '.join(ENGINE_MODULES[engine] for engine in self.engines)}")
+        return pd.ExcelFile(file_path, engine=engine)
+
+    def sheet_names(self, book):
+        return book.sheet_names
+
+    def read(self, book, sheet_name):
+        import pandas as pd
+
+        return pd.read_excel(book, sheet_name=sheet_name, header=None)
+
+    def close(self, book):
+        book.close()
+
+    def is_complete(self, file_path):
+        """Whether the file is a whole workbook (not one still being copied)."""
+        if self.container == 'zip':
+            return zipfile.is_zipfile(file_path)
+        try:
+            with open(file_path, 'rb') as f:
+                return f.read(len(OLE2_SIGNATURE)) == OLE2_SIGNATURE
+        except OSError:
+            return False
+
+class CsvReader:
+    """CSV export of the PET form sheet, read by the pandas C parser in chunks."""
+
+    single_sheet = True
+
+    def __init__(self, chunk_rows=CSV_CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+
+    def open(self, file_path):
+        return file_path
+
+    def sheet_names(self, file_path):
+        # The whole file is the form; its name stands in for the sheet name
+        return [os.path.splitext(os.path.basename(file_path))[0]]
+
+    def _dialect(self, file_path):
+        """Encoding, delimiter and widest row among the first rows of the file."""
+        with open(file_path, 'rb') as f:
+            sample = f.read(CSV_SAMPLE_BYTES)
+        for encoding in ('utf-8-sig', 'cp1252'):
+            try:
+                text = sample.decode(encoding)
+                break
+            except UnicodeDecodeError as e:
+                # A multi-byte character cut at the end of the sample is fine
+                if encoding == 'utf-8-sig' and e.start >= len(sample) - 3:
+                    text = sample[:e.start].decode(encoding)
+                    break
+        else:
+            text = sample.decode('latin-1')
+        # The delimiter splitting the sampled rows into the most fields (regional
+        # exports use ';' where the decimal separator is a comma)
+        lines = text.splitlines()[:-1] or text.splitlines()
+        widths = {delimiter: [len(row) for row in csv.reader(lines, delimiter=delimiter)]
+                  for delimiter in CSV_DELIMITERS}
+        delimiter = max(CSV_DELIMITERS, key=lambda delimiter: sum(widths[delimiter]))
+        return encoding, delimiter, max(widths[delimiter], default=1)
+
+    def _widest_row(self, file_path, encoding, delimiter):
+        with open(file_path, newline='', encoding=encoding) as f:
+            return max((len(row) for row in csv.reader(f, delimiter=delimiter)), default=1)
+
+    def read(self, file_path, sheet_name=None):
+        import pandas as pd
+
+        encoding, delimiter, width = self._dialect(file_path)
+
+        def read_chunks(width):
+            # Title rows above the header are shorter than the data rows, so the
+            # columns are named up front instead of taken from the first line
+            chunks = pd.read_csv(file_path, header=None, names=range(width), sep=delimiter, encoding=encoding,
+                                 dtype=object, engine='c', chunksize=self.chunk_rows, skip_blank_lines=False)
+            return pd.concat(list(chunks), ignore_index=True)
+
+        try:
+            raw_df = read_chunks(width)
+        except pd.errors.ParserError:
+            # A row further down is wider than the sampled ones
+            raw_df = read_chunks(self._widest_row(file_path, encoding, delimiter))
+        if delimiter == ';':
+            # Decimal commas of those regional exports ('5,5' -> '5.5')
+            raw_df = raw_df.replace(r'^(-?\d+),(\d+)$', r'\1.\2', regex=True)
+        # Trailing empty columns (delimiters left at the end of the rows)
+        filled = raw_df.notna().any().to_numpy().nonzero()[0]
+        return raw_df.iloc[:, :filled[-1] + 1] if len(filled) else raw_df
+
+    def close(self, file_path):
+        pass
+
+    def is_complete(self, file_path):
+        return True
+
+# Extension (lower case) -> reader
+READERS = {
+    '.xlsx': ExcelReader(['openpyxl']),
+    '.xlsm': ExcelReader(['openpyxl']),
+    '.xlsb': ExcelReader(['calamine', 'pyxlsb']),
+    '.xls': ExcelReader(['xlrd', 'calamine'], container='ole2'),
+    '.csv': CsvReader(),
+}
+
+def register_reader(extension, reader):
+    """Read files with the given extension (e.g. '.ods') with a reader object."""
+    READERS[extension.lower()] = reader
+
+def get_reader(file_path):
+    """Return the reader of a file from its extension, or None if the format is not supported."""
+    return READERS.get(os.path.splitext(file_path)[1].lower())
+
+def form_extensions():
+    """Extensions of the PET forms picked up from the inbox."""
+    return list(READERS)
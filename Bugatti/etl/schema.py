@@ -0,0 +1,193 @@
+# Compact dtypes for the pipeline frames
+#
+# Every stage output is passed through apply_schema, which assigns the compact
+# dtype of each known column once (columns already in their compact dtype are
+# left alone). The writers call to_output to turn the compact values back into
+# exactly what the output files always contained.
+import numpy as np
+import pandas as pd
+
+# Compact kind of each known column
+#   category: repeated strings (codes, names, dates kept as YYYYMMDD text)
+#   int32:    whole numbers (nullable)
+#   month:    Apply Month as YYYYMM integers ('NA' becomes missing)
+#   soa:      per-unit amounts with 2 decimals stored as float32 (float64 when
+#             float32 cannot hold every value exactly)
+#   flag:     'YES'/'NO' stored as bool
+COLUMN_TYPES = {
+    'Customer Code': 'category',
+    'Customer Name': 'category',
+    'Model Code': 'category',
+    'Type of Support': 'category',
+    'Name of Promotion': 'category',
+    'Start Date': 'category',
+    'End Date': 'category',
+    'Source File': 'category',
+    'WBW TV MODEL': 'category',
+    'Errors in Combined Extract': 'category',
+    'Customer Type': 'category',
+    'Requestor': 'category',
+    'Currency': 'category',
+    'Budget Allocation': 'category',
+    'Product Type': 'category',
+    'Mapped Sales PGM Reason Code': 'category',
+    'Sales PGM Type': 'category',
+    'Segment': 'category',
+    'PromotionName': 'category',
+    'Expected Sell-Out': 'int32',
+    'Apply Month': 'month',
+    'Additional SOA': 'soa',
+    'Is WBW': 'flag',
+    'Previously Uploaded': 'flag',
+}
+
+FLAG_VALUES = {True: 'YES', False: 'NO'}
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+def _to_int32(series, errors='raise'):
+    """Cast to nullable Int32 when every value is a whole number in range, else return None."""
+    numeric = pd.to_numeric(series, errors=errors)
+    values = numeric.dropna()
+    if not (values % 1 == 0).all() or values.lt(INT32_MIN).any() or values.gt(INT32_MAX).any():
+        return None
+    return numeric.astype('Int32')
+
+def _to_soa(series):
+    """
+    Cast SOA (always rounded to 2 decimals by the extract stage) to float32 when
+    every value survives the round trip, else to float64 rounded to 2 decimals.
+    """
+    numeric = pd.to_numeric(series).astype('float64').round(2)
+    compact = numeric.astype('float32')
+    restored = compact.astype('float64').round(2)
+    if not ((restored == numeric) | numeric.isna()).all():
+        return numeric
+    return compact
+
+def _to_flag(series):
+    """Cast 'YES'/'NO' values to bool, else return None."""
+    values = series.astype(str).str.strip().str.upper()
+    if not values.isin(['YES', 'NO']).all():
+        return None
+    return values == 'YES'
+
+def _compact_column(series, kind):
+    """Return the compact version of a column, or None to keep it as it is."""
+    if kind == 'category':
+        return None if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    if kind == 'int32':
+        return None if series.dtype == 'Int32' else _to_int32(series)
+    if kind == 'month':
+        if series.dtype == 'Int32':
+            return None
+        # Only 'NA' (months that could not be calculated) may become missing
+        numeric = pd.to_numeric(series, errors='coerce')
+        if (numeric.isna() & ~series.astype(str).eq('NA')).any():
+            return None
+        return _to_int32(numeric)
+    if kind == 'soa':
+        return None if series.dtype == 'float32' else _to_soa(series)
+    if kind == 'flag':
+        return None if series.dtype == bool else _to_flag(series)
+    return None
+
+def apply_schema(df, stage='', source_file='', footprint=None):
+    """
+    Assign the compact dtype of every known column of a stage output.
+
+    A column whose values do not fit its compact dtype (e.g. text in a quantity
+    column) is left unchanged.
+
+    Args:
+        df: Stage output
+        stage: Stage name (for the footprint report)
+        source_file: File being processed (for the footprint report)
+        footprint: Optional list receiving one memory record per call
+
+    Returns:
+        DataFrame with compact dtypes
+    """
+    if df is None or not isinstance(df, pd.DataFrame) or df.empty:
+        return df
+
+    for col, kind in COLUMN_TYPES.items():
+        if col not in df.columns:
+            continue
+        try:
+            compact = _compact_column(df[col], kind)
+        except (TypeError, ValueError):
+            compact = None
+        if compact is not None:
+            df[col] = compact
+
+    if footprint is not None:
+        footprint.append({
+            'Stage': stage,
+            'Source File': source_file,
+            'Rows': len(df),
+            'Object MB': round(object_memory_mb(df), 3),
+            'Compact MB': round(df.memory_usage(deep=True).sum() / (1024 * 1024), 3),
+        })
+
+    return df
+
+def to_output(df):
+    """
+    Turn compact dtypes back into the values the output files contain:
+    'YES'/'NO' flags, YYYYMM month text ('NA' when missing), SOA rounded to
+    2 decimals and plain Python objects instead of categories.
+
+    Args:
+        df: DataFrame with compact dtypes
+
+    Returns:
+        New DataFrame with object/float64 columns
+    """
+    out = df.copy()
+    for col in out.columns:
+        series = out[col]
+        kind = COLUMN_TYPES.get(col)
+        if kind == 'flag' and series.dtype == bool:
+            out[col] = series.map(FLAG_VALUES).astype(object)
+        elif kind == 'month' and series.dtype == 'Int32':
+            out[col] = pd.Series(['NA' if pd.isna(v) else str(v) for v in series.tolist()], index=series.index, dtype=object)
+        elif kind == 'soa' and series.dtype == 'float32':
+            out[col] = series.astype('float64').round(2)
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            out[col] = series.astype(object)
+        elif series.dtype == 'Int32':
+            out[col] = series.astype(object).where(series.notna(), None)
+    return out
+
+def widen_soa(series):
+    """Return Additional SOA as float64 for arithmetic (float32 values rounded back to 2 decimals)."""
+    series = pd.to_numeric(series, errors='coerce')
+    if series.dtype == 'float32':
+        return series.astype('float64').round(2)
+    return series.astype('float64')
+
+def object_memory_mb(df):
+    """Memory in MB the frame would take with every known column stored as object."""
+    total = df.memory_usage(deep=True, index=True).sum()
+    for col in df.columns:
+        if col in COLUMN_TYPES:
+            total -= df[col].memory_usage(deep=True, index=False)
+            total += to_output(df[[col]])[col].astype(object).memory_usage(deep=True, index=False)
+    return total / (1024 * 1024)
+
+def footprint_df(records):
+    """Per stage totals of the memory records collected by apply_schema."""
+    footprint = pd.DataFrame(records, columns=['Stage', 'Source File', 'Rows', 'Object MB', 'Compact MB'])
+    totals = footprint.groupby('Stage', sort=False, as_index=False)[['Rows', 'Object MB', 'Compact MB']].sum()
+    totals['Saved %'] = (100 * (1 - totals['Compact MB'] / totals['Object MB'].where(totals['Object MB'] > 0))).round(1)
+    return totals
+
+def print_footprint_report(records):
+    """Print the memory saved by the compact dtypes per stage."""
+    if not records:
+        return
+    print("Memory footprint (object dtypes -> compact dtypes):")
+    for _, row in footprint_df(records).iterrows():
+        print(f"  {row['Stage']:<8} {int(row['Rows']):>9} rows | {row['Object MB']:>9.2f} MB -> "
+              f"{row['Compact MB']:>8.2f} MB | saved {row['Saved %']}%")
@@ -0,0 +1,194 @@
+# Shadow mode: run the legacy and optimized engines side by side and diff their output
+import io
+import math
+import time
+import contextlib
+import numbers
+import pandas as pd
+
+# Columns identifying a row across both engines
+ROW_KEY_COLUMNS = ['Source File', 'Original Row Index', 'Apply Month']
+
+# Mismatches kept per stage and file (the total count is always reported)
+MAX_MISMATCHES_PER_STAGE = 1000
+
+def _normalize_cell(value):
+    """Normalize a cell value so equal values from both engines compare equal."""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        value = float(value)
+        if math.isnan(value):
+            return None
+        return round(value, 9)
+    return str(value)
+
+def _row_keys(df, key_columns):
+    """Build a normalized key tuple for every row of a DataFrame."""
+    if not key_columns:
+        return list(range(len(df)))
+    columns = [[_normalize_cell(v) for v in df[col].tolist()] for col in key_columns]
+    return list(zip(*columns))
+
+def diff_frames(legacy_df, optimized_df, source_file=''):
+    """
+    Compare two DataFrames cell by cell.
+
+    Rows are aligned on Source File / Original Row Index / Apply Month when these
+    columns identify rows uniquely, otherwise by position.
+
+    Args:
+        legacy_df: Output of the legacy engine
+        optimized_df: Output of the optimized engine
+        source_file: Source file used when a row has no 'Source File' column
+
+    Returns:
+        List of dictionaries describing each mismatching cell
+    """
+    legacy_df = legacy_df if legacy_df is not None else pd.DataFrame()
+    optimized_df = optimized_df if optimized_df is not None else pd.DataFrame()
+
+    key_columns = [col for col in ROW_KEY_COLUMNS if col in legacy_df.columns and col in optimized_df.columns]
+    legacy_keys = _row_keys(legacy_df, key_columns)
+    optimized_keys = _row_keys(optimized_df, key_columns)
+    if len(set(legacy_keys)) != len(legacy_keys) or len(set(optimized_keys)) != len(optimized_keys):
+        key_columns = []
+        legacy_keys = list(range(len(legacy_df)))
+        optimized_keys = list(range(len(optimized_df)))
+
+    legacy_pos = {key: pos for pos, key in enumerate(legacy_keys)}
+    optimized_pos = {key: pos for pos, key in enumerate(optimized_keys)}
+
+    def describe(df, pos):
+        record = {'Source File': source_file, 'Original Row Index': 'NA', 'Apply Month': ''}
+        if pos is not None:
+            for col in ROW_KEY_COLUMNS:
+                if col in df.columns:
+                    record[col] = df[col].iloc[pos]
+        return record
+
+    mismatches = []
+
+    # Rows produced by only one engine
+    for key, pos in legacy_pos.items():
+        if key not in optimized_pos:
+            mismatches.append({**describe(legacy_df, pos), 'Column': '<row>',
+                               'Legacy Value': 'present', 'Optimized Value': 'missing'})
+    for key, pos in optimized_pos.items():
+        if key not in legacy_pos:
+            mismatches.append({**describe(optimized_df, pos), 'Column': '<row>',
+                               'Legacy Value': 'missing', 'Optimized Value': 'present'})
+
+    # Columns produced by only one engine
+    for col in legacy_df.columns.difference(optimized_df.columns):
+        mismatches.append({**describe(legacy_df, None), 'Column': col,
+                           'Legacy Value': 'column present', 'Optimized Value': 'column missing'})
+    for col in optimized_df.columns.difference(legacy_df.columns):
+        mismatches.append({**describe(optimized_df, None), 'Column': col,
+                           'Legacy Value': 'column missing', 'Optimized Value': 'column present'})
+
+    # Cell by cell comparison on shared rows and columns
+    shared_keys = [key for key in legacy_keys if key in optimized_pos]
+    legacy_rows = [legacy_pos[key] for key in shared_keys]
+    optimized_rows = [optimized_pos[key] for key in shared_keys]
+    for col in [c for c in legacy_df.columns if c in optimized_df.columns]:
+        legacy_vals = legacy_df[col].iloc[legacy_rows].tolist()
+        optimized_vals = optimized_df[col].iloc[optimized_rows].tolist()
+        for pos, legacy_val, optimized_val in zip(legacy_rows, legacy_vals, optimized_vals):
+            if _normalize_cell(legacy_val) != _normalize_cell(optimized_val):
+                mismatches.append({**describe(legacy_df, pos), 'Column': col,
+                                   'Legacy Value': legacy_val, 'Optimized Value': optimized_val})
+
+    return mismatches
+
+def _copy_arg(arg):
+    """Copy DataFrame arguments so neither engine sees the other's in-place changes."""
+    return arg.copy() if isinstance(arg, pd.DataFrame) else arg
+
+class ShadowRecorder:
+    """Runs stages through both engines, keeping the legacy output and recording differences."""
+
+    def __init__(self, legacy_stages, optimized_stages):
+        self.legacy_stages = legacy_stages
+        self.optimized_stages = optimized_stages
+        self.timings = []
+        self.mismatches = []
+
+    def run(self, stage, source_file, *args):
+        """
+        Run one stage through both engines.
+
+        Args:
+            stage: Stage name (key of the engine dictionaries)
+            source_file: File being processed, or 'ALL' for combined stages
+            *args: Stage arguments
+
+        Returns:
+            Output of the legacy engine
+        """
+        legacy_args = [_copy_arg(a) for a in args]
+        start = time.perf_counter()
+        legacy_out = self.legacy_stages[stage](*legacy_args)
+        legacy_seconds = time.perf_counter() - start
+
+        # Keep the console output to the legacy run
+        optimized_args = [_copy_arg(a) for a in args]
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                optimized_out = self.optimized_stages[stage](*optimized_args)
+            optimized_seconds = time.perf_counter() - start
+            stage_mismatches = diff_frames(legacy_out, optimized_out, source_file)
+        except Exception as e:
+            optimized_seconds = time.perf_counter() - start
+            stage_mismatches = [{'Source File': source_file, 'Original Row Index': 'NA', 'Apply Month': '',
+                                 'Column': '<stage>', 'Legacy Value': 'ok', 'Optimized Value': f"Error: {e}"}]
+
+        self.timings.append({
+            'Stage': stage,
+            'Source File': source_file,
+            'Rows': len(legacy_out) if legacy_out is not None else 0,
+            'Legacy Seconds': round(legacy_seconds, 4),
+            'Optimized Seconds': round(optimized_seconds, 4),
+            'Speedup': round(legacy_seconds / optimized_seconds, 2) if optimized_seconds > 0 else None,
+            'Mismatches': len(stage_mismatches),
+        })
+        for record in stage_mismatches[:MAX_MISMATCHES_PER_STAGE]:
+            self.mismatches.append({'Stage': stage, **record})
+
+        if stage_mismatches:
+            print(f"⚠️ Shadow: {len(stage_mismatches)} mismatches in stage '{stage}' for {source_file}")
+
+        return legacy_out
+
+    def timings_df(self):
+        """Per stage and file timings, plus a total line per stage."""
+        timings = pd.DataFrame(self.timings, columns=['Stage', 'Source File', 'Rows', 'Legacy Seconds',
+                                                       'Optimized Seconds', 'Speedup', 'Mismatches'])
+        if timings.empty:
+            return timings
+        totals = timings.groupby('Stage', sort=False, as_index=False)[
+            ['Rows', 'Legacy Seconds', 'Optimized Seconds', 'Mismatches']
+        ].sum()
+        totals['Source File'] = 'TOTAL'
+        totals['Speedup'] = (totals['Legacy Seconds'] / totals['Optimized Seconds'].where(totals['Optimized Seconds'] > 0)).round(2)
+        return pd.concat([timings, totals[timings.columns]], ignore_index=True)
+
+    def mismatches_df(self):
+        """All recorded mismatching cells."""
+        return pd.DataFrame(self.mismatches, columns=['Stage', 'Source File', 'Original Row Index', 'Apply Month',
+                                                      'Column', 'Legacy Value', 'Optimized Value'])
+
+    def print_summary(self):
+        """Print the per-stage speedup and mismatch totals."""
+        timings = self.timings_df()
+        if timings.empty:
+            return
+        print("Shadow mode summary:")
+        for _, row in timings[timings['Source File'] == 'TOTAL'].iterrows():
+            print(f"  {row['Stage']:<8} legacy {row['Legacy Seconds']:.3f}s | optimized {row['Optimized Seconds']:.3f}s"
+                  f" | speedup x{row['Speedup']} | mismatches {row['Mismatches']}")
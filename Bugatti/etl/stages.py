@@ -0,0 +1,385 @@
+# Stage implementations for the PET form pipeline
+#
+# Every stage exists in two engines:
+#   - legacy:    the original row-wise code (apply / iterrows) moved out of main.py
+#   - optimized: the same rules evaluated once per distinct value and written back
+#                with whole-column operations
+#
+# Both engines must produce the same frames; shadow mode (etl/shadow.py) runs them
+# side by side to prove it on real forms.
+import os
+import pandas as pd
+
+from etl.parser import parse_and_correct_date, is_likely_customer_code, is_likely_customer_name, standardize_customer_code
+from etl.mapping import map_all_promo_metadata, classify_model_code
+from etl.grouping import group_similar_rows, distribute_quantities_by_month, expand_by_apply_month
+from etl.schema import widen_soa
+from etl.normalization import normalize_columns
+from etl.customer_resolver import get_customer_index
+from writers.promo_naming import build_name_of_promotion
+
+# Columns extracted from every PET form (based on column mapping)
+REQUIRED_COLUMNS = [
+    'Customer Code', 'Customer Name', 'Model Code', 'Type of Support',
+    'Additional SOA', 'Expected Sell-Out', 'Start Date', 'End Date',
+    'Expected Cost', 'Name of Promotion'
+]
+
+# Columns used to build the promotion name
+PROMOTION_NAME_COLUMNS = [
+    'Customer Name', 'Segment', 'Name of Promotion', 'Start Date',
+    'End Date', 'Budget Allocation', 'Type of Support'
+]
+
+STAGE_NAMES = ['extract', 'group', 'expand', 'enrich', 'name']
+
+def _clean_headers(cleaned_df):
+    """Clean headers to avoid hidden formatting mismatches and drop duplicate columns."""
+    cleaned_df.columns = cleaned_df.columns.astype(str).str.strip().str.replace(r'\s+', ' ', regex=True)
+    return cleaned_df.loc[:, ~cleaned_df.columns.duplicated()]
+
+def _map_unique(series, func):
+    """
+    Apply a scalar function once per distinct value of a Series.
+
+    Args:
+        series: Series to transform
+        func: Function taking a single cell value
+
+    Returns:
+        Series with func applied, aligned to the input index
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    results = pd.Series([func(val) for val in uniques], dtype=object)
+    return pd.Series(results.to_numpy()[codes], index=series.index, dtype=object)
+
+def _map_unique_rows(df, columns, func):
+    """
+    Apply a function once per distinct combination of values in the given columns.
+
+    Args:
+        df: DataFrame to read from
+        columns: Columns passed to func as a dictionary
+        func: Function taking a dictionary of column values
+
+    Returns:
+        List of results, one per row of df
+    """
+    cache = {}
+    results = []
+    for values in zip(*(df[col].tolist() for col in columns)):
+        try:
+            results.append(cache[values])
+        except KeyError:
+            cache[values] = func(dict(zip(columns, values)))
+            results.append(cache[values])
+        except TypeError:
+            # Unhashable cell value - evaluate without caching
+            results.append(func(dict(zip(columns, values))))
+    return results
+
+# -------------------------------------------------------------------
+# EXTRACT: select required columns and correct row values
+# -------------------------------------------------------------------
+
+def _fill_required_columns(cleaned_df):
+    """Select the required columns and fill missing ones with default values."""
+    extracted_df = cleaned_df.reindex(columns=REQUIRED_COLUMNS)
+
+    for col in REQUIRED_COLUMNS:
+        if col not in extracted_df.columns or extracted_df[col].isnull().all():
+            if col in ['Expected Sell-Out', 'Additional SOA']:
+                extracted_df[col] = 0
+            elif col in ['Start Date', 'End Date']:
+                extracted_df[col] = '19000101'
+            else:
+                extracted_df[col] = "NA"
+
+    # Standardize customer codes first (before swap detection)
+    extracted_df['Customer Code'] = extracted_df['Customer Code'].astype(str).fillna('NA')
+    extracted_df['Customer Name'] = extracted_df['Customer Name'].astype(str).fillna('NA')
+
+    return extracted_df
+
+def extract_columns_legacy(cleaned_df, file_path):
+    """
+    Extract the required columns from a cleaned PET form and correct row values (row-wise).
+
+    Args:
+        cleaned_df: DataFrame returned by load_and_clean_excel
+        file_path: Path of the source PET form
+
+    Returns:
+        DataFrame with one row per PET form line
+    """
+    cleaned_df = _clean_headers(cleaned_df)
+    extracted_df = _fill_required_columns(cleaned_df)
+
+    # Standardize Customer Codes - apply proper case formatting
+    extracted_df['Customer Code'] = extracted_df['Customer Code'].apply(standardize_customer_code)
+
+    # Auto-fix swapped Customer Name & Customer Code if needed
+    mask_swapped = extracted_df.apply(
+        lambda row: is_likely_customer_code(row['Customer Name']) and is_likely_customer_name(row['Customer Code']),
+        axis=1
+    )
+
+    if mask_swapped.sum() > 0:
+        # Store the swapped values temporarily
+        temp_codes = extracted_df.loc[mask_swapped, 'Customer Name'].apply(standardize_customer_code)
+        temp_names = extracted_df.loc[mask_swapped, 'Customer Code']
+
+        # Apply the swap
+        extracted_df.loc[mask_swapped, 'Customer Code'] = temp_codes
+        extracted_df.loc[mask_swapped, 'Customer Name'] = temp_names
+
+        print(f"Fixed {mask_swapped.sum()} rows with swapped customer code/name")
+
+    # Ensure all customer codes are properly standardized after potential swaps
+    extracted_df['Customer Code'] = extracted_df['Customer Code'].apply(standardize_customer_code)
+
+    # Round Additional SOA to 2 decimal places
+    extracted_df['Additional SOA'] = pd.to_numeric(extracted_df['Additional SOA'], errors='coerce').round(2)
+
+    # Normalize dates
+    extracted_df['Start Date'] = extracted_df['Start Date'].apply(lambda x: parse_and_correct_date(x, is_start=True))
+    extracted_df['End Date'] = extracted_df.apply(
+        lambda row: parse_and_correct_date(row['End Date'], is_start=False, start_reference=row['Start Date']),
+        axis=1
+    )
+
+    # Convert Expected Sell-Out to numeric and round
+    extracted_df['Expected Sell-Out'] = pd.to_numeric(extracted_df['Expected Sell-Out'], errors='coerce').fillna(0)
+    extracted_df['Expected Sell-Out'] = extracted_df['Expected Sell-Out'].round(0)
+
+    # Preserve row order and source file info
+    extracted_df['Original Row Index'] = range(len(extracted_df))
+    extracted_df['Source File'] = os.path.basename(file_path)
+
+    return normalize_columns(extracted_df, cleaned_df)
+
+def extract_columns_optimized(cleaned_df, file_path):
+    """
+    Extract the required columns from a cleaned PET form, evaluating the
+    customer code and date rules once per distinct value.
+
+    Args:
+        cleaned_df: DataFrame returned by load_and_clean_excel
+        file_path: Path of the source PET form
+
+    Returns:
+        DataFrame with one row per PET form line
+    """
+    cleaned_df = _clean_headers(cleaned_df)
+    extracted_df = _fill_required_columns(cleaned_df)
+
+    codes = _map_unique(extracted_df['Customer Code'], standardize_customer_code)
+    names = extracted_df['Customer Name']
+
+    # Swapped rows: the name looks like a code and the code looks like a name
+    mask_swapped = (
+        _map_unique(names, is_likely_customer_code).astype(bool) &
+        _map_unique(codes, is_likely_customer_name).astype(bool)
+    )
+
+    if mask_swapped.any():
+        swapped_codes = names.where(mask_swapped, codes)
+        names = codes.where(mask_swapped, names)
+        codes = swapped_codes
+        print(f"Fixed {mask_swapped.sum()} rows with swapped customer code/name")
+
+    extracted_df['Customer Code'] = _map_unique(codes, standardize_customer_code)
+    extracted_df['Customer Name'] = names
+
+    # Round Additional SOA to 2 decimal places
+    extracted_df['Additional SOA'] = pd.to_numeric(extracted_df['Additional SOA'], errors='coerce').round(2)
+
+    # Normalize dates - end dates depend on the corrected start date
+    extracted_df['Start Date'] = _map_unique(
+        extracted_df['Start Date'], lambda x: parse_and_correct_date(x, is_start=True)
+    )
+    extracted_df['End Date'] = _map_unique_rows(
+        extracted_df, ['End Date', 'Start Date'],
+        lambda row: parse_and_correct_date(row['End Date'], is_start=False, start_reference=row['Start Date'])
+    )
+
+    # Convert Expected Sell-Out to numeric and round
+    extracted_df['Expected Sell-Out'] = pd.to_numeric(extracted_df['Expected Sell-Out'], errors='coerce').fillna(0).round(0)
+
+    # Preserve row order and source file info
+    extracted_df['Original Row Index'] = range(len(extracted_df))
+    extracted_df['Source File'] = os.path.basename(file_path)
+
+    return normalize_columns(extracted_df, cleaned_df)
+
+# -------------------------------------------------------------------
+# ENRICH: customer mapping, cost and promotion metadata
+# -------------------------------------------------------------------
+
+def _resolve_unknown_customers(combined_df, df_mapping):
+    """
+    Fill missing or unknown customer codes from a fuzzy match of the customer
+    name against the mapping. Resolved rows keep the submitted code in
+    'Original Customer Code' and the match score in 'Customer Match Confidence';
+    both columns are always added (empty when nothing is resolved) so every
+    chunk and output has the same columns.
+    """
+    combined_df['Original Customer Code'] = pd.Series(None, index=combined_df.index, dtype=object)
+    combined_df['Customer Match Confidence'] = pd.Series(index=combined_df.index, dtype='float64')
+    if 'Customer Name' not in combined_df.columns or df_mapping.empty:
+        return combined_df
+
+    unknown = ~combined_df['Customer Code'].astype(str).isin(set(df_mapping['Customer Code']))
+    names = combined_df.loc[unknown, 'Customer Name'].dropna().astype(str)
+    names = names[~names.str.strip().str.upper().isin(['', 'NA', 'NAN'])]
+    if names.empty:
+        return combined_df
+
+    resolved = get_customer_index(df_mapping).resolve(names.unique().tolist())
+    if not resolved:
+        return combined_df
+
+    matches = names.map(lambda name: resolved.get(name)).dropna()
+    # Missing submitted codes stay empty rather than 'NA' (which would highlight the row)
+    submitted = combined_df.loc[matches.index, 'Customer Code'].astype(str).str.strip()
+    combined_df.loc[matches.index, 'Original Customer Code'] = submitted.where(
+        ~submitted.str.upper().isin(['', 'NA', 'NAN']), None)
+    combined_df['Customer Code'] = combined_df['Customer Code'].astype(object)
+    combined_df.loc[matches.index, 'Customer Code'] = [code for code, _ in matches]
+    combined_df.loc[matches.index, 'Customer Match Confidence'] = [score for _, score in matches]
+    print(f"🔎 Resolved {len(matches)} rows ({len(resolved)} customer names) from the customer name")
+    return combined_df
+
+def _merge_customer_mapping(combined_df, df_mapping, join=None):
+    """
+    Calculate Total SOA and merge the customer mapping columns.
+
+    join: Optional function join(combined_df, mapping_df) replacing the pandas
+    left merge on Customer Code (used by the Polars backend)
+    """
+    # Calculate Total SOA (Expected Cost) in float64 (SOA may be stored as float32)
+    sell_out = pd.to_numeric(combined_df['Expected Sell-Out'], errors='coerce').astype('float64')
+    combined_df['Expected Cost'] = (widen_soa(combined_df['Additional SOA']) * sell_out).round(2)
+
+    # Codes missing from the mapping are resolved from the customer name when it matches an account
+    combined_df = _resolve_unknown_customers(combined_df, df_mapping)
+
+    # Merge with customer mapping
+    mapping_df = df_mapping[['Customer Code', 'Customer Type', 'Requestor', 'Currency']]
+    if join is not None:
+        combined_df = join(combined_df, mapping_df)
+    else:
+        combined_df = combined_df.merge(mapping_df, on='Customer Code', how='left')
+
+    # Fill missing mapped values
+    combined_df[['Customer Type', 'Requestor', 'Currency']] = combined_df[['Customer Type', 'Requestor', 'Currency']].fillna('NA')
+
+    return combined_df
+
+def enrich_legacy(combined_df, df_mapping):
+    """
+    Enrich the combined frame with customer mapping and promotion metadata (row-wise).
+
+    Args:
+        combined_df: Expanded rows of all PET forms
+        df_mapping: Customer mapping DataFrame
+
+    Returns:
+        Enriched DataFrame
+    """
+    # Final check to ensure all customer codes are standardized
+    combined_df['Customer Code'] = combined_df['Customer Code'].apply(standardize_customer_code)
+
+    combined_df = _merge_customer_mapping(combined_df, df_mapping)
+
+    # Apply mapping logic
+    combined_df[['Budget Allocation', 'Product Type', 'Mapped Sales PGM Reason Code', 'Sales PGM Type']] = combined_df.apply(
+        lambda row: pd.Series(map_all_promo_metadata(row['Model Code'], row.get('Type of Support', ''))),
+        axis=1
+    )
+
+    # Classify model codes
+    combined_df['Segment'] = combined_df['Model Code'].apply(classify_model_code)
+
+    return combined_df
+
+def enrich_optimized(combined_df, df_mapping, join=None):
+    """
+    Enrich the combined frame, mapping metadata once per distinct
+    (Model Code, Type of Support) pair.
+
+    Args:
+        combined_df: Expanded rows of all PET forms
+        df_mapping: Customer mapping DataFrame
+        join: Optional replacement of the customer mapping merge (see _merge_customer_mapping)
+
+    Returns:
+        Enriched DataFrame
+    """
+    combined_df['Customer Code'] = _map_unique(combined_df['Customer Code'], standardize_customer_code)
+    combined_df = _merge_customer_mapping(combined_df, df_mapping, join)
+
+    metadata = _map_unique_rows(
+        combined_df, [col for col in ['Model Code', 'Type of Support'] if col in combined_df.columns],
+        lambda row: map_all_promo_metadata(row['Model Code'], row.get('Type of Support', ''))
+    )
+    metadata_cols = ['Budget Allocation', 'Product Type', 'Mapped Sales PGM Reason Code', 'Sales PGM Type']
+    combined_df[metadata_cols] = pd.DataFrame(metadata, columns=metadata_cols, index=combined_df.index)
+
+    combined_df['Segment'] = _map_unique(combined_df['Model Code'], classify_model_code)
+
+    return combined_df
+
+# -------------------------------------------------------------------
+# NAME: promotion names
+# -------------------------------------------------------------------
+
+def name_legacy(combined_df):
+    """Build promotion names row by row."""
+    combined_df['PromotionName'] = combined_df.apply(build_name_of_promotion, axis=1)
+    return combined_df
+
+def name_optimized(combined_df):
+    """Build promotion names once per distinct combination of the name columns."""
+    columns = [col for col in PROMOTION_NAME_COLUMNS if col in combined_df.columns]
+    combined_df['PromotionName'] = _map_unique_rows(combined_df, columns, build_name_of_promotion)
+    return combined_df
+
+# Stage functions per engine
+ENGINES = {
+    'legacy': {
+        'extract': extract_columns_legacy,
+        'group': group_similar_rows,
+        'expand': distribute_quantities_by_month,
+        'enrich': enrich_legacy,
+        'name': name_legacy,
+    },
+    'optimized': {
+        'extract': extract_columns_optimized,
+        'group': group_similar_rows,
+        'expand': expand_by_apply_month,
+        'enrich': enrich_optimized,
+        'name': name_optimized,
+    },
+}
+
+def resolve_engine(name):
+    """
+    Return the engine to run for a requested engine name: 'polars' falls back
+    to 'optimized' when Polars is not installed.
+    """
+    if name == 'polars':
+        from etl.polars_stages import POLARS_ENGINE
+        if POLARS_ENGINE is None:
+            print("⚠️ Polars is not installed; using the optimized pandas engine")
+            return 'optimized'
+    return name
+
+def get_engine(name):
+    """Return the stage functions of an engine ('legacy', 'optimized' or 'polars')."""
+    if name == 'polars':
+        from etl.polars_stages import POLARS_ENGINE
+        if POLARS_ENGINE is None:
+            raise ImportError("The polars engine needs the polars package")
+        return POLARS_ENGINE
+    return ENGINES[name]
@@ -0,0 +1,305 @@
+# Supervised per-file workers with wall-clock and memory budgets
+import os
+import sys
+import time
+import shutil
+import multiprocessing
+from multiprocessing.connection import wait
+from datetime import datetime
+
+from config.constants import FILE_TIME_BUDGET_SECONDS, FILE_MEMORY_BUDGET_MB, MAX_ROWS_IN_FLIGHT
+
+# Seconds between budget checks
+POLL_INTERVAL = 0.2
+
+def process_memory_mb(pid):
+    """
+    Return the resident memory of a process in MB, or None if it cannot be measured.
+
+    Uses psutil when installed, /proc on Linux and the Win32 API on Windows.
+    """
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    status_file = f"/proc/{pid}/status"
+    if os.path.exists(status_file):
+        try:
+            with open(status_file) as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            PROCESS_QUERY_INFORMATION, PROCESS_VM_READ = 0x0400, 0x0010
+            handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_INFORMATION | PROCESS_VM_READ, False, pid)
+            if not handle:
+                return None
+            try:
+                counters = PROCESS_MEMORY_COUNTERS()
+                counters.cb = ctypes.sizeof(counters)
+                if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                    return counters.WorkingSetSize / (1024 * 1024)
+            finally:
+                ctypes.windll.kernel32.CloseHandle(handle)
+        except Exception:
+            return None
+
+    return None
+
+def quarantine_file(file_path, quarantine_dir, note):
+    """
+    Move a PET form to the quarantine folder and write a diagnostic note next to it.
+
+    Args:
+        file_path: Path to the PET form
+        quarantine_dir: Quarantine folder (next to PetForms)
+        note: Dictionary of diagnostic values
+
+    Returns:
+        New path of the quarantined file
+    """
+    os.makedirs(quarantine_dir, exist_ok=True)
+    name, ext = os.path.splitext(os.path.basename(file_path))
+    target = os.path.join(quarantine_dir, name + ext)
+    if os.path.exists(target):
+        target = os.path.join(quarantine_dir, f"{name}_{datetime.now():%Y%m%d_%H%M%S}{ext}")
+
+    shutil.move(file_path, target)
+
+    with open(os.path.splitext(target)[0] + ".txt", "w", encoding="utf-8") as f:
+        f.write(f"Quarantined: {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+        f.write(f"Source file: {file_path}\n")
+        for key, value in note.items():
+            f.write(f"{key}: {value}\n")
+
+    return target
+
+def _worker_main(conn, engine, shadow, memory_report=False):
+    """
+    Worker process: stays warm between files, running the per-file stages for
+    each path received and sending progress and the result to the supervisor.
+    """
+    from etl.pipeline import make_stage_runner, process_form
+    from etl.shadow import ShadowRecorder
+    from etl.stages import ENGINES
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        file_path, sheet_name, delta_dir = task
+        # Memory of the warm worker before this file, which the budget does not count
+        conn.send(('start', process_memory_mb(os.getpid())))
+
+        recorder = ShadowRecorder(ENGINES['legacy'], ENGINES['optimized']) if shadow else None
+        footprint = [] if memory_report else None
+        signature = {}
+        delta = {'cache_dir': delta_dir} if delta_dir else None
+        run_stage = make_stage_runner(engine, recorder, footprint)
+        try:
+            result = process_form(file_path, run_stage, progress=lambda stage, rows: conn.send(('progress', (stage, rows))),
+                                  sheet_name=sheet_name, signature=signature, delta=delta)
+            shadow_records = (recorder.timings, recorder.mismatches) if recorder else None
+            conn.send(('result', (result, shadow_records, footprint, signature, delta)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+    conn.close()
+
+def run_supervised(file_paths, quarantine_dir, engine='legacy', shadow=False,
+                   time_budget=FILE_TIME_BUDGET_SECONDS, memory_budget=FILE_MEMORY_BUDGET_MB, max_workers=1,
+                   max_rows_in_flight=MAX_ROWS_IN_FLIGHT, memory_report=False, prefetcher=None, catalog=None,
+                   delta_dirs=None):
+    """
+    Process PET forms in a pool of supervised worker processes.
+
+    Workers stay warm between files, so the memory budget is charged for what a
+    worker's resident memory grows by during a file (from the idle worker's
+    memory at file start), not for what earlier files left behind. A worker
+    exceeding the wall-clock or memory budget on a file is killed (and replaced) and the file is moved to the
+    quarantine folder with a diagnostic note; the remaining files continue.
+    A worker dying for any other reason is replaced and its file is reported
+    as an error and left where it is.
+    No new file is started while the busy workers already hold max_rows_in_flight
+    rows, and results are only collected when the caller asks for the next one.
+
+    Args:
+        file_paths: PET forms to process, in scheduling order
+        quarantine_dir: Folder receiving files that exceed the budget, or a
+            dictionary mapping each file path to its folder
+        engine: Stage implementations to use ('legacy' or 'optimized')
+        shadow: Run both engines in the workers
+        time_budget: Seconds allowed per file (None for no limit)
+        memory_budget: MB a worker's resident memory may grow by during a file (None for no limit)
+        max_workers: Number of worker processes
+        max_rows_in_flight: Rows the busy workers may hold before dispatching pauses
+            (None for no limit)
+        memory_report: Record the memory footprint of every stage output
+        prefetcher: Optional Prefetcher providing local copies of the files; a file
+            is handed to a worker once its copy is ready (or when no worker is busy)
+        catalog: Optional catalog from etl.catalog.build_catalog; gives the workers
+            the matching sheet and counts the estimated rows of a file as in flight
+            until the worker reports the real count
+        delta_dirs: Optional dictionary mapping each file path to the delta cache
+            folder of its member (row-level delta processing, see etl.delta)
+
+    Yields:
+        Dictionaries with file_path, status ('ok', 'skipped', 'quarantined' or 'error'),
+        result (expanded DataFrame), shadow (timings, mismatches), footprint
+        (memory records), signature (content signature of the form), delta
+        (see etl.delta.diff_against_previous, None when off) and note
+    """
+    ctx = multiprocessing.get_context("spawn")
+    pending = list(file_paths)
+    workers = []
+
+    def start_worker():
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker_main, args=(child_conn, engine, shadow, memory_report), daemon=True)
+        process.start()
+        child_conn.close()
+        worker = {'process': process, 'conn': parent_conn, 'file_path': None}
+        workers.append(worker)
+        return worker
+
+    def stop_worker(worker):
+        workers.remove(worker)
+        worker['process'].kill()
+        worker['process'].join(timeout=5)
+        worker['conn'].close()
+
+    def finish(worker, status, result=None, shadow_records=None, footprint=None, signature=None, delta=None,
+               note=None):
+        if prefetcher is not None:
+            prefetcher.release(worker['file_path'])
+        outcome = {'file_path': worker['file_path'], 'status': status, 'result': result,
+                   'shadow': shadow_records, 'footprint': footprint, 'signature': signature, 'delta': delta,
+                   'note': note}
+        worker['file_path'] = None
+        return outcome
+
+    def quarantine(worker, reason):
+        elapsed = time.monotonic() - worker['started']
+        file_path = worker['file_path']
+        note = {
+            'Reason': reason,
+            'Stage reached': worker['stage'],
+            'Rows seen': worker['rows'],
+            'Elapsed seconds': round(elapsed, 1),
+            'Peak memory MB': round(worker['peak_mb'], 1),
+            'Memory at file start MB': round(worker['base_mb'] or 0.0, 1),
+        }
+        stop_worker(worker)
+        folder = quarantine_dir.get(file_path) if isinstance(quarantine_dir, dict) else quarantine_dir
+        target = quarantine_file(file_path, folder, note)
+        print(f"⛔ Quarantined {os.path.basename(file_path)}: {reason} "
+              f"(stage '{note['Stage reached']}', {note['Rows seen']} rows, {elapsed:.1f}s) -> {target}")
+        return finish(worker, 'quarantined', note=note)
+
+    try:
+        while True:
+            # Hand pending files to idle workers, starting workers up to the limit
+            while pending:
+                idle = [w for w in workers if w['file_path'] is None]
+                if not idle and len(workers) >= max_workers:
+                    break
+                busy = [w for w in workers if w['file_path'] is not None]
+                in_flight = sum(max(w['rows'], w['estimated_rows']) for w in busy)
+                if max_rows_in_flight and in_flight >= max_rows_in_flight:
+                    break
+                # Don't block on a copy still in progress while other files are running
+                if prefetcher is not None and busy and not prefetcher.ready(pending[0]):
+                    break
+                local_path = prefetcher.get(pending[0]) if prefetcher is not None else pending[0]
+                entry = (catalog or {}).get(pending[0]) or {}
+                worker = idle[0] if idle else start_worker()
+                # base_mb comes with the worker's 'start' message (a new worker is still importing until then)
+                worker.update(file_path=pending.pop(0), started=time.monotonic(), stage='start',
+                              rows=0, estimated_rows=entry.get('rows') or 0, peak_mb=0.0, base_mb=None)
+                print(f"Processing: {os.path.basename(worker['file_path'])}")
+                worker['conn'].send((local_path, entry.get('sheet_name'), (delta_dirs or {}).get(worker['file_path'])))
+
+            busy = [w for w in workers if w['file_path'] is not None]
+            if not busy:
+                break
+
+            # Collect messages from the workers (each worker has its own pipe, so
+            # killing one cannot corrupt the others). Every waiting message is read
+            # before the budgets are checked: a file whose result came in while the
+            # caller was busy with another outcome is done, whatever the clock says.
+            wait([w['conn'] for w in busy], timeout=POLL_INTERVAL)
+            outcomes = []
+            for worker in busy:
+                while worker['file_path'] is not None and worker['conn'].poll():
+                    try:
+                        kind, payload = worker['conn'].recv()
+                    except (EOFError, OSError):
+                        # Not the form's fault as far as we know (spawn, import or
+                        # environment failure): report it and leave the form in place
+                        worker['process'].join(timeout=5)
+                        note = f"Worker exited unexpectedly (exit code {worker['process'].exitcode})"
+                        print(f"Error processing {os.path.basename(worker['file_path'])}: {note}")
+                        stop_worker(worker)
+                        outcomes.append(finish(worker, 'error', note=note))
+                        break
+
+                    if kind == 'start':
+                        worker['base_mb'] = payload or 0.0
+                    elif kind == 'progress':
+                        worker['stage'], rows = payload
+                        worker['rows'] = max(worker['rows'], rows)
+                    elif kind == 'result':
+                        result, shadow_records, footprint, signature, delta = payload
+                        outcomes.append(finish(worker, 'ok' if result is not None else 'skipped', result,
+                                               shadow_records, footprint, signature, delta))
+                    else:
+                        print(f"Error processing {os.path.basename(worker['file_path'])}: {payload}")
+                        outcomes.append(finish(worker, 'error', note=payload))
+
+            # Enforce the budgets on the files still running
+            for worker in [w for w in workers if w['file_path'] is not None]:
+                elapsed = time.monotonic() - worker['started']
+                worker['peak_mb'] = max(worker['peak_mb'], process_memory_mb(worker['process'].pid) or 0.0)
+
+                if time_budget and elapsed > time_budget:
+                    outcomes.append(quarantine(worker, f"Exceeded time budget of {time_budget}s"))
+                elif memory_budget and worker['base_mb'] is not None and worker['peak_mb'] - worker['base_mb'] > memory_budget:
+                    outcomes.append(quarantine(worker, f"Exceeded memory budget of {memory_budget} MB "
+                                                       f"(grew by {worker['peak_mb'] - worker['base_mb']:.0f} MB)"))
+
+            yield from outcomes
+    finally:
+        # Ask idle workers to exit, kill anything still running
+        for worker in list(workers):
+            try:
+                worker['conn'].send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in list(workers):
+            worker['process'].join(timeout=5)
+            if worker['process'].is_alive():
+                worker['process'].kill()
+            worker['conn'].close()
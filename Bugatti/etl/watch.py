@@ -0,0 +1,99 @@
+# Watch mode: process PET forms as they land in the PetForms folders
+#
+# Folders are polled, which works the same on the J: share and on local disks
+# (no inotify or ReadDirectoryChangesW dependency). A form is ready once its size
+# and modification time have not changed for the settle time and its reader sees
+# a complete file (a whole zip for .xlsx), so forms still being copied are left
+# alone. The forms already processed, with their size and modification time, are
+# kept in a state file so a restarted watcher does not process them again.
+import os
+import json
+import time
+
+from etl.readers import get_reader
+
+WATCH_STATE_FILE = "watch_state.json"
+
+def _file_stamp(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+class FolderWatcher:
+    """Debounced view of the PetForms folders and the forms already processed."""
+
+    def __init__(self, state_dir, settle_seconds):
+        """
+        Args:
+            state_dir: Directory holding the state file
+            settle_seconds: Seconds a form must stay unchanged before it is ready
+        """
+        self.state_file = os.path.join(state_dir, WATCH_STATE_FILE)
+        self.settle_seconds = settle_seconds
+        self.seen = {}
+        self.ready_stamps = {}
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                self.processed = json.load(f)
+        except (OSError, ValueError):
+            self.processed = {}
+
+    def _is_ready(self, file_path, stamp, now):
+        """A form is ready when it was processed as it is, or is settled and complete."""
+        if self.processed.get(file_path) == stamp:
+            return True
+        previous = self.seen.get(file_path)
+        if previous is None or previous[0] != stamp:
+            self.seen[file_path] = (stamp, now)
+            return False
+        reader = get_reader(file_path)
+        return now - previous[1] >= self.settle_seconds and reader is not None and reader.is_complete(file_path)
+
+    def poll(self, folder, file_paths, now=None):
+        """
+        Check the forms of one PetForms folder.
+
+        Args:
+            folder: PetForms folder
+            file_paths: Forms currently in the folder
+            now: Current time (defaults to time.monotonic())
+
+        Returns:
+            Tuple (forms ready to be processed, whether the folder changed since
+            it was last processed: a form is new or changed, or was removed)
+        """
+        now = time.monotonic() if now is None else now
+        ready, changed = [], False
+        for file_path in file_paths:
+            stamp = _file_stamp(file_path)
+            if stamp is None or os.path.basename(file_path).startswith("~$"):
+                continue
+            if self._is_ready(file_path, stamp, now):
+                ready.append(file_path)
+                self.ready_stamps[file_path] = stamp
+                changed |= self.processed.get(file_path) != stamp
+        changed |= bool(self.removed(folder, file_paths))
+        return ready, changed
+
+    def removed(self, folder, file_paths):
+        """Processed forms of a folder that are no longer in it."""
+        current = set(file_paths)
+        return [path for path in self.processed if os.path.dirname(path) == folder and path not in current]
+
+    def mark_processed(self, folder, file_paths):
+        """
+        Record the forms of a folder as processed, as they were when found ready
+        (replacing the folder's previous state).
+        """
+        self.processed = {path: stamp for path, stamp in self.processed.items() if os.path.dirname(path) != folder}
+        for file_path in file_paths:
+            stamp = self.ready_stamps.pop(file_path, None)
+            # Forms moved to Quarantine while they were processed are not recorded
+            if stamp is not None and os.path.exists(file_path):
+                self.processed[file_path] = stamp
+        temp_file = f"{self.state_file}.tmp"
+        with open(temp_file, 'w', encoding="utf-8") as f:
+            json.dump(self.processed, f, indent=1)
+        os.replace(temp_file, self.state_file)
@@ -0,0 +1,480 @@
+# Work queue on the shared drive: PET forms processed by several machines
+#
+# The coordinator puts one task per form in the queue directory. Any machine
+# that can see the share claims a task by renaming it from pending/ to claimed/
+# (a rename is atomic, so exactly one machine wins), keeps the claim alive by
+# touching it while it works, and leaves the enriched and named rows in
+# results/. A claim whose modification time has not moved for the lease time is
+# renamed back to pending/ by whoever notices; the lease is judged by the
+# observer's own clock, so clocks that disagree between machines do not matter.
+# The coordinator merges the results into the member's outputs.
+#
+# Every machine runs the tasks in a warm worker process under the coordinator's
+# time and memory budgets (as etl.supervisor does for local runs): a worker
+# running over either budget is killed and replaced and the form is quarantined.
+#
+#   queue_dir/pending/<task>.json   waiting
+#   queue_dir/claimed/<task>.json   being processed (touched every lease / 3)
+#   queue_dir/results/<task>.pkl    rows, signature and delta of the form
+#   queue_dir/failed/<task>.json    forms that could not be processed
+import os
+import json
+import time
+import pickle
+import socket
+import hashlib
+import threading
+import multiprocessing
+from datetime import datetime
+
+from config.constants import QUEUE_POLL_SECONDS, QUEUE_IDLE_SECONDS
+from etl.supervisor import POLL_INTERVAL, process_memory_mb, quarantine_file
+
+QUEUE_FOLDERS = ['pending', 'claimed', 'results', 'failed']
+
+def _write_atomic(path, data):
+    """Write bytes under a temporary name and rename them into place."""
+    temp_file = f"{path}.{socket.gethostname()}-{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file, path)
+
+def task_id(file_path):
+    """Task of a form: its path and its size and modification time (a changed form is a new task)."""
+    stat = os.stat(file_path)
+    return hashlib.sha1(f"{file_path}\n{stat.st_size}\n{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+class WorkQueue:
+    """Queue directory shared by the coordinator and the workers."""
+
+    def __init__(self, queue_dir, lease_seconds, worker_id=None):
+        """
+        Args:
+            queue_dir: Queue directory on the shared drive
+            lease_seconds: Seconds a claim may go untouched before it is taken back
+            worker_id: Name of this worker (defaults to host name and process id)
+        """
+        self.queue_dir = queue_dir
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.observed = {}
+        for folder in QUEUE_FOLDERS:
+            os.makedirs(os.path.join(queue_dir, folder), exist_ok=True)
+
+    def _path(self, folder, task, extension="json"):
+        return os.path.join(self.queue_dir, folder, f"{task}.{extension}")
+
+    def enqueue(self, task):
+        """
+        Add a task unless it is already queued, claimed or done (a coordinator
+        restarted after a crash reuses the results of the previous attempt).
+
+        Args:
+            task: Task dictionary with a 'task_id'
+        """
+        name = task['task_id']
+        if any(os.path.exists(self._path(folder, name)) for folder in ('pending', 'claimed', 'failed')) \
+                or os.path.exists(self._path('results', name, 'pkl')):
+            return
+        _write_atomic(self._path('pending', name), json.dumps(task).encode("utf-8"))
+
+    def claim(self, task_ids=None):
+        """
+        Claim the oldest pending task.
+
+        Args:
+            task_ids: Only claim one of these tasks (None for any task)
+
+        Returns:
+            Task dictionary, or None if there is nothing to claim
+        """
+        # Oldest first, so tasks are taken in the order the coordinator planned
+        entries = []
+        for entry in os.scandir(os.path.join(self.queue_dir, 'pending')):
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry.name, entry))
+            except OSError:
+                continue  # Claimed meanwhile
+        for _, _, entry in sorted(entries):
+            name, extension = os.path.splitext(entry.name)
+            if extension != '.json' or (task_ids is not None and name not in task_ids):
+                continue
+            claimed = self._path('claimed', name)
+            try:
+                os.rename(entry.path, claimed)
+            except OSError:
+                continue  # Another worker claimed it first
+            os.utime(claimed)
+            try:
+                with open(claimed, encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                continue
+        return None
+
+    def expire_stale(self):
+        """
+        Put back claims untouched for the lease time (their worker stopped).
+
+        Returns:
+            Number of tasks put back
+        """
+        now = time.monotonic()
+        expired = 0
+        claimed_dir = os.path.join(self.queue_dir, 'claimed')
+        current = set()
+        for entry in os.scandir(claimed_dir):
+            try:
+                mtime = entry.stat().st_mtime_ns
+            except OSError:
+                continue
+            current.add(entry.name)
+            seen = self.observed.get(entry.name)
+            if seen is None or seen[0] != mtime:
+                self.observed[entry.name] = (mtime, now)
+            elif now - seen[1] >= self.lease_seconds:
+                try:
+                    os.rename(entry.path, os.path.join(self.queue_dir, 'pending', entry.name))
+                    print(f"⏱️ Lease of task {entry.name} expired; back in the queue")
+                    expired += 1
+                except OSError:
+                    pass
+                self.observed.pop(entry.name, None)
+        self.observed = {name: seen for name, seen in self.observed.items() if name in current}
+        return expired
+
+    def complete(self, task, payload):
+        """Store the result of a claimed task and release the claim."""
+        _write_atomic(self._path('results', task['task_id'], 'pkl'),
+                      pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+        self._release(task)
+
+    def fail(self, task, note, quarantined=False):
+        """Record a task that could not be processed (or whose form was quarantined) and release the claim."""
+        record = dict(task, note=note, quarantined=quarantined, worker=self.worker_id,
+                      failed=datetime.now().isoformat(timespec='seconds'))
+        _write_atomic(self._path('failed', task['task_id']), json.dumps(record).encode("utf-8"))
+        self._release(task)
+
+    def _release(self, task):
+        try:
+            os.remove(self._path('claimed', task['task_id']))
+        except OSError:
+            pass  # The lease expired and the task was put back or claimed again
+
+    def result(self, name):
+        """
+        Take the outcome of a finished task out of the queue.
+
+        Returns:
+            ('ok', payload), ('failed', note), ('quarantined', note), or None
+            while the task is not done
+        """
+        result_file = self._path('results', name, 'pkl')
+        if os.path.exists(result_file):
+            with open(result_file, 'rb') as f:
+                payload = pickle.load(f)
+            os.remove(result_file)
+            return 'ok', payload
+        failed_file = self._path('failed', name)
+        if os.path.exists(failed_file):
+            with open(failed_file, encoding="utf-8") as f:
+                record = json.load(f)
+            os.remove(failed_file)
+            return 'quarantined' if record.get('quarantined') else 'failed', record.get('note')
+        return None
+
+    def run(self, task, process):
+        """
+        Process a claimed task, touching the claim until it is done.
+
+        Args:
+            task: Claimed task
+            process: Function process(task) returning the result payload
+        """
+        claimed = self._path('claimed', task['task_id'])
+        done = threading.Event()
+
+        def keep_alive():
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    os.utime(claimed)
+                except OSError:
+                    return
+
+        heartbeat = threading.Thread(target=keep_alive, daemon=True)
+        heartbeat.start()
+        try:
+            payload = process(task)
+        except BudgetExceeded as e:
+            self.fail(task, str(e), quarantined=True)
+            return
+        except Exception as e:
+            self.fail(task, f"{type(e).__name__}: {e}")
+            return
+        finally:
+            done.set()
+            heartbeat.join()
+        payload['worker'] = self.worker_id
+        self.complete(task, payload)
+
+# Customer mapping of each base folder with the modification time it was loaded at
+_mapping_cache = {}
+
+def process_task(task):
+    """
+    Run the whole pipeline on the form of a task: extract, group and expand,
+    then enrich and name.
+
+    Returns:
+        Payload with the named rows (None if the form could not be read), the
+        content signature and the delta of the form
+    """
+    import pandas as pd
+    from etl.loader import load_customer_mapping
+    from etl.pipeline import make_stage_runner, process_form, stream_rows
+    from config.paths import get_snapshot_dir
+    from config.rules import get_rules
+    from utils.safe_io import snapshot_file
+
+    # The coordinator's rules file (re-read when it changed between tasks)
+    get_rules(task['base_dir'], refresh=True)
+
+    # The mapping stays loaded between tasks and is reloaded when the file changed
+    mapping_file = os.path.join(task['base_dir'], "CustomerMapping.xlsx")
+    mtime = os.path.getmtime(mapping_file)
+    if _mapping_cache.get(mapping_file, (None,))[0] != mtime:
+        _mapping_cache[mapping_file] = (mtime, load_customer_mapping(snapshot_file(mapping_file, get_snapshot_dir())))
+    df_mapping = _mapping_cache[mapping_file][1]
+
+    file_path = task['file_path']
+    print(f"Processing: {os.path.basename(file_path)}")
+    run_stage = make_stage_runner(task['engine'])
+    signature = {}
+    delta = {'cache_dir': task['delta_dir']} if task.get('delta_dir') else None
+    expanded_df = process_form(file_path, run_stage, sheet_name=task.get('sheet_name'), signature=signature,
+                               delta=delta)
+    named_df = expanded_df
+    if expanded_df is not None and not expanded_df.empty:
+        chunks = list(stream_rows([(os.path.basename(file_path), expanded_df)], run_stage,
+                                  df_mapping, None))
+        named_df = pd.concat(chunks, ignore_index=True)
+    return {'result': named_df, 'signature': signature, 'delta': delta}
+
+class BudgetExceeded(Exception):
+    """A task ran over its time or memory budget (its form was quarantined)."""
+
+def _task_worker_main(conn):
+    """Worker process: stays warm between tasks, running process_task on each task received."""
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        # Memory of the warm worker before this task, which the budget does not count
+        conn.send(('start', process_memory_mb(os.getpid())))
+        try:
+            conn.send(('result', process_task(task)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+    conn.close()
+
+class TaskWorker:
+    """Warm worker process running queued tasks within the budgets given by their coordinator."""
+
+    def __init__(self):
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.conn = None
+
+    def _start(self):
+        parent_conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(target=_task_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def _stop(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+        self.process = self.conn = None
+
+    def __call__(self, task):
+        """
+        Run process_task on a task in the worker process.
+
+        A worker running over the task's 'time_budget' seconds, or whose memory
+        grows by more than its 'memory_budget' MB, is killed (a new one starts
+        with the next task) and the form is moved to the task's 'quarantine_dir'.
+
+        Returns:
+            Payload of process_task
+
+        Raises:
+            BudgetExceeded: The task ran over a budget
+            RuntimeError: The form could not be processed or the worker died
+        """
+        if self.process is None:
+            self._start()
+        time_budget = task.get('time_budget')
+        memory_budget = task.get('memory_budget')
+        started = time.monotonic()
+        base_mb = None
+        peak_mb = 0.0
+        self.conn.send(task)
+        while True:
+            if self.conn.poll(POLL_INTERVAL):
+                try:
+                    kind, payload = self.conn.recv()
+                except (EOFError, OSError):
+                    self.process.join(timeout=5)
+                    exitcode = self.process.exitcode
+                    self._stop()
+                    raise RuntimeError(f"Worker exited unexpectedly (exit code {exitcode})")
+                if kind == 'start':
+                    base_mb = payload or 0.0
+                    continue
+                if kind == 'result':
+                    return payload
+                raise RuntimeError(payload)
+
+            elapsed = time.monotonic() - started
+            peak_mb = max(peak_mb, process_memory_mb(self.process.pid) or 0.0)
+            if time_budget and elapsed > time_budget:
+                reason = f"Exceeded time budget of {time_budget}s"
+            elif memory_budget and base_mb is not None and peak_mb - base_mb > memory_budget:
+                reason = f"Exceeded memory budget of {memory_budget} MB (grew by {peak_mb - base_mb:.0f} MB)"
+            else:
+                continue
+
+            self._stop()
+            if task.get('quarantine_dir'):
+                note = {'Reason': reason, 'Elapsed seconds': round(elapsed, 1), 'Peak memory MB': round(peak_mb, 1),
+                        'Memory at file start MB': round(base_mb or 0.0, 1)}
+                target = quarantine_file(task['file_path'], task['quarantine_dir'], note)
+                print(f"⛔ Quarantined {os.path.basename(task['file_path'])}: {reason} -> {target}")
+            raise BudgetExceeded(reason)
+
+    def close(self):
+        """Ask the worker process to exit."""
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self._stop()
+        else:
+            self.conn.close()
+            self.process = self.conn = None
+
+def run_queued(file_paths, queue, engine, base_dir, catalog=None, delta_dirs=None, quarantine_dirs=None,
+               time_budget=None, memory_budget=None, poll_seconds=QUEUE_POLL_SECONDS):
+    """
+    Queue files for any worker, work on them here too and yield their outcomes
+    as they finish, whichever machine processed them.
+
+    Args:
+        file_paths: Files to process
+        queue: WorkQueue on the shared drive
+        engine: Stage implementations the workers use
+        base_dir: Folder holding CustomerMapping.xlsx
+        catalog: Catalog from etl.catalog.build_catalog (sheet names), or None
+        delta_dirs: Dictionary mapping each file to its member's delta cache, or None
+        quarantine_dirs: Dictionary mapping each file to its member's quarantine folder, or None
+        time_budget: Seconds any worker may spend on a form (None for no limit)
+        memory_budget: MB a worker's memory may grow by during a form (None for no limit)
+        poll_seconds: Seconds between checks when there is nothing to do here
+
+    Yields:
+        Outcome dictionaries like run_supervised (the rows are already named)
+    """
+    tasks = {}
+    for file_path in file_paths:
+        task = {
+            'task_id': task_id(file_path),
+            'file_path': file_path,
+            'sheet_name': ((catalog or {}).get(file_path) or {}).get('sheet_name'),
+            'delta_dir': (delta_dirs or {}).get(file_path),
+            'quarantine_dir': (quarantine_dirs or {}).get(file_path),
+            'time_budget': time_budget,
+            'memory_budget': memory_budget,
+            'engine': engine,
+            'base_dir': base_dir,
+            'coordinator': queue.worker_id,
+        }
+        queue.enqueue(task)
+        tasks[task['task_id']] = file_path
+    print(f"📬 {len(tasks)} form(s) handed to the queue in {queue.queue_dir}")
+
+    worker = TaskWorker()
+    try:
+        yield from _collect_queued(tasks, queue, worker, poll_seconds)
+    finally:
+        worker.close()
+
+def _collect_queued(tasks, queue, worker, poll_seconds):
+    """Yield the outcomes of the coordinator's tasks, working on them in the meantime."""
+    while tasks:
+        for name in list(tasks):
+            finished = queue.result(name)
+            if finished is None:
+                continue
+            file_path = tasks.pop(name)
+            status, payload = finished
+            if status == 'quarantined':
+                yield {'file_path': file_path, 'status': 'quarantined', 'result': None, 'shadow': None,
+                       'footprint': None, 'signature': None, 'delta': None, 'note': payload}
+            elif status == 'failed':
+                print(f"⚠️ {os.path.basename(file_path)} could not be processed: {payload}")
+                yield {'file_path': file_path, 'status': 'ok', 'result': None, 'shadow': None, 'footprint': None,
+                       'signature': None, 'delta': None, 'note': payload}
+            else:
+                # The rows arrive enriched and named, like a named checkpoint
+                yield {'file_path': file_path, 'status': 'ok', 'result': payload['result'], 'checkpoint': 'named',
+                       'shadow': None, 'footprint': None, 'signature': payload['signature'],
+                       'delta': payload['delta'], 'note': f"Processed by {payload.get('worker')}"}
+        if not tasks:
+            break
+
+        queue.expire_stale()
+        task = queue.claim(set(tasks))
+        if task is not None:
+            queue.run(task, worker)
+        else:
+            time.sleep(poll_seconds)
+
+def serve_queue(queue, idle_seconds=QUEUE_IDLE_SECONDS, poll_seconds=QUEUE_POLL_SECONDS):
+    """
+    Work on queued tasks of any coordinator until the queue has been empty for
+    idle_seconds.
+
+    Args:
+        queue: WorkQueue on the shared drive
+        idle_seconds: Seconds without a task to claim before the worker stops
+        poll_seconds: Seconds between checks of the queue
+    """
+    processed = 0
+    idle_since = time.monotonic()
+    worker = TaskWorker()
+    print(f"📬 Worker {queue.worker_id} serving {queue.queue_dir}")
+    try:
+        while True:
+            queue.expire_stale()
+            task = queue.claim()
+            if task is None:
+                if time.monotonic() - idle_since >= idle_seconds:
+                    break
+                time.sleep(poll_seconds)
+                continue
+            queue.run(task, worker)
+            processed += 1
+            idle_since = time.monotonic()
+    finally:
+        worker.close()
+    print(f"📬 Worker {queue.worker_id} done: {processed} form(s) processed")
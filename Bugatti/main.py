@@ -1,7 +1,9 @@
 import os
 import sys
 import glob
-import pandas as pd
+import fnmatch
+import argparse
+import itertools
 from datetime import datetime
 
 # Add the project root to Python path
@@ -9,277 +11,600 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 if script_dir not in sys.path:
     sys.path.insert(0, script_dir)
 
-from config.paths import PATHS, TEAM_MEMBER
-from etl.loader import load_and_clean_excel
-from etl.parser import parse_and_correct_date, is_likely_customer_code, is_likely_customer_name, standardize_customer_code
-from etl.mapping import map_all_promo_metadata, classify_model_code
-from etl.grouping import group_similar_rows, distribute_quantities_by_month
-from etl.validation import detect_errors
-from writers.excel_writer import save_with_highlighting, create_mass_upload
-from writers.promo_naming import build_name_of_promotion
+# Only light modules are imported up front. pandas, openpyxl, dateutil and the
+# fuzzy matchers are imported by the stages that need them, after the inbox check.
+from config.paths import (
+    get_paths, get_team_member, list_team_members, ensure_directories, get_scratch_dir, get_history_db,
+    get_checkpoint_dir, get_queue_dir, get_snapshot_dir
+)
+from config.constants import (
+    FILE_TIME_BUDGET_SECONDS, FILE_MEMORY_BUDGET_MB, STREAM_CHUNK_ROWS, MAX_ROWS_IN_FLIGHT, PREFETCH_DEPTH,
+    WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS, QUEUE_LEASE_SECONDS, QUEUE_IDLE_SECONDS, WRITER_PROCESSES,
+    WRITER_PROCESS_MIN_ROWS
+)
+from etl.member_job import SELECTION_SUFFIX, output_names
 
-def process_pet_forms():
+# Stages selected by --only-stage/--skip-stage, in run order (the --from-stage stages)
+RUN_STAGES = ['extract', 'enrich', 'write']
+
+def find_pet_forms(paths):
+    """Return the PET forms waiting in the member's PetForms folder (any format etl.readers reads)."""
+    from etl.readers import get_reader
+    
+    return [file_path for file_path in glob.glob(os.path.join(paths['pet_forms'], "*"))
+            if get_reader(file_path) is not None]
+
+def select_forms(excel_files, patterns=None, since=None):
     """
-    Main function to process PET forms, extract data, and create output files.
+    Keep the PET forms named by the --files patterns and modified since a time.
+
+    Args:
+        excel_files: PET forms of a member
+        patterns: Glob patterns or file names matched against the file name (or
+            against the full path when they contain a folder); None keeps every form
+        since: Epoch seconds; forms last modified before are left out (None keeps every form)
+
+    Returns:
+        Selected forms in their original order
     """
-    print(f"Running script for team member: {TEAM_MEMBER}")
-    print(f"Source folder: {PATHS['pet_forms']}")
-    print(f"Output folder: {PATHS['uploads']}")
-    
-    # Make sure output directories exist
-    os.makedirs(PATHS['uploads'], exist_ok=True)
+    selected = []
+    for file_path in excel_files:
+        if patterns and not any(
+            fnmatch.fnmatch(os.path.normpath(file_path) if os.path.dirname(pattern) else os.path.basename(file_path),
+                            os.path.normpath(pattern) if os.path.dirname(pattern) else pattern)
+            for pattern in patterns
+        ):
+            continue
+        if since is not None and os.path.getmtime(file_path) < since:
+            continue
+        selected.append(file_path)
+    return selected
+
+def parse_since(value):
+    """Parse --since: an ISO date or date-time ('2026-10-01', '2026-10-01T08:30') or epoch seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a date, date-time or epoch seconds: {value!r}")
+
+def select_stages(only=None, skip=None):
+    """
+    Turn --only-stage/--skip-stage into the range of stages to run.
+
+    Stages run in the order of RUN_STAGES and must form one range: stages before
+    the first one are taken from the latest checkpoint run, and a range ending
+    before 'write' leaves the outputs as they are.
+
+    Args:
+        only: Stages to run (None for all)
+        skip: Stages not to run
+
+    Returns:
+        Tuple (first stage, last stage)
+
+    Raises:
+        ValueError: If the selected stages leave a gap
+    """
+    selected = [stage for stage in RUN_STAGES if (not only or stage in only) and stage not in (skip or [])]
+    if not selected:
+        raise ValueError("no stage left to run")
+    first, last = RUN_STAGES.index(selected[0]), RUN_STAGES.index(selected[-1])
+    if len(selected) != last - first + 1:
+        raise ValueError(f"stages run in the order {' -> '.join(RUN_STAGES)}; "
+                         f"{', '.join(s for s in RUN_STAGES[first:last + 1] if s not in selected)} cannot be left out")
+    return selected[0], selected[-1]
+
+def dry_run_members(members, workers=1, first_stage='extract', last_stage='write', output_format='xlsx', partial=()):
+    """
+    Report the selected forms, their sizes from the catalog pre-scan and the
+    outputs of the run, without processing or writing anything.
     
-    # Define output files
-    combined_file = os.path.join(PATHS['member_dir'], "CombinedExtractedColumns.xlsx")
-    mass_upload_file = os.path.join(PATHS['uploads'], "MassUpload.xlsx")
-    # -------------------------------------------------------------------
-    # CLEAN PREVIOUS FILES
-    # -------------------------------------------------------------------
+    Args:
+        members: List of (paths, excel_files) tuples
+        workers: Worker processes of the run
+        first_stage: First stage run
+        last_stage: Last stage run
+        output_format: Format of the combined rows
+        partial: Team members of which only some forms are selected
+    """
+    from etl.catalog import build_catalog, plan_schedule
+    from etl.dedup import identical_sheet_groups
 
-    # 1. Remove CombinedExtractedColumns file completely
-    if os.path.exists(combined_file):
-        os.remove(combined_file)
-        print("Removed old CombinedExtractedColumns.xlsx")
+    print(f"🧪 Dry run: stages {first_stage} -> {last_stage}, nothing is processed or written")
+    total_forms, total_rows, total_bytes, largest = 0, 0, 0, 0
+    for paths, excel_files in members:
+        catalog = build_catalog(excel_files)
+        scheduled, skipped = plan_schedule(catalog, excel_files)
+        duplicates = [f for group in identical_sheet_groups(catalog, excel_files) for f in group[1:]]
+        scheduled = [f for f in scheduled if f not in duplicates]
 
-    # 2. Clean all MassUpload content except header row
-    from openpyxl import load_workbook
-    from openpyxl.styles import PatternFill
+        print(f"Team member {paths['team_member']}: {len(scheduled)} form(s) to process")
+        for file_path in excel_files:
+            entry = catalog.get(file_path) or {}
+            if file_path in scheduled:
+                rows = entry.get('rows')
+                print(f"   {os.path.basename(file_path)}: {entry.get('sheet_name') or 'sheet not pre-scanned'}, "
+                      f"{'~' + str(rows) if rows else '?'} rows, {entry.get('sheet_bytes', 0) / (1024 * 1024):.1f} MB")
+                total_rows += rows or 0
+                total_bytes += entry.get('sheet_bytes', 0)
+                largest = max(largest, entry.get('sheet_bytes', 0))
+        for entry in skipped:
+            print(f"   {os.path.basename(entry['file_path'])}: skipped, no matching sheet")
+        for file_path in duplicates:
+            print(f"   {os.path.basename(file_path)}: skipped, same sheet data as another form")
+        total_forms += len(scheduled)
 
-    if os.path.exists(mass_upload_file):
-        try:
-            wb = load_workbook(mass_upload_file)
-            ws = wb.active
-            ws.delete_rows(2, ws.max_row)  # remove everything below the first row
-            for row in ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=ws.max_column):
-                for cell in row:
-                    cell.fill = PatternFill()  # clear fill color
-            wb.save(mass_upload_file)
-            print("Cleaned MassUpload.xlsx (kept only header row)")
-        except Exception as e:
-            print(f"Could not clean MassUpload.xlsx: {e}")
+        if last_stage == 'write':
+            outputs = output_names(output_format, paths['team_member'] in partial)
+            print(f"   Would {'write' if paths['team_member'] in partial else 'replace'}: {', '.join(outputs)}")
+        else:
+            print("   Outputs left as they are (checkpoints only)")
+
+    print(f"Total: {total_forms} form(s), ~{total_rows} rows, {total_bytes / (1024 * 1024):.1f} MB of sheet XML "
+          f"over {workers} worker(s) (largest form {largest / (1024 * 1024):.1f} MB)")
 
+def process_members(members, engine='legacy', shadow=False, supervised=True, workers=1,
+                    time_budget=FILE_TIME_BUDGET_SECONDS, memory_budget=FILE_MEMORY_BUDGET_MB,
+                    chunk_rows=STREAM_CHUNK_ROWS, max_rows_in_flight=MAX_ROWS_IN_FLIGHT, memory_report=False,
+                    prefetch=PREFETCH_DEPTH, delta=False, history=False, suppress_uploaded=False,
+                    checkpoint=False, resume=False, from_stage=None, checkpoint_run=None, distributed=False,
+                    output_format='xlsx', last_stage='write', writer_processes=WRITER_PROCESSES, partial=()):
+    """
+    Process the PET forms of one or more team members in one warm process.
+    
+    The inbox is pre-scanned and scheduled largest first across one pool of
+    workers; each file's rows are streamed into its member's writers, and a
+    member's outputs are written locally and published once all of its files are
+    done. Each member is locked for the run (utils.safe_io).
+    
+    Args:
+        members: List of (paths, excel_files) tuples
+        engine: Stage implementations ('legacy', 'optimized' or 'polars')
+        shadow: Run both engines and save a mismatch/speedup report per member
+        supervised: Process each file in a worker process with time and memory budgets
+        workers: Number of worker processes (supervised mode)
+        time_budget: Seconds allowed per file before it is quarantined
+        memory_budget: MB a worker may grow by during a file before it is quarantined
+        chunk_rows: Maximum rows per enrich/name/write chunk
+        max_rows_in_flight: Rows the workers may hold before new files wait
+        memory_report: Print the memory saved by the compact dtypes per stage
+        prefetch: Forms copied to local scratch ahead of processing (0 reads the share)
+        delta: Register only lines new or changed since a form's previous version
+        history: Record uploaded rows in the history store and flag repeats
+        suppress_uploaded: Leave rows uploaded by earlier runs out of MassUpload
+        checkpoint: Save the expanded and named rows of every file
+        resume: Continue the latest checkpoint run, skipping published members
+        from_stage: Re-run the latest checkpoint run from this stage
+        checkpoint_run: CheckpointStore continued by this run (watch mode)
+        distributed: Share the files with other machines through etl.work_queue
+        output_format: Format of the combined rows ('xlsx' or 'csv')
+        last_stage: Last stage run; before 'write' only checkpoints are saved
+        writer_processes: Processes writing the outputs of large members (0 for none)
+        partial: Team members of which only some forms are processed
     
-    # Get customer mapping data
-    mapping_file = os.path.join(PATHS['base_dir'], "CustomerMapping.xlsx")
+    Returns:
+        Set of the team members whose outputs are on the share
+    """
+    import shutil
+    import tempfile
+    from etl.catalog import build_catalog, plan_schedule, print_catalog_summary
+    from etl.dedup import identical_sheet_groups
+    from etl.history import HistoryStore
+    from etl.checkpoint import CheckpointStore, CHECKPOINT_STAGES, FROM_STAGES
+    from etl.product_master import find_product_master, load_product_master
+    from etl.loader import load_customer_mapping
+    from etl.member_job import MemberJob
+    from etl.pipeline import make_stage_runner, run_in_process
+    from etl.prefetch import Prefetcher
+    from etl.stages import resolve_engine
+    from etl.supervisor import run_supervised
+    from utils.run_report import RunReport
+    from utils.safe_io import FileLock, LockTimeout, snapshot_file
+    from writers.writer_pool import WriterPool
+    from config.rules import get_rules, find_rules_file, describe_rules
+    
+    report = RunReport()
+    published_members = set()
+    # Rules are read again at each run start, so a changed rules file applies without a deploy
+    base_dir = members[0][0]['base_dir'] if members else None
     try:
-        df_mapping = pd.read_excel(mapping_file)
-        df_mapping['Customer Code'] = df_mapping['Customer Code'].astype(str).str.strip().str.upper()
-        # Drop duplicates from mapping to keep only the first match
-        df_mapping = df_mapping.drop_duplicates(subset='Customer Code', keep='first')
-    except Exception as e:
-        print(f"Error loading customer mapping: {e}")
-        df_mapping = pd.DataFrame(columns=['Customer Code', 'Customer Type', 'Requestor', 'Currency'])
+        rules = get_rules(base_dir, refresh=True)
+    except (OSError, ValueError) as e:
+        print(f"⛔ The rules file {find_rules_file(base_dir)} could not be loaded: {e}")
+        return published_members
+    report.stamp("Rules version", describe_rules(rules))
+    engine = resolve_engine(engine)
+    if shadow:
+        print("Shadow mode: running legacy and optimized engines, writing legacy output")
     
-    # Find Excel files
-    excel_files = glob.glob(os.path.join(PATHS['pet_forms'], "*.xlsx"))
-    if not excel_files:
-        print("No Excel files found in source folder.")
-        return
+    scratch_root = get_scratch_dir()
+    os.makedirs(scratch_root, exist_ok=True)
+    run_dir = tempfile.mkdtemp(prefix="run_", dir=scratch_root)
     
-    print(f"Found {len(excel_files)} files. Processing...")
+    # Checkpoint run: a new one, or the latest one when resuming
+    checkpoints, usable_stages = None, []
+    if checkpoint_run is not None:
+        checkpoints, usable_stages = checkpoint_run, CHECKPOINT_STAGES
+    elif resume or from_stage:
+        checkpoints = CheckpointStore.latest(get_checkpoint_dir())
+        if checkpoints is None:
+            print("No checkpoint run found; processing everything")
+        else:
+            print(f"💾 Continuing checkpoint run {os.path.basename(checkpoints.run_dir)}")
+            if from_stage:
+                usable_stages = CHECKPOINT_STAGES[:CHECKPOINT_STAGES.index(FROM_STAGES[from_stage]) + 1] \
+                    if FROM_STAGES[from_stage] else []
+            else:
+                usable_stages = CHECKPOINT_STAGES
+                published = [paths['team_member'] for paths, _ in members if checkpoints.is_published(paths['team_member'])]
+                if published:
+                    print(f"💾 Outputs already published for: {', '.join(published)}")
+                    published_members.update(published)
+                members = [(paths, files) for paths, files in members if paths['team_member'] not in published]
+    if checkpoints is None and (checkpoint or resume or from_stage or last_stage != 'write'):
+        checkpoints = CheckpointStore.create(get_checkpoint_dir(), engine)
+    if not members:
+        print("Nothing to resume: the outputs of every member were published")
+        shutil.rmtree(run_dir, ignore_errors=True)
+        return published_members
     
-    # Initialize combined DataFrame
-    combined_df = pd.DataFrame()
+    # One run at a time per member: whoever holds a member's lock writes its
+    # outputs, delta cache and history. Locks are taken in a fixed order so two
+    # runs wanting the same members cannot wait on each other.
+    locks = {}
+    for paths, _ in sorted(members, key=lambda member: member[0]['member_dir']):
+        try:
+            locks[paths['team_member']] = FileLock(paths['member_lock']).acquire()
+        except LockTimeout as e:
+            print(f"⛔ Skipping {paths['team_member']}: another run is still working on it ({e})")
+    members = [(paths, files) for paths, files in members if paths['team_member'] in locks]
+    if not members:
+        shutil.rmtree(run_dir, ignore_errors=True)
+        return published_members
     
-    # Process each Excel file
-    for file_path in excel_files:
-        print(f"Processing: {os.path.basename(file_path)}")
-        
-        # Step 1: Load and clean Excel
-        cleaned_df = load_and_clean_excel(file_path)
-        if cleaned_df is None:
-            print("Skipping due to read/clean error.")
-            continue
-        
-        # Clean headers to avoid hidden formatting mismatches
-        cleaned_df.columns = cleaned_df.columns.astype(str).str.strip().str.replace(r'\s+', ' ', regex=True)
-        
-        # Remove duplicate columns if any
-        cleaned_df = cleaned_df.loc[:, ~cleaned_df.columns.duplicated()]
-        
-        print(f"➡️ Loaded rows: {len(cleaned_df)} from {file_path}")
-        
-        # Step 2: Get required columns (based on column mapping)
-        required_columns = [
-            'Customer Code', 'Customer Name', 'Model Code', 'Type of Support', 
-            'Additional SOA', 'Expected Sell-Out', 'Start Date', 'End Date', 
-            'Expected Cost', 'Name of Promotion'
+    store, prefetcher, jobs = None, None, []
+    writer_pool = WriterPool(writer_processes) if writer_processes > 0 else None
+    try:
+        store = HistoryStore(get_history_db()) if history or suppress_uploaded else None
+        jobs = [
+            MemberJob(paths, excel_files, os.path.join(run_dir, "outputs", str(index)), shadow, memory_report, delta,
+                      store, suppress_uploaded, checkpoints, output_format, last_stage, paths['team_member'] in partial)
+            for index, (paths, excel_files) in enumerate(members)
         ]
+        job_by_file = {file_path: job for job in jobs for file_path in job.files}
+        all_files = [file_path for job in jobs for file_path in job.files]
+        delta_dirs = {f: job.paths['delta_cache'] for f, job in job_by_file.items()} if delta else None
         
-        # Create a copy for extraction
-        extracted_df = cleaned_df.reindex(columns=required_columns)
-        
-        # Fill missing columns with default values
-        for col in required_columns:
-            if col not in extracted_df.columns or extracted_df[col].isnull().all():
-                if col in ['Expected Sell-Out', 'Additional SOA']:
-                    extracted_df[col] = 0
-                elif col in ['Start Date', 'End Date']:
-                    extracted_df[col] = '19000101'
-                else:
-                    extracted_df[col] = "NA"
+        # Pre-scan the inbox (sheet names, dimensions, template) and plan the order
+        with report.measure("Catalog pre-scan"):
+            catalog = build_catalog(all_files)
+        scheduled, skipped = plan_schedule(catalog, all_files)
+        print_catalog_summary(catalog, skipped)
         
-        # Handle missing Type of Support
-        if 'Type of Support' not in extracted_df.columns:
-            extracted_df['Type of Support'] = 'A SOA'
-        else:
-            extracted_df['Type of Support'] = extracted_df['Type of Support'].astype(str)
-            extracted_df['Type of Support'] = extracted_df['Type of Support'].fillna('A SOA')
-            
-            # Fix missing/placeholder values
-            missing_mask = (
-                (extracted_df['Type of Support'].str.strip() == '') | 
-                (extracted_df['Type of Support'].str.upper().isin(['NA', 'N/A', 'NONE', '-', 'NULL'])) |
-                (extracted_df['Type of Support'].str.isnumeric()) |
-                (extracted_df['Type of Support'].str.replace('.', '', regex=False).str.isnumeric())
-            )
-            
-            if missing_mask.sum() > 0:
-                extracted_df.loc[missing_mask, 'Type of Support'] = 'A SOA'
+        # Forms resubmitted with identical sheet data are processed once per member
+        duplicates = {}
+        with report.measure("Duplicate check"):
+            for job in jobs:
+                for group in identical_sheet_groups(catalog, job.files):
+                    for file_path in group[1:]:
+                        duplicates[file_path] = group[0]
+                        job.dedup.add_identical(file_path, group[0], 'Identical sheet data')
+                        print(f"🔁 {os.path.basename(file_path)} has the same sheet data as "
+                              f"{os.path.basename(group[0])}; skipped")
+        scheduled = [file_path for file_path in scheduled if file_path not in duplicates]
         
-        # Standardize customer codes first (before swap detection)
-        extracted_df['Customer Code'] = extracted_df['Customer Code'].astype(str).fillna('NA')
-        extracted_df['Customer Name'] = extracted_df['Customer Name'].astype(str).fillna('NA')
+        # Files with a usable checkpoint are not read again
+        resumed = []
+        if usable_stages:
+            with report.measure("Checkpoint load"):
+                resumed = [outcome for outcome in (checkpoints.outcome(f, usable_stages) for f in scheduled) if outcome]
+            if resumed:
+                print(f"💾 {len(resumed)} file(s) resumed from checkpoints")
+            scheduled = [file_path for file_path in scheduled if file_path not in {o['file_path'] for o in resumed}]
         
-        # Standardize Customer Codes - apply proper case formatting
-        extracted_df['Customer Code'] = extracted_df['Customer Code'].apply(standardize_customer_code)
+        # Workers of the shared queue read the forms from the share themselves
+        if distributed:
+            prefetch = 0
+        prefetcher = Prefetcher(scheduled, os.path.join(run_dir, "inputs"), prefetch, report) if prefetch > 0 else None
         
-        # Auto-fix swapped Customer Name & Customer Code if needed
-        mask_swapped = extracted_df.apply(
-            lambda row: is_likely_customer_code(row['Customer Name']) and is_likely_customer_name(row['Customer Code']),
-            axis=1
-        )
+        # Get customer mapping data (one copy shared by every member), read from a
+        # local snapshot so a colleague saving the shared file cannot change it mid-run
+        mapping_file = os.path.join(jobs[0].paths['base_dir'], "CustomerMapping.xlsx")
+        df_mapping = load_customer_mapping(snapshot_file(mapping_file, get_snapshot_dir()))
         
-        if mask_swapped.sum() > 0:
-            # Store the swapped values temporarily 
-            temp_codes = extracted_df.loc[mask_swapped, 'Customer Name'].apply(standardize_customer_code)
-            temp_names = extracted_df.loc[mask_swapped, 'Customer Code']
-            
-            # Apply the swap
-            extracted_df.loc[mask_swapped, 'Customer Code'] = temp_codes
-            extracted_df.loc[mask_swapped, 'Customer Name'] = temp_names
-            
-            print(f"Fixed {mask_swapped.sum()} rows with swapped customer code/name")
+        # Optional product master validating every model code
+        master_file = find_product_master(jobs[0].paths['base_dir'])
+        product_master = load_product_master(snapshot_file(master_file, get_snapshot_dir())) if master_file else None
         
-        # Ensure all customer codes are properly standardized after potential swaps
-        extracted_df['Customer Code'] = extracted_df['Customer Code'].apply(standardize_customer_code)
-        
-        # Round Additional SOA to 2 decimal places
-        extracted_df['Additional SOA'] = pd.to_numeric(extracted_df['Additional SOA'], errors='coerce').round(2)
-        
-        # Normalize dates
-        extracted_df['Start Date'] = extracted_df['Start Date'].apply(lambda x: parse_and_correct_date(x, is_start=True))
-        extracted_df['End Date'] = extracted_df.apply(
-            lambda row: parse_and_correct_date(row['End Date'], is_start=False, start_reference=row['Start Date']),
-            axis=1
-        )
-        
-        # Convert Expected Sell-Out to numeric and round
-        extracted_df['Expected Sell-Out'] = pd.to_numeric(extracted_df['Expected Sell-Out'], errors='coerce').fillna(0)
-        extracted_df['Expected Sell-Out'] = extracted_df['Expected Sell-Out'].round(0)
-        
-        # Preserve row order and source file info
-        extracted_df['Original Row Index'] = range(len(extracted_df))
-        extracted_df['Source File'] = os.path.basename(file_path)
+        # Files without a matching sheet and duplicates are done without being opened
+        skipped_outcomes = [
+            {'file_path': entry['file_path'], 'status': 'skipped', 'result': None,
+             'shadow': None, 'footprint': None, 'signature': None, 'note': 'No matching sheet'}
+            for entry in skipped
+        ] + [
+            {'file_path': file_path, 'status': 'skipped', 'result': None,
+             'shadow': None, 'footprint': None, 'signature': None, 'note': f'Duplicate of {os.path.basename(kept)}'}
+            for file_path, kept in duplicates.items()
+        ]
         
-        # Extract WBW TV MODEL if available
-        wbw_candidates = [col for col in cleaned_df.columns if 'WBW' in col.upper() and 'MODEL' in col.upper()]
-        if wbw_candidates:
-            wbw_col = wbw_candidates[0]
-            print(f"Found WBW column: '{wbw_col}'")
-            
-            # Clean and standardize WBW values
-            wbw_cleaned = cleaned_df[wbw_col].astype(str).str.strip().str.upper()
-            
-            # Replace obvious placeholder values
-            invalid_values = ['NA', 'NA1', 'NA2', 'NA3', 'NO TV MODEL', '', 'NONE', 'N/A', 'NO', 'NULL']
-            for invalid in invalid_values:
-                wbw_cleaned = wbw_cleaned.replace(invalid, 'NO TV MODEL')
-            
-            extracted_df['WBW TV MODEL'] = wbw_cleaned
-            
-            # Set Is WBW flag based on cleaned values
-            extracted_df['Is WBW'] = "NO"
-            wbw_mask = (extracted_df['WBW TV MODEL'] != 'NO TV MODEL') & (extracted_df['WBW TV MODEL'].str.len() > 3)
-            extracted_df.loc[wbw_mask, 'Is WBW'] = "YES"
-            
-            # Update Name of Promotion for WBW rows
-            if wbw_mask.sum() > 0:
-                extracted_df.loc[wbw_mask, 'Name of Promotion'] = (
-                    extracted_df.loc[wbw_mask, 'Name of Promotion'].fillna('').astype(str).str.strip() + " " +
-                    extracted_df.loc[wbw_mask, 'Model Code'].fillna('').astype(str).str.strip()
-                ).str.strip()
-                print(f"Updated {wbw_mask.sum()} promotion names for WBW rows")
+        # Process each Excel file: through the shared queue, in a supervised
+        # worker, or in this process when budgets are disabled
+        if distributed:
+            from etl.work_queue import WorkQueue, run_queued
+            queue = WorkQueue(get_queue_dir(jobs[0].paths['base_dir']), QUEUE_LEASE_SECONDS)
+            outcomes = run_queued(scheduled, queue, engine, jobs[0].paths['base_dir'], catalog, delta_dirs,
+                                  {f: job.paths['quarantine'] for f, job in job_by_file.items()},
+                                  time_budget if supervised else None, memory_budget if supervised else None)
+        elif supervised:
+            outcomes = run_supervised(
+                scheduled, {f: job.paths['quarantine'] for f, job in job_by_file.items()},
+                engine=engine, shadow=shadow, time_budget=time_budget, memory_budget=memory_budget,
+                max_workers=workers, max_rows_in_flight=max_rows_in_flight, memory_report=memory_report,
+                prefetcher=prefetcher, catalog=catalog, delta_dirs=delta_dirs
+            )
         else:
-            # No WBW column found
-            extracted_df['WBW TV MODEL'] = 'NO TV MODEL'
-            extracted_df['Is WBW'] = "NO"
+            runner_for = lambda f: make_stage_runner(engine, job_by_file[f].recorder, job_by_file[f].footprint)
+            outcomes = run_in_process(scheduled, runner_for, prefetcher, catalog, delta_dirs)
         
-        # Group similar rows
-        grouped_df = group_similar_rows(extracted_df)
-        print(f"➡️ After grouping: {len(grouped_df)} rows, {grouped_df['Expected Sell-Out'].sum()} units")
-        
-        # Expand by Apply Month & Distribute Quantity
-        expanded_df = distribute_quantities_by_month(grouped_df)
-        
-        # Add to combined data
-        if not expanded_df.empty:
-            combined_df = pd.concat([combined_df, expanded_df], ignore_index=True)
+        # A member's outputs are written while the next members are processed;
+        # it is published and unlocked once they are written
+        writing = []
+        for outcome in itertools.chain(skipped_outcomes, resumed, outcomes):
+            job = job_by_file[outcome['file_path']]
+            job.collect(outcome, df_mapping, engine, chunk_rows, product_master)
+            if job.remaining == 0:
+                job.finalize(report, writer_pool)
+                writing.append(job)
+            for job in [job for job in writing if job.outputs_written()]:
+                writing.remove(job)
+                if job.publish(report):
+                    published_members.add(job.team_member)
+                locks.pop(job.team_member).release()
+        for job in writing:
+            if job.publish(report):
+                published_members.add(job.team_member)
+            locks.pop(job.team_member).release()
+    finally:
+        if writer_pool is not None:
+            writer_pool.close()
+        for lock in locks.values():
+            lock.release()
+        if prefetcher is not None:
+            prefetcher.close()
+        if store is not None:
+            store.close()
+        unpublished = [f for job in jobs for f in job.unpublished]
+        if unpublished:
+            print(f"⚠️ {len(unpublished)} output(s) could not be written or published; "
+                  f"local copies of the written ones kept in {run_dir}")
         else:
-            print(f"No valid rows found for expansion in: {os.path.basename(file_path)}")
+            shutil.rmtree(run_dir, ignore_errors=True)
     
-    # Post-processing
-    if not combined_df.empty:
-        # Force fix any remaining NA Type of Support values
-        if 'Type of Support' in combined_df.columns:
-            na_support_mask = (
-                pd.isna(combined_df['Type of Support']) | 
-                (combined_df['Type of Support'].astype(str).str.strip() == '') |
-                (combined_df['Type of Support'].astype(str).str.upper().isin(['NA', 'N/A', 'NONE', '-']))
-            )
-            
-            na_count = na_support_mask.sum()
-            if na_count > 0:
-                combined_df.loc[na_support_mask, 'Type of Support'] = 'A SOA'
-                print(f"📝 Fixed {na_count} rows with NA Type of Support values in final processing")
-        
-        # Final check to ensure all customer codes are standardized
-        combined_df['Customer Code'] = combined_df['Customer Code'].apply(standardize_customer_code)
-        
-        # Calculate Total SOA (Expected Cost)
-        combined_df['Expected Cost'] = (combined_df['Additional SOA'] * combined_df['Expected Sell-Out']).round(2)
-        
-        # Merge with customer mapping
-        combined_df = combined_df.merge(
-            df_mapping[['Customer Code', 'Customer Type', 'Requestor', 'Currency']],
-            on='Customer Code',
-            how='left'
-        )
-        
-        # Fill missing mapped values
-        combined_df[['Customer Type', 'Requestor', 'Currency']] = combined_df[['Customer Type', 'Requestor', 'Currency']].fillna('NA')
-        
-        # Apply mapping logic
-        combined_df[['Budget Allocation', 'Product Type', 'Mapped Sales PGM Reason Code', 'Sales PGM Type']] = combined_df.apply(
-            lambda row: pd.Series(map_all_promo_metadata(row['Model Code'], row.get('Type of Support', ''))),
-            axis=1
-        )
-        
-        # Classify model codes
-        combined_df['Segment'] = combined_df['Model Code'].apply(classify_model_code)
-        
-        # Build promotion names
-        combined_df['PromotionName'] = combined_df.apply(build_name_of_promotion, axis=1)
-        
-        # Save combined file
-        save_with_highlighting(combined_df, combined_file)
-        
-        # Create MassUpload file
-        create_mass_upload(combined_df, mass_upload_file)
+    report.print_summary()
+    return published_members
+
+def watch_members(member_names, poll_seconds=WATCH_POLL_SECONDS, settle_seconds=WATCH_SETTLE_SECONDS, **options):
+    """
+    Process PET forms as they arrive, until interrupted (etl.watch). A member
+    with a new, changed or removed form is processed again, its other forms
+    coming from the watch checkpoints; forms of a member whose outputs were not
+    published are retried on the next poll.
+    
+    Args:
+        member_names: Team members whose folders are watched
+        poll_seconds: Seconds between polls
+        settle_seconds: Seconds a form must stay unchanged before it is processed
+        **options: Options passed to process_members
+    """
+    import time
+    from etl.checkpoint import CheckpointStore
+    from etl.watch import FolderWatcher
+    
+    watch_dir = os.path.join(get_checkpoint_dir(), "watch")
+    checkpoints = CheckpointStore.open(watch_dir)
+    watcher = FolderWatcher(watch_dir, settle_seconds)
+    print(f"👀 Watching {len(member_names)} PetForms folder(s) every {poll_seconds}s (Ctrl+C to stop)")
+    try:
+        while True:
+            members = []
+            for name in member_names:
+                paths = get_paths(name)
+                os.makedirs(paths['pet_forms'], exist_ok=True)
+                excel_files = find_pet_forms(paths)
+                ready, changed = watcher.poll(paths['pet_forms'], excel_files)
+                if not changed:
+                    continue
+                for file_path in watcher.removed(paths['pet_forms'], excel_files):
+                    checkpoints.forget(file_path)
+                if ready:
+                    members.append((paths, ready))
+                else:
+                    watcher.mark_processed(paths['pet_forms'], [])
+            if members:
+                print(f"👀 {datetime.now():%H:%M:%S} updating outputs of: {', '.join(p['team_member'] for p, _ in members)}")
+                published = process_members(members, checkpoint_run=checkpoints, **options)
+                for paths, ready in members:
+                    if paths['team_member'] in published:
+                        watcher.mark_processed(paths['pet_forms'], ready)
+                    else:
+                        print(f"👀 Outputs of {paths['team_member']} not published; retrying on the next poll")
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        print("Watch stopped")
+
+def process_pet_forms(paths, excel_files, **options):
+    """
+    Main function to process PET forms, extract data, and create output files.
+    
+    Args:
+        paths: Path dictionary from config.paths.get_paths
+        excel_files: PET forms to process
+        **options: Options passed to process_members
         
-        print("Processing completed successfully.")
+    Returns:
+        Whether the member's outputs were published
+    """
+    return paths['team_member'] in process_members([(paths, excel_files)], **options)
+
+def parse_args(argv=None):
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Process PET forms into CombinedExtractedColumns and MassUpload files.",
+                                     fromfile_prefix_chars="@")
+    parser.add_argument("team_member", nargs="?", help="Team member folder (defaults to TEAM_MEMBER or Tima)")
+    parser.add_argument("--files", nargs="+", metavar="PATTERN",
+                        help="Process only the PetForms matching these names or glob patterns "
+                             "(@list.txt reads them from a file, one per line); their outputs are written to "
+                             f"'{SELECTION_SUFFIX}' files next to the full ones")
+    parser.add_argument("--since", type=parse_since, metavar="TIMESTAMP",
+                        help="Process only the PetForms modified since this date, date-time or epoch seconds")
+    parser.add_argument("--only-stage", action="append", choices=RUN_STAGES,
+                        help="Run only this stage (repeatable); earlier stages come from the latest checkpoint run "
+                             "and a run ending before 'write' only saves checkpoints")
+    parser.add_argument("--skip-stage", action="append", choices=RUN_STAGES,
+                        help="Leave out this stage (repeatable; same rules as --only-stage)")
+    parser.add_argument("--output-format", choices=["xlsx", "csv"], default="xlsx",
+                        help="Format of the combined rows (MassUpload is always xlsx)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Report the selected forms, their row counts and the estimated work without "
+                             "processing or writing anything")
+    parser.add_argument("--engine", choices=["legacy", "optimized", "polars"],
+                        help="Transform engine: legacy row-wise pandas (default), optimized pandas, or Polars "
+                             "(multi-threaded; falls back to optimized when Polars is not installed)")
+    parser.add_argument("--optimized", action="store_true",
+                        help="Same as --engine optimized")
+    parser.add_argument("--shadow", action="store_true",
+                        help="Run legacy and optimized engines side by side and write ShadowReport.xlsx "
+                             "(only the legacy output is written)")
+    parser.add_argument("--time-budget", type=float, default=FILE_TIME_BUDGET_SECONDS,
+                        help="Seconds allowed per file before it is moved to Quarantine")
+    parser.add_argument("--memory-budget", type=float, default=FILE_MEMORY_BUDGET_MB,
+                        help="MB a worker's memory may grow by during a file before the file is moved to Quarantine")
+    parser.add_argument("--no-supervisor", action="store_true",
+                        help="Process files in this process without time/memory budgets")
+    parser.add_argument("--all-members", action="store_true",
+                        help="Process every folder under 'Team Members' in one run")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes (default: 1, or CPU count - 1 with --all-members)")
+    parser.add_argument("--writer-processes", type=int, default=WRITER_PROCESSES,
+                        help=f"Processes writing the outputs of members with at least {WRITER_PROCESS_MIN_ROWS} rows, "
+                             "concurrently with each other and with the next member (0 to write in this process)")
+    parser.add_argument("--chunk-rows", type=int, default=STREAM_CHUNK_ROWS,
+                        help="Rows per enrich/name/write chunk")
+    parser.add_argument("--max-rows-in-flight", type=int, default=MAX_ROWS_IN_FLIGHT,
+                        help="Rows the workers may hold before new files wait (0 for no limit)")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH_DEPTH,
+                        help="Forms copied to the local scratch directory ahead of processing (0 to read from the share)")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="Print the memory saved by the compact dtypes per stage")
+    parser.add_argument("--delta", action="store_true",
+                        help="Register only lines new or changed since the previous version of each form")
+    parser.add_argument("--history", action="store_true",
+                        help="Record uploaded rows in the local history store and flag rows uploaded by earlier runs")
+    parser.add_argument("--suppress-uploaded", action="store_true",
+                        help="Leave rows uploaded by earlier runs out of MassUpload (implies --history)")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Save the expanded and named rows of every file so the run can be resumed")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the latest checkpoint run from the last completed stage of each file")
+    parser.add_argument("--from-stage", choices=["extract", "enrich", "write"],
+                        help="Re-run the latest checkpoint run from this stage (write: only the writers)")
+    parser.add_argument("--distributed", action="store_true",
+                        help="Share the forms with --queue-worker processes on other machines through the queue "
+                             "folder on the share, and merge their results")
+    parser.add_argument("--queue-worker", action="store_true",
+                        help="Process forms queued by --distributed runs until the queue stays empty")
+    parser.add_argument("--idle-seconds", type=float, default=QUEUE_IDLE_SECONDS,
+                        help="Seconds a --queue-worker waits on an empty queue before it stops")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process forms as they arrive in PetForms")
+    parser.add_argument("--poll-seconds", type=float, default=WATCH_POLL_SECONDS,
+                        help="Seconds between polls of the PetForms folders (--watch)")
+    parser.add_argument("--settle-seconds", type=float, default=WATCH_SETTLE_SECONDS,
+                        help="Seconds a form must stay unchanged before it is processed (--watch)")
+    args = parser.parse_args(argv)
+    
+    try:
+        args.first_stage, args.last_stage = select_stages(args.only_stage, args.skip_stage)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.from_stage and args.first_stage != 'extract':
+        parser.error("--from-stage cannot be combined with a stage selection that starts later")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    batch_only = [option for option, value in [("--files", args.files), ("--since", args.since),
+                                                ("--dry-run", args.dry_run)] if value]
+    if (args.watch or args.queue_worker) and (batch_only or args.last_stage != 'write'):
+        parser.error(f"{', '.join(batch_only) or 'a stage selection'} cannot be used with --watch or --queue-worker")
+    return args
+
+def main(argv=None):
+    """Command line entry point."""
+    args = parse_args(argv)
+    
+    if args.queue_worker:
+        from etl.work_queue import WorkQueue, serve_queue
+        serve_queue(WorkQueue(get_queue_dir(), QUEUE_LEASE_SECONDS), args.idle_seconds)
+        return
+    
+    if args.all_members:
+        member_names = list_team_members()
     else:
-        print("No valid data found for processing.")
+        member_names = [args.team_member or get_team_member([])]
+    
+    workers = args.workers or (max(1, (os.cpu_count() or 2) - 1) if args.all_members else 1)
+    options = dict(
+        engine=args.engine or ('optimized' if args.optimized else 'legacy'),
+        shadow=args.shadow,
+        supervised=not args.no_supervisor,
+        workers=workers,
+        time_budget=args.time_budget,
+        memory_budget=args.memory_budget,
+        chunk_rows=args.chunk_rows,
+        max_rows_in_flight=args.max_rows_in_flight,
+        memory_report=args.memory_report,
+        prefetch=args.prefetch,
+        delta=args.delta,
+        history=args.history,
+        suppress_uploaded=args.suppress_uploaded,
+        output_format=args.output_format,
+        writer_processes=args.writer_processes,
+    )
+    if args.watch:
+        watch_members(member_names, args.poll_seconds, args.settle_seconds, **options)
+        return
+    
+    # Quick exit before any heavy import when there is nothing to do
+    members, partial = [], set()
+    for name in member_names:
+        paths = get_paths(name)
+        if not args.dry_run:
+            os.makedirs(paths['pet_forms'], exist_ok=True)
+        excel_files = find_pet_forms(paths)
+        selected = select_forms(excel_files, args.files, args.since)
+        if selected:
+            if len(selected) < len(excel_files):
+                partial.add(paths['team_member'])
+                print(f"{paths['team_member']}: {len(selected)} of {len(excel_files)} form(s) selected; outputs "
+                      f"written to {' and '.join(output_names(args.output_format, True))}, the full ones are kept")
+            members.append((paths, selected))
+        elif excel_files:
+            print(f"No PET forms selected in source folder: {paths['pet_forms']}")
+        else:
+            print(f"No Excel files found in source folder: {paths['pet_forms']}")
+    if not members:
+        return
+    
+    if args.dry_run:
+        dry_run_members(members, workers, args.first_stage, args.last_stage, args.output_format, partial)
+        return
+    
+    from_stage = args.from_stage or (args.first_stage if args.first_stage != 'extract' else None)
+    process_members(members, checkpoint=args.checkpoint, resume=args.resume, from_stage=from_stage,
+                    distributed=args.distributed, last_stage=args.last_stage, partial=partial, **options)
 
 if __name__ == "__main__":
-    process_pet_forms()
\ No newline at end of file
+    main()
@@ -0,0 +1,392 @@
+# Local service checking PET forms over HTTP
+#
+#   python service.py [--port 8765] [--workers 2] [--engine optimized]
+#
+#   curl -F form=@"Argos Xmas.xlsx" http://127.0.0.1:8765/check
+#   curl --data-binary @"Argos Xmas.xlsx" "http://127.0.0.1:8765/check?name=Argos%20Xmas.xlsx"
+#
+# The service starts once and stays warm: a bounded pool of worker processes has
+# the stages imported and the customer mapping, its name index and the product
+# master loaded (reloaded when their file changes), so a form is checked without
+# paying for interpreter startup, imports and mapping load. Each uploaded form
+# goes through the whole pipeline in a worker and the response gives its
+# enriched rows, its errors and its MassUpload rows as JSON. A worker still busy
+# with a form after the time budget, or one that crashed, is killed and replaced
+# so it cannot hold a slot of the pool.
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if script_dir not in sys.path:
+    sys.path.insert(0, script_dir)
+
+from config.paths import get_base_dir, get_scratch_dir, get_snapshot_dir
+from config.constants import FILE_TIME_BUDGET_SECONDS
+
+DEFAULT_PORT = 8765
+
+# Requests accepted per worker before new ones are turned away (503)
+QUEUED_REQUESTS_PER_WORKER = 4
+
+# Largest request body accepted
+MAX_UPLOAD_MB = 50
+
+# Warm state of a worker process
+_worker = {}
+
+def _file_mtime(path):
+    try:
+        return os.path.getmtime(path) if path else None
+    except OSError:
+        return None
+
+def _init_worker(base_dir, engine):
+    """Import the stages and load the mapping once per worker process."""
+    _worker.update({'base_dir': base_dir, 'engine': engine, 'mapping_mtime': None, 'master_mtime': None})
+    _refresh_reference_data()
+
+def _refresh_reference_data():
+    """Load the rules, the customer mapping and the product master, again only when their file changed."""
+    from etl.loader import load_customer_mapping
+    from etl.customer_resolver import get_customer_index
+    from etl.product_master import find_product_master, load_product_master
+    from utils.safe_io import snapshot_file
+    from config.rules import get_rules
+
+    get_rules(_worker['base_dir'], refresh=True)
+    mapping_file = os.path.join(_worker['base_dir'], "CustomerMapping.xlsx")
+    mtime = _file_mtime(mapping_file)
+    if 'mapping' not in _worker or mtime != _worker['mapping_mtime']:
+        _worker['mapping'] = load_customer_mapping(snapshot_file(mapping_file, get_snapshot_dir()))
+        _worker['mapping_mtime'] = mtime
+        get_customer_index(_worker['mapping'])
+
+    master_file = find_product_master(_worker['base_dir'])
+    mtime = _file_mtime(master_file)
+    if 'master' not in _worker or mtime != _worker['master_mtime']:
+        _worker['master'] = load_product_master(snapshot_file(master_file, get_snapshot_dir())) if master_file else None
+        _worker['master_mtime'] = mtime
+
+def _worker_main(conn, base_dir, engine):
+    """Worker process: load the warm state once, then check each form path received."""
+    _init_worker(base_dir, engine)
+    conn.send(('ready', os.getpid()))
+    while True:
+        try:
+            file_path = conn.recv()
+        except (EOFError, OSError):
+            break
+        if file_path is None:
+            break
+        try:
+            conn.send(('result', check_form(file_path)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+    conn.close()
+
+def _json_records(df):
+    """Rows as JSON-ready dictionaries (missing values become null)."""
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
+
+def form_payload(file_name, named_df, unknown_models):
+    """
+    Build the response of one checked form.
+
+    Args:
+        file_name: Name of the uploaded form
+        named_df: Enriched and named rows of the form
+        unknown_models: Model codes missing from the product master and their suggestions
+
+    Returns:
+        Dictionary with the rows, the errors and the MassUpload rows (columns A to U)
+    """
+    from etl.schema import to_output
+    from writers.excel_writer import mass_upload_row, has_na_value
+
+    output_df = to_output(named_df).reset_index(drop=True)
+    rows = _json_records(output_df)
+    errors = []
+    mass_upload = []
+    for position, record in enumerate(rows):
+        source_row = record.get('Original Row Index')
+        message = record.get('Errors in Combined Extract')
+        if message:
+            errors.append({'row': position, 'Original Row Index': source_row, 'error': message})
+        values = mass_upload_row(record, position + 2)
+        if has_na_value(values):
+            errors.append({'row': position, 'Original Row Index': source_row,
+                           'error': "Missing values in the MassUpload row"})
+        mass_upload.append(values)
+    return {'file': file_name, 'status': 'ok', 'rows': len(rows), 'enriched_rows': rows, 'errors': errors,
+            'unknown_models': unknown_models, 'mass_upload': mass_upload}
+
+def check_form(file_path):
+    """
+    Run the whole pipeline on one uploaded form (in a worker process).
+
+    Args:
+        file_path: Local copy of the uploaded form
+
+    Returns:
+        Response dictionary of the form (see form_payload)
+    """
+    import pandas as pd
+    from etl.pipeline import make_stage_runner, process_form, stream_rows
+    from etl.product_master import check_model_codes
+
+    _refresh_reference_data()
+    file_name = os.path.basename(file_path)
+    run_stage = make_stage_runner(_worker['engine'])
+    expanded_df = process_form(file_path, run_stage)
+    if expanded_df is None:
+        return _error(file_name, "The PET form could not be read")
+
+    unknown_models = {}
+    chunks = stream_rows([(file_name, expanded_df)], run_stage, _worker['mapping'], None)
+    if _worker['master'] is not None:
+        chunks = check_model_codes(chunks, _worker['master'], unknown_models)
+    chunks = list(chunks)
+    named_df = pd.concat(chunks, ignore_index=True) if chunks else expanded_df
+    return form_payload(file_name, named_df, unknown_models)
+
+def _error(file_name, message):
+    """Response of a form that could not be checked."""
+    return {'file': file_name, 'status': 'error', 'errors': [{'error': message}]}
+
+def parse_uploads(content_type, body, query):
+    """
+    Read the uploaded forms of a request.
+
+    A multipart/form-data body may carry several forms (one per file part);
+    any other body is one form named by the 'name' query parameter.
+
+    Returns:
+        List of (file name, content bytes)
+    """
+    if content_type.startswith('multipart/form-data'):
+        from email.parser import BytesParser
+        from email.policy import default
+
+        message = BytesParser(policy=default).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        return [(part.get_filename(), part.get_payload(decode=True))
+                for part in message.iter_parts() if part.get_filename()]
+    name = query.get('name', ['upload.xlsx'])[0]
+    return [(name, body)] if body else []
+
+class CheckService:
+    """Warm worker processes and the bounded number of requests they accept."""
+
+    def __init__(self, base_dir, engine='optimized', workers=2, time_budget=FILE_TIME_BUDGET_SECONDS):
+        """
+        Args:
+            base_dir: Folder holding CustomerMapping.xlsx
+            engine: Transform engine of the workers
+            workers: Worker processes checking forms
+            time_budget: Seconds a worker may spend on a form before it is killed and replaced
+        """
+        self.base_dir = base_dir
+        self.engine = engine
+        self.workers = workers
+        self.time_budget = time_budget
+        self.slots = threading.BoundedSemaphore(workers * QUEUED_REQUESTS_PER_WORKER)
+        self.upload_root = os.path.join(get_scratch_dir(), "service")
+        self.context = multiprocessing.get_context("spawn")
+        self.idle = queue.Queue()
+        self.checked = 0
+        self.replaced = 0
+        for worker in [self._start_worker() for _ in range(workers)]:
+            self._wait_ready(worker)
+
+    def _start_worker(self):
+        """Start a worker process (it loads the mapping before it reports ready)."""
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=_worker_main, args=(child_conn, self.base_dir, self.engine), daemon=True)
+        process.start()
+        child_conn.close()
+        return {'process': process, 'conn': parent_conn}
+
+    def _wait_ready(self, worker):
+        """Wait until a new worker has its mapping loaded, then make it available."""
+        try:
+            worker['conn'].recv()
+        except (EOFError, OSError):
+            print(f"⛔ A worker could not start (exit code {worker['process'].exitcode})")
+            raise
+        self.idle.put(worker)
+
+    def _replace(self, worker, reason):
+        """Kill a worker and start another one in its place (in the background)."""
+        print(f"⚠️ {reason}; replacing the worker")
+        worker['process'].kill()
+        worker['process'].join(timeout=5)
+        worker['conn'].close()
+        self.replaced += 1
+        threading.Thread(target=lambda: self._wait_ready(self._start_worker()), daemon=True).start()
+
+    def _check_one(self, name, file_path):
+        """Check one form in the next idle worker, within the time budget."""
+        worker = self.idle.get()
+        try:
+            worker['conn'].send(file_path)
+            if not worker['conn'].poll(self.time_budget):
+                self._replace(worker, f"Checking {name} took longer than {self.time_budget}s")
+                worker = None
+                return _error(name, f"Not checked within {self.time_budget}s")
+            kind, payload = worker['conn'].recv()
+        except (EOFError, OSError):
+            self._replace(worker, f"A worker crashed while checking {name}")
+            worker = None
+            return _error(name, "A worker crashed while checking the form")
+        finally:
+            if worker is not None:
+                self.idle.put(worker)
+        return payload if kind == 'result' else _error(name, payload)
+
+    def check(self, uploads):
+        """
+        Check uploaded forms in the worker processes.
+
+        Args:
+            uploads: List of (file name, content bytes)
+
+        Returns:
+            List of response dictionaries, one per form
+        """
+        os.makedirs(self.upload_root, exist_ok=True)
+        upload_dir = tempfile.mkdtemp(prefix="upload_", dir=self.upload_root)
+        try:
+            forms = []
+            for index, (name, content) in enumerate(uploads):
+                # Each form keeps its own name (it becomes the Source File of its rows)
+                form_dir = os.path.join(upload_dir, str(index))
+                os.makedirs(form_dir)
+                file_path = os.path.join(form_dir, os.path.basename(name) or "upload.xlsx")
+                with open(file_path, 'wb') as f:
+                    f.write(content)
+                forms.append((name, file_path))
+
+            with ThreadPoolExecutor(max_workers=min(len(forms), self.workers)) as threads:
+                results = list(threads.map(lambda form: self._check_one(*form), forms))
+            self.checked += len(results)
+            return results
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+    def close(self):
+        """Ask the idle workers to exit and stop any still running."""
+        workers = []
+        while not self.idle.empty():
+            workers.append(self.idle.get())
+        for worker in workers:
+            try:
+                worker['conn'].send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker['process'].join(timeout=5)
+            if worker['process'].is_alive():
+                worker['process'].kill()
+            worker['conn'].close()
+
+class CheckRequestHandler(BaseHTTPRequestHandler):
+    """GET /health, POST /check."""
+
+    service = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            self._send_json(404, {'error': "Unknown path"})
+            return
+        service = self.service
+        self._send_json(200, {'status': 'ok', 'engine': service.engine, 'workers': service.workers,
+                              'forms_checked': service.checked, 'workers_replaced': service.replaced})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/check':
+            self._send_json(404, {'error': "Unknown path"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_UPLOAD_MB * 1024 * 1024:
+            self._send_json(413, {'error': f"Uploads are limited to {MAX_UPLOAD_MB} MB"})
+            return
+        body = self.rfile.read(length)
+
+        uploads = parse_uploads(self.headers.get('Content-Type', ''), body, parse_qs(url.query))
+        if not uploads:
+            self._send_json(400, {'error': "No PET form in the request"})
+            return
+
+        # Requests beyond the queue bound are turned away rather than piling up
+        if not self.service.slots.acquire(blocking=False):
+            self.send_response(503)
+            self.send_header("Retry-After", "5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            start = time.perf_counter()
+            forms = self.service.check(uploads)
+            self._send_json(200, {'forms': forms, 'seconds': round(time.perf_counter() - start, 3)})
+        finally:
+            self.service.slots.release()
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, workers=2, engine='optimized', base_dir=None):
+    """
+    Run the check service until interrupted.
+
+    Args:
+        host: Interface to listen on (local only by default)
+        port: Port to listen on
+        workers: Worker processes checking forms
+        engine: Transform engine of the workers
+        base_dir: Folder holding CustomerMapping.xlsx (defaults to get_base_dir())
+    """
+    from etl.stages import resolve_engine
+
+    service = CheckService(base_dir or get_base_dir(), resolve_engine(engine), workers)
+    CheckRequestHandler.service = service
+    server = ThreadingHTTPServer((host, port), CheckRequestHandler)
+    server.daemon_threads = True
+    print(f"✅ Check service ready on http://{host}:{server.server_port} ({workers} warm worker(s), {service.engine} engine)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check PET forms over HTTP with warm mappings and workers.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes checking forms")
+    parser.add_argument("--engine", choices=["legacy", "optimized", "polars"], default="optimized",
+                        help="Transform engine of the workers")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.engine)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Shared fixtures: small PET forms, a customer mapping and a member folder laid out like the real ones
+import os
+import random
+
+import pandas as pd
+import pytest
+
+PET_FORM_HEADER = ['Customer Code', 'Customer Name', 'Model.Suffix', 'Type of Support', 'SOA/Unit',
+                   'Sell-out Estimated QTY', 'StartDate', 'End Date', 'Total Additional Support AMT',
+                   'Name of promotion', 'WBW TV Model']
+
+CUSTOMERS = [('GB1001', 'Currys'), ('IE2002', 'Harvey Norman'), ('GB3003', 'Argos Ltd')]
+MODELS = ['OLED55C4.AEK', 'GB335PZQV', 'QNED80.AEKQ', 'SC9']
+
+def pet_form_rows(rows=20, seed=1):
+    """Form lines (lists in PET_FORM_HEADER order) with valid customers, models and dates."""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(rows):
+        code, name = rng.choice(CUSTOMERS)
+        lines.append([code, name, rng.choice(MODELS), 'SOA', round(rng.uniform(1, 50), 2),
+                      rng.choice([1, 2, 5, 17]), rng.choice(['01/12/2026', '2026-11-15']),
+                      rng.choice(['31/01/2027', '2027-03-31']), None,
+                      rng.choice(['Black Friday', 'Xmas']), 'NA'])
+    return lines
+
+def write_pet_form(path, lines):
+    """Write form lines below the title rows of a 'PET Form' sheet."""
+    top = [['PET FORM'] + [None] * (len(PET_FORM_HEADER) - 1), [None] * len(PET_FORM_HEADER), PET_FORM_HEADER]
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(top + lines).to_excel(writer, sheet_name='PET Form', header=False, index=False)
+    return str(path)
+
+def write_customer_mapping(path):
+    """Customer mapping covering the customers of pet_form_rows."""
+    pd.DataFrame({
+        'Customer Code': [code for code, _ in CUSTOMERS],
+        'Customer Name': [name for _, name in CUSTOMERS],
+        'Customer Type': ['Retail'] * len(CUSTOMERS),
+        'Requestor': ['Bob'] * len(CUSTOMERS),
+        'Currency': ['GBP', 'EUR', 'GBP'],
+    }).to_excel(path, index=False)
+    return str(path)
+
+@pytest.fixture
+def make_pet_form(tmp_path):
+    """Factory writing a PET form into tmp_path/PetForms: make_pet_form(name, rows=20, seed=1, lines=None)."""
+    folder = tmp_path / "PetForms"
+    os.makedirs(folder, exist_ok=True)
+
+    def make(name, rows=20, seed=1, lines=None):
+        return write_pet_form(folder / name, lines if lines is not None else pet_form_rows(rows, seed))
+
+    return make
+
+@pytest.fixture
+def member_paths(tmp_path, monkeypatch):
+    """
+    Paths of team member 'Tima' on a share in tmp_path holding a customer mapping;
+    the scratch folder, checkpoints and history database are in tmp_path too.
+    """
+    from config.paths import get_paths, ensure_directories
+
+    base_dir = tmp_path / "share"
+    base_dir.mkdir()
+    monkeypatch.setenv("SPMS_BASE_DIR", str(base_dir))
+    monkeypatch.setenv("SPMS_SCRATCH_DIR", str(tmp_path / "scratch"))
+    monkeypatch.setenv("SPMS_HISTORY_DB", str(tmp_path / "history.sqlite"))
+    write_customer_mapping(base_dir / "CustomerMapping.xlsx")
+    paths = get_paths("Tima", str(base_dir))
+    ensure_directories(paths)
+    return paths
@@ -0,0 +1,22 @@
+# Catalog pre-scan: sizes read without loading the sheets, largest forms first, other workbooks skipped
+import pandas as pd
+
+from etl.catalog import build_catalog, plan_schedule
+
+def test_forms_are_scheduled_largest_first(make_pet_form, tmp_path):
+    small, large, medium = (make_pet_form(f"{name}.xlsx", rows=rows)
+                            for name, rows in [("small", 5), ("large", 80), ("medium", 30)])
+    summary = str(tmp_path / "Summary.xlsx")
+    pd.DataFrame({'Total': [1]}).to_excel(summary, sheet_name='Summary', index=False)
+    broken = tmp_path / "broken.xlsx"
+    broken.write_bytes(b"not a workbook")
+
+    file_paths = [small, summary, str(broken), large, medium]
+    catalog = build_catalog(file_paths)
+    assert catalog[large]['sheet_name'] == 'PET Form'
+    assert catalog[large]['rows'] == 83  # Title rows and header included
+    assert catalog[str(broken)]['error'] is not None
+
+    scheduled, skipped = plan_schedule(catalog, file_paths)
+    assert scheduled == [large, medium, small, str(broken)]
+    assert [entry['file_path'] for entry in skipped] == [summary]
@@ -0,0 +1,28 @@
+# Checkpoints: a run that failed to write its outputs resumes without reading its forms again
+import os
+
+import main
+from conftest import pet_form_rows, write_pet_form
+from writers.excel_writer import MassUploadWriter
+
+RUN_OPTIONS = dict(supervised=False, prefetch=0, writer_processes=0)
+
+def test_failed_run_resumes_from_its_checkpoints(member_paths, monkeypatch, capsys):
+    forms = [write_pet_form(os.path.join(member_paths['pet_forms'], f"form_{i}.xlsx"), pet_form_rows(10, seed=i))
+             for i in range(3)]
+    mass_upload_file = os.path.join(member_paths['uploads'], "MassUpload.xlsx")
+
+    def fail(writer):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(MassUploadWriter, "close", fail)
+        assert main.process_members([(member_paths, forms)], checkpoint=True, **RUN_OPTIONS) == set()
+    assert not os.path.exists(mass_upload_file)
+    capsys.readouterr()
+
+    assert main.process_members([(member_paths, forms)], resume=True, **RUN_OPTIONS) == {'Tima'}
+    output = capsys.readouterr().out
+    assert "3 file(s) resumed from checkpoints" in output
+    assert "Processing:" not in output
+    assert os.path.exists(mass_upload_file)
@@ -0,0 +1,45 @@
+# Command line: form selection by pattern, list file and date, selection outputs, stage ranges
+import os
+
+import pytest
+
+import main
+
+def test_select_forms(tmp_path):
+    forms = []
+    for name, mtime in [("Argos Xmas.xlsx", 1_700_000_000), ("Currys Xmas.csv", 1_800_000_000),
+                        ("Argos Spring.xlsb", 1_800_000_000)]:
+        path = tmp_path / name
+        path.write_bytes(b"")
+        os.utime(path, (mtime, mtime))
+        forms.append(str(path))
+
+    assert main.select_forms(forms, ["Argos*"]) == [forms[0], forms[2]]
+    assert main.select_forms(forms, since=main.parse_since("2026-01-01")) == forms[1:]
+    assert main.select_forms(forms, [str(tmp_path / "*Xmas*")], since=1_750_000_000) == [forms[1]]
+
+    (tmp_path / "list.txt").write_text("Currys Xmas.csv\nArgos Spring.xlsb\n")
+    args = main.parse_args(["Tima", "--files", f"@{tmp_path / 'list.txt'}", "--skip-stage", "write"])
+    assert main.select_forms(forms, args.files) == forms[1:]
+    assert (args.first_stage, args.last_stage) == ("extract", "enrich")
+
+def test_stage_selection():
+    assert main.select_stages() == ("extract", "write")
+    assert main.select_stages(only=["write"]) == ("write", "write")
+    assert main.select_stages(skip=["extract"]) == ("enrich", "write")
+    with pytest.raises(ValueError):
+        main.select_stages(skip=["enrich"])
+
+def test_selection_keeps_the_full_outputs(tmp_path, monkeypatch, capsys):
+    from conftest import pet_form_rows, write_pet_form
+
+    pet_forms = tmp_path / "Team Members" / "Tima" / "PetForms"
+    pet_forms.mkdir(parents=True)
+    for name in ("Argos Xmas.xlsx", "Currys Xmas.xlsx"):
+        write_pet_form(pet_forms / name, pet_form_rows(5))
+    monkeypatch.setenv("SPMS_BASE_DIR", str(tmp_path))
+
+    main.main(["Tima", "--files", "Argos*", "--dry-run"])
+    assert "Would write: CombinedExtractedColumns - Selection.xlsx, MassUpload - Selection.xlsx" in capsys.readouterr().out
+    main.main(["Tima", "--files", "*Xmas*", "--dry-run"])
+    assert "Would replace: CombinedExtractedColumns.xlsx, MassUpload.xlsx" in capsys.readouterr().out
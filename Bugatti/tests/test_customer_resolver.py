@@ -0,0 +1,40 @@
+# Customer resolver: unknown codes filled from a close customer name among many accounts, submitted codes kept
+import pandas as pd
+
+from etl.customer_resolver import MAX_CANDIDATES, CustomerNameIndex, normalize_customer_name
+
+def _mapping(extra_accounts=2000):
+    accounts = [('GB3003', 'Argos Ltd'), ('GB1001', 'Currys Group PLC'), ('IE2002', 'Harvey Norman')]
+    accounts += [(f"GB{9000 + i}", f"Retailer {i} Stores") for i in range(extra_accounts)]
+    return pd.DataFrame(accounts, columns=['Customer Code', 'Customer Name'])
+
+def test_legal_forms_and_punctuation_are_ignored():
+    assert normalize_customer_name("ARGOS, Ltd.") == "argos"
+    assert normalize_customer_name("The Group") == "the group"
+
+def test_close_names_resolve_and_others_do_not():
+    index = CustomerNameIndex(_mapping())
+    resolved = index.resolve(["ARGOS LIMITED", "Curys", "Harvey Normann", "Totally Unknown Shop"])
+    assert {name: code for name, (code, _) in resolved.items()} == \
+        {"ARGOS LIMITED": 'GB3003', "Curys": 'GB1001', "Harvey Normann": 'IE2002'}
+    assert all(score >= 90 for _, score in resolved.values())
+
+def test_names_are_scored_against_a_block_of_the_mapping():
+    index = CustomerNameIndex(_mapping())
+    assert len(index.candidates(normalize_customer_name("Retailer 1234 Stores"))) == MAX_CANDIDATES
+    assert index.resolve(["Retailer 1234 Stores"])["Retailer 1234 Stores"][0] == 'GB10234'
+
+def test_resolved_rows_keep_the_submitted_code_and_every_chunk_has_the_columns():
+    from etl.stages import _resolve_unknown_customers
+
+    mapping = _mapping(extra_accounts=10)
+    chunk = pd.DataFrame({'Customer Code': ['GB3003', 'XX999', 'NA'],
+                          'Customer Name': ['Argos Ltd', 'Curys', 'Harvey Normann']})
+    resolved = _resolve_unknown_customers(chunk, mapping)
+    assert list(resolved['Customer Code']) == ['GB3003', 'GB1001', 'IE2002']
+    assert list(resolved['Original Customer Code'].fillna('')) == ['', 'XX999', '']
+    assert resolved['Customer Match Confidence'].isna().tolist() == [True, False, False]
+
+    unchanged = _resolve_unknown_customers(chunk.iloc[:1].copy(), mapping)
+    assert list(unchanged.columns) == list(resolved.columns)
+    assert unchanged['Customer Match Confidence'].isna().all()
@@ -0,0 +1,40 @@
+# Duplicate forms: copies found from the catalog, identical content kept once, near-identical forms reported
+import shutil
+
+import pandas as pd
+
+from conftest import PET_FORM_HEADER, pet_form_rows
+from etl.catalog import build_catalog
+from etl.dedup import DuplicateTracker, form_signature, identical_sheet_groups
+
+def _cleaned(rows=10, seed=1):
+    return pd.DataFrame(pet_form_rows(rows, seed), columns=PET_FORM_HEADER)
+
+def test_copied_forms_are_grouped_before_processing(make_pet_form, tmp_path):
+    original = make_pet_form("Argos.xlsx")
+    copy = str(tmp_path / "PetForms" / "Argos (1).xlsx")
+    shutil.copyfile(original, copy)
+    other = make_pet_form("Currys.xlsx", seed=2)
+
+    file_paths = [original, other, copy]
+    assert identical_sheet_groups(build_catalog(file_paths), file_paths) == [[original, copy]]
+
+def test_earliest_identical_form_is_kept_whatever_finishes_first():
+    tracker = DuplicateTracker()
+    assert tracker.check("b.xlsx", 1, form_signature(_cleaned())) == ('new', None)
+    assert tracker.check("a.xlsx", 0, form_signature(_cleaned())) == ('replaces', "b.xlsx")
+    assert tracker.check("c.xlsx", 2, form_signature(_cleaned())) == ('duplicate', "a.xlsx")
+    assert tracker.duplicates_df()['File'].tolist() == ["b.xlsx", "c.xlsx"]
+
+def test_near_identical_forms_report_their_differing_rows():
+    tracker = DuplicateTracker()
+    changed = _cleaned()
+    changed.loc[3, 'Sell-out Estimated QTY'] = 999
+    assert tracker.check("a.xlsx", 0, form_signature(_cleaned())) == ('new', None)
+    assert tracker.check("b.xlsx", 1, form_signature(changed)) == ('new', None)
+
+    report = tracker.near_duplicates_df()
+    assert report[['Row Only In', 'Form Row']].values.tolist() == [["b.xlsx", 4], ["a.xlsx", 4]]
+    assert set(report['Shared Rows']) == {9}
+    assert tracker.check("c.xlsx", 2, form_signature(_cleaned(seed=5))) == ('new', None)
+    assert len(tracker.near_duplicates_df()) == 2
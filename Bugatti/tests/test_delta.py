@@ -0,0 +1,29 @@
+# Delta processing: a revised form only keeps its new and changed lines
+import pandas as pd
+
+from etl.delta import diff_against_previous, save_versions, version_name_key
+
+def _grouped(lines):
+    return pd.DataFrame([{'Customer Name': 'Argos Ltd', 'Customer Code': 'GB3003', 'Model Code': model,
+                          'Start Date': '20261201', 'End Date': '20270131', 'Additional SOA': 10.0,
+                          'Name of Promotion': 'Xmas', 'Is WBW': 'NO', 'Expected Sell-Out': qty,
+                          'Type of Support': 'SOA', 'WBW TV MODEL': 'NA'} for model, qty in lines])
+
+def test_version_suffixes_are_ignored_in_names():
+    assert version_name_key("Argos Xmas v2.xlsx") == "argos xmas"
+    assert version_name_key("Argos Xmas (1) final.xlsx") == "argos xmas"
+    assert version_name_key("Argos Xmas Rev 3.xlsm") == "argos xmas"
+
+def test_revision_keeps_new_and_changed_lines(tmp_path):
+    cache_dir = str(tmp_path / "DeltaCache")
+    first = _grouped([('OLED55', 5), ('OLED65', 2), ('SC9', 1), ('GB335', 4)])
+    rows, delta = diff_against_previous(first, "Argos Xmas.xlsx", cache_dir)
+    assert len(rows) == 4 and delta['previous'] is None
+    save_versions(cache_dir, {"Argos Xmas.xlsx": delta})
+
+    revised = _grouped([('OLED55', 5), ('OLED65', 3), ('SC9', 1), ('QNED80', 6)])
+    rows, delta = diff_against_previous(revised, "Argos Xmas v2.xlsx", cache_dir)
+    assert (delta['previous'], delta['matched_by']) == ("Argos Xmas.xlsx", 'customer and promotion')
+    assert (delta['New'], delta['Changed'], delta['Unchanged'], delta['Removed']) == (1, 1, 2, 1)
+    assert rows['Model Code'].tolist() == ['OLED65', 'QNED80']
+    assert delta['removed']['Model Code'].tolist() == ['GB335']
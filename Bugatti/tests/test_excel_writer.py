@@ -0,0 +1,87 @@
+# Streamed writers: same cells as the whole-frame writers, and MassUpload keeps everything of its template but the old rows
+import openpyxl
+import pandas as pd
+from openpyxl.styles import Font
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.datavalidation import DataValidation
+
+from writers.excel_writer import MassUploadWriter
+
+def _combined_rows(count):
+    return pd.DataFrame({
+        'PromotionName': [f"PROMO {i}" for i in range(count)],
+        'Customer Code': ['GB1001'] * count,
+        'Model Code': ['OLED55C4'] * count,
+        'Start Date': ['20261201'] * count,
+        'End Date': ['20270115'] * count,
+        'Additional SOA': [1.5] * count,
+    })
+
+def test_mass_upload_keeps_the_template(tmp_path):
+    template_file = tmp_path / "MassUpload.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Upload"
+    ws.append(["Promotion", "Requestor"])
+    ws["A1"].font = Font(bold=True, color="FF0000")
+    for i in range(50):
+        ws.append([f"OLD {i}", "Alice"])
+    validation = DataValidation(type="list", formula1='"SAL,PUR"')
+    validation.add("G2:G1000")
+    ws.add_data_validation(validation)
+    ws.column_dimensions["Q"].number_format = "0.00"
+    wb.create_sheet("Codes").append(["SAL", "Sales"])
+    wb.defined_names["ReasonCodes"] = DefinedName("ReasonCodes", attr_text="Codes!$A$1:$A$10")
+    wb.save(template_file)
+
+    writer = MassUploadWriter(str(tmp_path / "out.xlsx"), template_file=str(template_file))
+    writer.append(_combined_rows(3))
+    writer.close()
+
+    result = openpyxl.load_workbook(tmp_path / "out.xlsx")
+    ws = result["Upload"]
+    assert result.sheetnames == ["Upload", "Codes"]
+    assert "ReasonCodes" in result.defined_names
+    assert [str(dv.sqref) for dv in ws.data_validations.dataValidation] == ["G2:G1000"]
+    assert ws.column_dimensions["Q"].number_format == "0.00"
+    assert ws["A1"].value == "Promotion" and ws["A1"].font.b and ws["A1"].font.color.rgb == "00FF0000"
+    assert ws.max_row == 4
+    assert [ws.cell(row=r, column=1).value for r in range(2, 5)] == ["PROMO 0", "PROMO 1", "PROMO 2"]
+    assert ws["E4"].value.startswith("=TEXT(DATE(LEFT(D4")
+
+def _named_rows(form, mapping_file):
+    from etl.loader import load_customer_mapping
+    from etl.pipeline import make_stage_runner, process_form, stream_rows
+
+    run_stage = make_stage_runner('legacy')
+    expanded_df = process_form(form, run_stage)
+    mapping = load_customer_mapping(mapping_file)
+    return pd.concat(stream_rows([("form.xlsx", expanded_df)], run_stage, mapping, None), ignore_index=True)
+
+def _cells(output_file):
+    ws = openpyxl.load_workbook(output_file).active
+    return [[(cell.value, cell.fill.fgColor.rgb if cell.fill.fill_type else None) for cell in row]
+            for row in ws.iter_rows()]
+
+def test_streamed_outputs_match_the_whole_frame_writers(make_pet_form, tmp_path):
+    from conftest import write_customer_mapping
+    from writers.excel_writer import CombinedWriter, save_with_highlighting, create_mass_upload
+
+    named_df = _named_rows(make_pet_form("form.xlsx", rows=40), write_customer_mapping(tmp_path / "mapping.xlsx"))
+    save_with_highlighting(named_df, str(tmp_path / "combined_frame.xlsx"))
+    create_mass_upload(named_df, str(tmp_path / "mass_frame.xlsx"))
+
+    # Chunks arriving out of order are written in file order
+    half = len(named_df) // 2
+    combined = CombinedWriter(str(tmp_path / "combined_streamed.xlsx"))
+    mass_upload = MassUploadWriter(str(tmp_path / "mass_streamed.xlsx"))
+    for order, chunk in [(1, named_df.iloc[half:]), (0, named_df.iloc[:half])]:
+        combined.append(chunk.reset_index(drop=True), order)
+        mass_upload.append(chunk.reset_index(drop=True), order)
+    combined.close()
+    mass_upload.close()
+
+    streamed = _cells(tmp_path / "combined_streamed.xlsx")
+    assert streamed == _cells(tmp_path / "combined_frame.xlsx")
+    assert any(fill for row in streamed for _, fill in row)
+    assert _cells(tmp_path / "mass_streamed.xlsx") == _cells(tmp_path / "mass_frame.xlsx")
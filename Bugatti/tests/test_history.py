@@ -0,0 +1,47 @@
+# History store: rows become history once committed, and re-runs flag them without registering them again
+import os
+import sqlite3
+
+import pandas as pd
+
+import main
+from conftest import pet_form_rows, write_pet_form
+
+RUN_OPTIONS = dict(supervised=False, prefetch=0, writer_processes=0, history=True)
+
+def _history_rows():
+    with sqlite3.connect(os.environ["SPMS_HISTORY_DB"]) as conn:
+        return conn.execute("SELECT COUNT(*) FROM registered_rows").fetchone()[0]
+
+def test_rerun_flags_rows_without_registering_them_again(member_paths):
+    forms = [write_pet_form(os.path.join(member_paths['pet_forms'], "form.xlsx"), pet_form_rows(10))]
+    combined_file = os.path.join(member_paths['member_dir'], "CombinedExtractedColumns.xlsx")
+
+    assert main.process_members([(member_paths, forms)], **RUN_OPTIONS) == {'Tima'}
+    registered = _history_rows()
+    first = pd.read_excel(combined_file)
+    assert registered == len(first) and set(first['Previously Uploaded']) == {'NO'}
+
+    assert main.process_members([(member_paths, forms)], **RUN_OPTIONS) == {'Tima'}
+    assert _history_rows() == registered
+    assert set(pd.read_excel(combined_file)['Previously Uploaded']) == {'YES'}
+    mass_upload = pd.read_excel(os.path.join(member_paths['uploads'], "MassUpload.xlsx"))
+    assert len(mass_upload) == len(first)
+
+def test_staged_rows_become_history_only_when_committed(tmp_path):
+    from etl.history import HistoryStore
+
+    rows = pd.DataFrame({'Customer Code': ['GB1001', 'IE2002'], 'Model Code': ['SC9', 'SC9'],
+                         'Apply Month': ['202612', '202701'], 'PromotionName': ['XMAS', 'XMAS']})
+    store = HistoryStore(str(tmp_path / "history.sqlite"))
+    try:
+        store.stage('Tima', rows)
+        assert store.previously_uploaded(rows) == [False, False]
+        store.drop_member('Tima')
+        assert store.commit_member('Tima') == 0
+
+        store.stage('Tima', rows.iloc[:1])
+        assert store.commit_member('Tima') == 1
+        assert store.previously_uploaded(rows) == [True, False]
+    finally:
+        store.close()
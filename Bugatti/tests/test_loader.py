@@ -1 +1,43 @@
 # Tests for loader functions
+import openpyxl
+import pandas as pd
+
+from etl.loader import load_and_clean_excel
+
+ROWS = [
+    ["PET Form - Xmas promotions"],
+    [],
+    ["Customer Code", "Customer Name", "Model Code", "Expected Sell-Out", "Additional SOA"],
+    ["C001", "Argos", "QE55Q60", 120, 25.5],
+    ["C002", "Currys", "QE65Q80", 40, 30],
+]
+
+def _write_xlsx(path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "PET Form"
+    for row in ROWS:
+        ws.append(row)
+    wb.save(path)
+
+def test_csv_form_is_cleaned_like_the_workbook(tmp_path):
+    xlsx_file, csv_file = tmp_path / "form.xlsx", tmp_path / "form.csv"
+    _write_xlsx(xlsx_file)
+    csv_file.write_text("\n".join(";".join(str(value).replace(".", ",") for value in row) for row in ROWS),
+                        encoding="utf-8-sig")
+
+    from_xlsx = load_and_clean_excel(str(xlsx_file))
+    from_csv = load_and_clean_excel(str(csv_file))
+
+    assert list(from_csv.columns) == list(from_xlsx.columns)
+    for column in from_xlsx.columns:
+        numeric = pd.to_numeric(from_xlsx[column], errors='coerce')
+        if numeric.notna().all():
+            assert pd.to_numeric(from_csv[column]).tolist() == numeric.tolist()
+        else:
+            assert from_csv[column].tolist() == from_xlsx[column].tolist()
+
+def test_unsupported_extension(tmp_path):
+    path = tmp_path / "form.ods"
+    path.write_bytes(b"")
+    assert load_and_clean_excel(str(path)) is None
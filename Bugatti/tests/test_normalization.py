@@ -0,0 +1,24 @@
+# Column normalizers: placeholders, defaults and the Is WBW flag in one pass per column
+import pandas as pd
+
+from etl.normalization import normalize_columns
+
+def test_placeholders_defaults_and_wbw_flag():
+    cleaned_df = pd.DataFrame({'WBW TV Model': [' oled55c4 ', 'NA2', 'qe65s95d', 'no', 'TV']})
+    extracted_df = pd.DataFrame({
+        'Type of Support': ['Display', ' ', 'n/a', '12.5', 'NULL'],
+        'Name of Promotion': ['Xmas', 'Xmas', None, 'Xmas', 'Xmas'],
+        'Model Code': ['SC9', 'SC9', 'SC9', 'SC9', 'SC9'],
+    })
+
+    normalized = normalize_columns(extracted_df, cleaned_df)
+
+    assert normalized['Type of Support'].tolist() == ['Display', 'A SOA', 'A SOA', 'A SOA', 'A SOA']
+    assert normalized['WBW TV MODEL'].tolist() == ['OLED55C4', 'NO TV MODEL', 'QE65S95D', 'NO TV MODEL', 'TV']
+    assert normalized['Is WBW'].tolist() == ['YES', 'NO', 'YES', 'NO', 'NO']
+    assert normalized['Name of Promotion'].tolist() == ['Xmas SC9', 'Xmas', 'SC9', 'Xmas', 'Xmas']
+
+def test_no_wbw_column():
+    extracted_df = pd.DataFrame({'Type of Support': ['NA'], 'Name of Promotion': ['Xmas'], 'Model Code': ['SC9']})
+    normalized = normalize_columns(extracted_df, pd.DataFrame({'Model': ['SC9']}))
+    assert normalized[['Type of Support', 'WBW TV MODEL', 'Is WBW']].values.tolist() == [['A SOA', 'NO TV MODEL', 'NO']]
@@ -0,0 +1,63 @@
+# Overlap sweep across forms: same pairs as a pairwise check, duplicates discarded, capped listing
+import random
+
+import pandas as pd
+
+from etl.overlaps import OverlapIndex
+
+def _form_chunk(rng, rows):
+    starts = [20260101 + rng.randrange(0, 12) * 100 + rng.randrange(0, 28) for _ in range(rows)]
+    return pd.DataFrame({
+        'Customer Code': [rng.choice(['GB1001', 'IE2002']) for _ in range(rows)],
+        'Model Code': [rng.choice(['OLED55C4', 'SC9']) for _ in range(rows)],
+        'Start Date': [str(start) for start in starts],
+        'End Date': [str(start + rng.randrange(0, 3) * 100) for start in starts],
+        'Original Row Index': range(rows),
+        'Name of Promotion': 'Xmas',
+        'Additional SOA': 10.0,
+    })
+
+def _pairs(df):
+    return sorted(zip(df['Source File'], df['Original Row Index'], df['Overlapping Source File'],
+                      df['Overlapping Original Row Index']))
+
+def test_sweep_matches_pairwise_check():
+    rng = random.Random(7)
+    forms = {f"form_{i}.xlsx": _form_chunk(rng, 40) for i in range(3)}
+    index = OverlapIndex()
+    for order, (name, chunk) in enumerate(forms.items()):
+        # Two rows per line, as after the expansion by apply month
+        list(index.track([pd.concat([chunk, chunk])], name, order))
+
+    expected = []
+    names = list(forms)
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            for a in forms[first].itertuples():
+                for b in forms[second].itertuples():
+                    if (a[1], a[2]) == (b[1], b[2]) and int(a[3]) <= int(b[4]) and int(b[3]) <= int(a[4]):
+                        expected.append((first, a[5], second, b[5]))
+
+    assert expected and _pairs(index.conflicts_df()) == sorted(expected)
+
+def test_discarded_form_is_not_reported():
+    chunk = _form_chunk(random.Random(1), 5)
+    index = OverlapIndex()
+    list(index.track([chunk], "form_0.xlsx", 0))
+    list(index.track([chunk.copy()], "form_1.xlsx", 1))
+    assert len(index.conflicts_df()) >= 5
+    index.discard(1)
+    assert index.conflicts_df().empty
+
+def test_listed_conflicts_are_capped_and_counted():
+    rng = random.Random(7)
+    index = OverlapIndex()
+    for order in range(3):
+        list(index.track([_form_chunk(rng, 40)], f"form_{order}.xlsx", order))
+
+    everything = index.conflicts_df(limit=None)
+    listed = index.conflicts_df(limit=3)
+    assert len(everything) > 3
+    assert len(listed) == 3
+    assert listed.attrs['total'] == everything.attrs['total'] == len(everything)
+    assert set(_pairs(listed)) <= set(_pairs(everything))
@@ -0,0 +1,46 @@
+# Parity tests: the polars engine must produce the same frames as the pandas engines
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('polars')
+
+from etl.grouping import group_similar_rows
+from etl.polars_stages import group_similar_rows_polars, join_customer_mapping_polars
+from etl.schema import apply_schema
+
+def _extracted(rows=500, seed=7):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Customer Name': rng.choice(['ARGOS LTD', 'CURRYS', 'HARVEY NORMAN'], rows),
+        'Customer Code': rng.choice(['GB3003', 'GB1001', 'IE2002', 'UNKNOWN'], rows),
+        'Model Code': rng.choice(['OLED55C4.AEK', 'F4V510SSE', 'GLT', None], rows, p=[0.4, 0.4, 0.15, 0.05]),
+        'Start Date': rng.choice(['20261101', '20261201'], rows),
+        'End Date': rng.choice(['20270131', '20270228'], rows),
+        'Additional SOA': rng.choice([9.21, 47.26, 18.66], rows),
+        'Source File': 'form.xlsx',
+        'Name of Promotion': rng.choice(['Spring', 'Xmas'], rows),
+        'Is WBW': rng.choice(['YES', 'NO'], rows),
+        'Type of Support': rng.choice(['SOA', None, 'Price Protection'], rows),
+        'Expected Sell-Out': rng.integers(0, 50, rows),
+        'Original Row Index': np.arange(rows),
+    })
+    return apply_schema(df)
+
+def test_grouping_matches_pandas():
+    df = _extracted()
+    expected = apply_schema(group_similar_rows(df.copy()))
+    result = apply_schema(group_similar_rows_polars(df.copy()))
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_mapping_join_matches_pandas_merge():
+    combined = _extracted(rows=200).reset_index(drop=True)
+    mapping = pd.DataFrame({
+        'Customer Code': ['GB1001', 'IE2002', 'GB3003'],
+        'Customer Type': ['Retail', 'Retail', 'Online'],
+        'Requestor': ['Bob', 'Ann', 'Bob'],
+        'Currency': ['GBP', 'EUR', 'GBP'],
+    })
+    expected = combined.merge(mapping, on='Customer Code', how='left')
+    result = join_customer_mapping_polars(combined.copy(), mapping)
+    pd.testing.assert_frame_equal(apply_schema(result), apply_schema(expected))
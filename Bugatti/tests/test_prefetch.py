@@ -0,0 +1,52 @@
+# Prefetch and publish: forms copied a few ahead to local scratch, outputs copied back atomically
+import os
+
+from etl.prefetch import Prefetcher
+from writers.excel_writer import publish_output
+
+def _share_files(share, names):
+    paths = []
+    for index, name in enumerate(names):
+        path = share / f"member{index}" / name
+        path.parent.mkdir(parents=True)
+        path.write_bytes(f"form {index}".encode())
+        paths.append(str(path))
+    return paths
+
+def test_forms_are_copied_ahead_and_released(tmp_path):
+    files = _share_files(tmp_path / "share", ["Argos.xlsx", "Argos.xlsx", "Currys.xlsx", "Harvey.xlsx"])
+    prefetcher = Prefetcher(files, str(tmp_path / "scratch"), depth=2)
+    try:
+        assert list(prefetcher.futures) == files[:2]
+
+        first, second = prefetcher.get(files[0]), prefetcher.get(files[1])
+        assert first != second and os.path.basename(first) == os.path.basename(second) == "Argos.xlsx"
+        assert open(second, 'rb').read() == b"form 1"
+        assert list(prefetcher.futures) == files
+
+        prefetcher.release(files[0])
+        assert not os.path.exists(first) and os.path.exists(files[0])
+    finally:
+        prefetcher.close()
+
+def test_form_that_cannot_be_copied_is_read_from_the_share(tmp_path):
+    missing = str(tmp_path / "share" / "gone.xlsx")
+    prefetcher = Prefetcher([missing], str(tmp_path / "scratch"), depth=1)
+    try:
+        assert prefetcher.get(missing) == missing
+        assert prefetcher.get("not scheduled.xlsx") == "not scheduled.xlsx"
+    finally:
+        prefetcher.close()
+
+def test_publish_replaces_the_output_without_leftovers(tmp_path):
+    local_file = tmp_path / "local" / "MassUpload.xlsx"
+    local_file.parent.mkdir()
+    local_file.write_bytes(b"new")
+    output_file = tmp_path / "share" / "Uploads" / "MassUpload.xlsx"
+    output_file.parent.mkdir(parents=True)
+    output_file.write_bytes(b"old")
+
+    assert publish_output(str(local_file), str(output_file))
+    assert output_file.read_bytes() == b"new"
+    assert os.listdir(output_file.parent) == ["MassUpload.xlsx"]
+    assert not publish_output(str(tmp_path / "local" / "missing.xlsx"), str(output_file))
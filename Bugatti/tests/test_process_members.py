@@ -0,0 +1,39 @@
+# Member runs end to end: what is published, members sharing a worker pool, and what a failed output leaves alone
+import os
+
+import main
+from conftest import pet_form_rows, write_pet_form
+from writers.excel_writer import MassUploadWriter
+
+RUN_OPTIONS = dict(supervised=False, prefetch=0, writer_processes=0)
+
+def _forms(paths, count=2):
+    return [write_pet_form(os.path.join(paths['pet_forms'], f"form_{i}.xlsx"), pet_form_rows(10, seed=i))
+            for i in range(count)]
+
+def test_member_with_an_output_not_written_is_not_published(member_paths, monkeypatch):
+    forms = _forms(member_paths)
+    assert main.process_members([(member_paths, forms)], **RUN_OPTIONS) == {'Tima'}
+    mass_upload_file = os.path.join(member_paths['uploads'], "MassUpload.xlsx")
+    published = os.path.getmtime(mass_upload_file)
+
+    def fail(writer):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(MassUploadWriter, "close", fail)
+    assert main.process_members([(member_paths, forms)], **RUN_OPTIONS) == set()
+    assert os.path.getmtime(mass_upload_file) == published
+
+def test_members_share_one_worker_pool_and_keep_their_own_outputs(member_paths):
+    import pandas as pd
+    from config.paths import get_paths, ensure_directories
+
+    other_paths = get_paths("Bob", member_paths['base_dir'])
+    ensure_directories(other_paths)
+    members = [(member_paths, _forms(member_paths, 2)), (other_paths, _forms(other_paths, 1))]
+
+    published = main.process_members(members, supervised=True, workers=2, prefetch=1, writer_processes=0)
+    assert published == {'Tima', 'Bob'}
+    for paths, forms in members:
+        combined = pd.read_excel(os.path.join(paths['member_dir'], "CombinedExtractedColumns.xlsx"))
+        assert set(combined['Source File']) == {os.path.basename(f) for f in forms}
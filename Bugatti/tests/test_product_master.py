@@ -0,0 +1,33 @@
+# Product master: trie suggestions match a brute-force edit distance, chunks get their suggestion column
+import random
+
+import pandas as pd
+
+from etl.product_master import ModelCodeIndex, check_model_codes
+
+def _levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, start=1):
+        row = [i]
+        for j, other in enumerate(b, start=1):
+            row.append(min(row[j - 1] + 1, previous[j] + 1, previous[j - 1] + (char != other)))
+        previous = row
+    return previous[-1]
+
+def test_suggestions_match_a_brute_force_search():
+    rng = random.Random(3)
+    codes = {"".join(rng.choice("ABC0123") for _ in range(rng.randint(3, 7))) for _ in range(400)}
+    index = ModelCodeIndex(codes)
+    for _ in range(50):
+        probe = "".join(rng.choice("ABC0123X") for _ in range(rng.randint(2, 8)))
+        expected = sorted((_levenshtein(probe, code), code) for code in codes if _levenshtein(probe, code) <= 2)
+        assert index.suggest(probe, limit=len(codes)) == expected
+
+def test_chunks_get_suggestions_for_unknown_models_only():
+    index = ModelCodeIndex(["OLED55C4.AEK", "OLED65C4.AEK", "SC9"])
+    chunk = pd.DataFrame({'Model Code': ["oled55c4.aek ", "OLED55C4.AEX", "GLT", "ZZZZZZ"],
+                          'Product Type': ['Model', 'Model', 'Division', 'Model']})
+    unknown = {}
+    [checked] = check_model_codes([chunk], index, unknown)
+    assert checked['Model Code Suggestion'].tolist() == ['', "OLED55C4.AEK, OLED65C4.AEK", '', 'NONE']
+    assert unknown == {"OLED55C4.AEX": "OLED55C4.AEK, OLED65C4.AEK", "ZZZZZZ": 'NONE'}
@@ -0,0 +1,33 @@
+# Rules file: compiled lookups, cache by content hash, rule changes without code changes
+import json
+
+from config.rules import BUNDLED_RULES_FILE, load_rules, ends_with_any
+
+def _rules_file(tmp_path, **changes):
+    with open(BUNDLED_RULES_FILE, encoding="utf-8") as f:
+        raw = json.load(f)
+    raw.update(changes)
+    path = tmp_path / "Rules.json"
+    path.write_text(json.dumps(raw), encoding="utf-8")
+    return path
+
+def test_compiled_lookups(tmp_path):
+    rules = load_rules(str(_rules_file(tmp_path)))
+
+    assert ends_with_any("OLED55C4.AEK", rules['tv_suffixes'])
+    assert not ends_with_any("AEK", rules['av_suffixes'])
+    assert rules['reason_by_variation']["CO-OP AD."] == ("TM_C01", "Lumpsum")
+    match = rules['division_prefix'].match("GS51234")
+    assert rules['division_by_group'][match.lastgroup] == "CNT"
+
+def test_compiled_rules_are_cached_by_content(tmp_path):
+    cache_dir = tmp_path / "cache"
+    path = _rules_file(tmp_path)
+    first = load_rules(str(path), str(cache_dir))
+    assert [p.name for p in cache_dir.iterdir()] == [f"rules_{first['hash']}.pkl"]
+    assert load_rules(str(path), str(cache_dir)) == first
+
+    path = _rules_file(tmp_path, version="2099.1", remove_words=["CIH", "EXRTIS", "DRAFT"])
+    changed = load_rules(str(path), str(cache_dir), current=first)
+    assert changed['version'] == "2099.1" and "DRAFT" in changed['remove_words']
+    assert changed['hash'] != first['hash'] and len(list(cache_dir.iterdir())) == 2
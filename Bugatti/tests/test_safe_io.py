@@ -0,0 +1,59 @@
+# Member lock shared by processes: one holder at a time, stale locks are taken over
+import os
+import sys
+import json
+import subprocess
+
+from utils.safe_io import FileLock, LockTimeout, retry_io
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Read-modify-write of a counter, which loses updates unless the lock serialises it
+WORKER_CODE = """
+import sys, time
+from utils.safe_io import FileLock
+lock_file, counter_file = sys.argv[1], sys.argv[2]
+for _ in range(10):
+    with FileLock(lock_file, timeout=60):
+        with open(counter_file) as f:
+            value = int(f.read())
+        time.sleep(0.005)
+        with open(counter_file, 'w') as f:
+            f.write(str(value + 1))
+"""
+
+def test_lock_serialises_processes(tmp_path):
+    lock_file, counter_file = tmp_path / "outputs.lock", tmp_path / "counter"
+    counter_file.write_text("0")
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER_CODE, str(lock_file), str(counter_file)],
+                                cwd=SCRIPTS_DIR, stdout=subprocess.DEVNULL) for _ in range(4)]
+    assert all(worker.wait() == 0 for worker in workers)
+    assert counter_file.read_text() == "40"
+    assert not lock_file.exists()
+
+def test_stale_lock_is_taken_over(tmp_path):
+    lock_file = tmp_path / "outputs.lock"
+    lock_file.write_text(json.dumps({'host': 'crashed', 'pid': 1}))
+
+    try:
+        FileLock(str(lock_file), timeout=0.2, stale_seconds=5).acquire()
+        assert False, "a live lock must not be taken"
+    except LockTimeout:
+        pass
+
+    lock = FileLock(str(lock_file), timeout=5, stale_seconds=0.3).acquire()
+    assert json.loads(lock_file.read_text())['pid'] == os.getpid()
+    lock.release()
+    assert not lock_file.exists()
+
+def test_retry_io_waits_for_a_locked_file():
+    attempts = []
+
+    def locked_twice():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise PermissionError("file is open in Excel")
+        return "done"
+
+    assert retry_io(locked_twice, "Test", delay=0.01) == "done"
+    assert len(attempts) == 3
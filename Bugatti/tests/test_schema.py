@@ -0,0 +1,37 @@
+# Compact dtypes: stage frames shrink and the writers get back exactly the original values
+import pandas as pd
+
+from etl.schema import apply_schema, to_output
+
+def _frame():
+    return pd.DataFrame({
+        'Customer Code': ['GB1001', 'IE2002', 'GB1001'],
+        'Expected Sell-Out': [2, 0, 17],
+        'Apply Month': ['202612', 'NA', '202701'],
+        'Additional SOA': [47.26, 9.21, 0.1],
+        'Is WBW': ['YES', 'NO', 'NO'],
+        'Notes': ['a', None, 'c'],
+    })
+
+def test_compact_frame_round_trips_to_the_output_values():
+    compact = apply_schema(_frame())
+    assert isinstance(compact['Customer Code'].dtype, pd.CategoricalDtype)
+    assert compact['Expected Sell-Out'].dtype == 'Int32' and compact['Apply Month'].dtype == 'Int32'
+    assert compact['Additional SOA'].dtype == 'float32' and compact['Is WBW'].dtype == bool
+
+    out = to_output(compact)
+    assert out['Customer Code'].tolist() == ['GB1001', 'IE2002', 'GB1001']
+    assert out['Expected Sell-Out'].tolist() == [2, 0, 17]
+    assert out['Apply Month'].tolist() == ['202612', 'NA', '202701']
+    assert out['Additional SOA'].tolist() == [47.26, 9.21, 0.1]
+    assert out['Is WBW'].tolist() == ['YES', 'NO', 'NO']
+    assert out['Notes'].tolist() == ['a', None, 'c']
+
+def test_values_that_do_not_fit_keep_their_column():
+    df = _frame()
+    df['Expected Sell-Out'] = [2, 'many', 17]
+    df['Additional SOA'] = [123456789.12, 9.21, 0.1]
+    compact = apply_schema(df)
+    assert compact['Expected Sell-Out'].tolist() == [2, 'many', 17]
+    assert compact['Additional SOA'].dtype == 'float64'
+    assert to_output(compact)['Additional SOA'].tolist() == [123456789.12, 9.21, 0.1]
@@ -0,0 +1,53 @@
+# Check service: /check over a small form, and a worker over the time budget is replaced
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from conftest import pet_form_rows, write_pet_form
+from service import CheckService, CheckRequestHandler
+
+@pytest.fixture
+def service(member_paths):
+    service = CheckService(member_paths['base_dir'], workers=1)
+    yield service
+    service.close()
+
+def test_check_returns_the_rows_and_mass_upload_of_a_form(service, tmp_path):
+    form = write_pet_form(tmp_path / "Argos Xmas.xlsx", pet_form_rows(6))
+    CheckRequestHandler.service = service
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CheckRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with open(form, 'rb') as f:
+            request = urllib.request.Request(
+                f"http://127.0.0.1:{server.server_port}/check?name=Argos%20Xmas.xlsx", data=f.read(), method='POST')
+        with urllib.request.urlopen(request, timeout=60) as response:
+            payload = json.load(response)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    [checked] = payload['forms']
+    assert checked['status'] == 'ok'
+    assert checked['file'] == "Argos Xmas.xlsx"
+    assert checked['rows'] == len(checked['enriched_rows']) == len(checked['mass_upload'])
+    assert checked['rows'] >= 6
+    assert {row['Source File'] for row in checked['enriched_rows']} == {"Argos Xmas.xlsx"}
+
+def test_worker_over_the_time_budget_is_replaced(service, tmp_path):
+    form = write_pet_form(tmp_path / "slow.xlsx", pet_form_rows(6))
+    with open(form, 'rb') as f:
+        content = f.read()
+
+    service.time_budget = 0.001
+    [timed_out] = service.check([("slow.xlsx", content)])
+    assert timed_out['status'] == 'error'
+    assert service.replaced == 1
+
+    # The only worker was killed; its replacement checks the next form
+    service.time_budget = 60
+    [checked] = service.check([("slow.xlsx", content)])
+    assert checked['status'] == 'ok'
@@ -0,0 +1,41 @@
+# Shadow mode: the diff aligns rows on their key, and both engines agree on a whole form
+import pandas as pd
+
+from conftest import write_customer_mapping
+from etl.loader import load_customer_mapping, load_and_clean_excel
+from etl.shadow import ShadowRecorder, diff_frames
+from etl.stages import ENGINES
+
+def _rows():
+    return pd.DataFrame({'Source File': ['a.xlsx'] * 3, 'Original Row Index': [0, 0, 1],
+                         'Apply Month': [202612, 202701, 202612], 'Expected Sell-Out': [2, 3, 5]})
+
+def test_diff_aligns_rows_on_their_key():
+    legacy = _rows()
+    assert diff_frames(legacy, legacy.iloc[::-1].reset_index(drop=True)) == []
+
+    changed = legacy.copy()
+    changed.loc[1, 'Expected Sell-Out'] = 4
+    [mismatch] = diff_frames(legacy, changed)
+    assert (mismatch['Column'], mismatch['Apply Month'], mismatch['Legacy Value'], mismatch['Optimized Value']) \
+        == ('Expected Sell-Out', 202701, 3, 4)
+
+    [missing] = diff_frames(legacy, legacy.iloc[:2])
+    assert (missing['Column'], missing['Optimized Value']) == ('<row>', 'missing')
+
+def test_engines_agree_on_a_form(make_pet_form, tmp_path):
+    form = make_pet_form("form.xlsx", rows=30)
+    mapping = load_customer_mapping(write_customer_mapping(tmp_path / "CustomerMapping.xlsx"))
+    recorder = ShadowRecorder(ENGINES['legacy'], ENGINES['optimized'])
+
+    df = recorder.run('extract', "form.xlsx", load_and_clean_excel(form), form)
+    for stage in ['group', 'expand']:
+        df = recorder.run(stage, "form.xlsx", df)
+    expanded_rows = len(df)
+    df = recorder.run('name', 'ALL', recorder.run('enrich', 'ALL', df, mapping))
+
+    assert len(df) == expanded_rows > 30
+    assert recorder.mismatches == []
+    timings = recorder.timings_df()
+    assert set(timings['Stage']) == set(ENGINES['legacy'])
+    assert (timings['Mismatches'] == 0).all()
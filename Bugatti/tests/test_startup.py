@@ -0,0 +1,42 @@
+# Startup-time benchmark: a run with nothing to do must stay well under a second
+import os
+import sys
+import time
+import subprocess
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['pandas', 'openpyxl', 'dateutil', 'rapidfuzz', 'fuzzywuzzy']
+NOOP_BUDGET_SECONDS = 1.0
+
+def _run(code_or_args, base_dir):
+    env = dict(os.environ, SPMS_BASE_DIR=str(base_dir))
+    return subprocess.run([sys.executable] + code_or_args, cwd=SCRIPTS_DIR, env=env,
+                          capture_output=True, text=True)
+
+def test_noop_run_is_fast(tmp_path):
+    _run([os.path.join(SCRIPTS_DIR, 'main.py'), 'Tester'], tmp_path)  # warm the bytecode cache
+
+    start = time.perf_counter()
+    result = _run([os.path.join(SCRIPTS_DIR, 'main.py'), 'Tester'], tmp_path)
+    elapsed = time.perf_counter() - start
+
+    assert result.returncode == 0, result.stderr
+    assert 'No Excel files found' in result.stdout
+    assert elapsed < NOOP_BUDGET_SECONDS, f"No-op run took {elapsed:.2f}s"
+
+def test_noop_run_skips_heavy_imports(tmp_path):
+    code = (
+        "import sys, main; main.main(['Tester']); "
+        f"print('HEAVY=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = _run(['-c', code], tmp_path)
+
+    assert result.returncode == 0, result.stderr
+    assert 'HEAVY=\n' in result.stdout
+
+def test_importing_paths_creates_nothing(tmp_path):
+    code = "import config.paths as p; p.get_paths('Tester'); print(p.PATHS['member_dir'])"
+    result = _run(['-c', code], tmp_path)
+
+    assert result.returncode == 0, result.stderr
+    assert os.listdir(tmp_path) == []
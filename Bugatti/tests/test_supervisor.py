@@ -0,0 +1,56 @@
+# Supervised workers: files over a budget are quarantined (counting the time a file runs, not the
+# time its result waits, and the memory it adds to a warm worker), files of crashed workers stay in place
+import os
+import time
+import threading
+import multiprocessing
+
+from etl.supervisor import run_supervised
+
+def test_result_waiting_on_a_busy_caller_is_not_quarantined(tmp_path, make_pet_form):
+    files = [make_pet_form("small.xlsx", rows=5), make_pet_form("large.xlsx", rows=300, seed=2)]
+    statuses = {}
+    for outcome in run_supervised(files, str(tmp_path / "Quarantine"), time_budget=5, memory_budget=None,
+                                  max_workers=2):
+        statuses[os.path.basename(outcome['file_path'])] = outcome['status']
+        if len(statuses) == 1:
+            time.sleep(6)  # the caller writes the first file for longer than the budget
+    assert statuses == {'small.xlsx': 'ok', 'large.xlsx': 'ok'}
+    assert all(os.path.exists(f) for f in files)
+
+def test_file_over_the_time_budget_is_quarantined(tmp_path, make_pet_form):
+    quarantine_dir = tmp_path / "Quarantine"
+    slow, fast = make_pet_form("slow.xlsx", rows=300), make_pet_form("fast.xlsx", rows=5)
+    outcomes = {os.path.basename(o['file_path']): o
+                for o in run_supervised([slow, fast], {slow: str(quarantine_dir), fast: str(quarantine_dir)},
+                                        time_budget=0.01, memory_budget=None)}
+    assert outcomes['slow.xlsx']['status'] == 'quarantined'
+    assert 'time budget' in outcomes['slow.xlsx']['note']['Reason']
+    assert not os.path.exists(slow) and (quarantine_dir / "slow.xlsx").exists()
+    assert "Stage reached" in (quarantine_dir / "slow.txt").read_text()
+
+def test_crashed_worker_leaves_the_form_in_place(tmp_path, make_pet_form):
+    form = make_pet_form("form.xlsx", rows=2000)
+
+    def kill_worker():
+        # Kill the worker as soon as it exists, long before the form is done
+        while not multiprocessing.active_children():
+            time.sleep(0.01)
+        for child in multiprocessing.active_children():
+            child.kill()
+
+    killer = threading.Thread(target=kill_worker)
+    killer.start()
+    outcomes = list(run_supervised([form], str(tmp_path / "Quarantine"), time_budget=None, memory_budget=None))
+    killer.join()
+    assert [o['status'] for o in outcomes] == ['error']
+    assert 'exited unexpectedly' in outcomes[0]['note']
+    assert os.path.exists(form) and not (tmp_path / "Quarantine").exists()
+
+def test_memory_budget_counts_growth_during_the_file(tmp_path, make_pet_form):
+    # One warm worker holds well over 60 MB after the imports and the large form;
+    # only what each form adds is charged to it
+    files = [make_pet_form("large.xlsx", rows=1000), make_pet_form("small.xlsx", rows=5, seed=2)]
+    statuses = [o['status'] for o in run_supervised(files, str(tmp_path / "Quarantine"), time_budget=None,
+                                                    memory_budget=60, max_workers=1)]
+    assert statuses == ['ok', 'ok']
@@ -0,0 +1,37 @@
+# Watch mode: forms are ready once settled and complete, and a restarted watcher skips processed forms
+import os
+
+from etl.watch import FolderWatcher
+
+def test_form_is_ready_once_settled_and_complete(make_pet_form, tmp_path):
+    form = make_pet_form("Argos.xlsx")
+    folder = os.path.dirname(form)
+    partial = os.path.join(folder, "Currys.xlsx")
+    with open(form, 'rb') as source, open(partial, 'wb') as target:
+        target.write(source.read()[:2000])  # Still being copied
+    lock_file = os.path.join(folder, "~$Argos.xlsx")
+    open(lock_file, 'wb').close()
+
+    watcher = FolderWatcher(str(tmp_path), settle_seconds=5)
+    files = [form, partial, lock_file]
+    assert watcher.poll(folder, files, now=0) == ([], False)
+    assert watcher.poll(folder, files, now=4) == ([], False)
+    assert watcher.poll(folder, files, now=5) == ([form], True)
+
+    # A form saved again must settle again
+    make_pet_form("Argos.xlsx", rows=40)
+    assert watcher.poll(folder, files, now=6) == ([], False)
+    assert watcher.poll(folder, files, now=11) == ([form], True)
+
+def test_restarted_watcher_skips_processed_forms(make_pet_form, tmp_path):
+    first, second = make_pet_form("Argos.xlsx"), make_pet_form("Currys.xlsx", seed=2)
+    folder = os.path.dirname(first)
+    watcher = FolderWatcher(str(tmp_path), settle_seconds=1)
+    watcher.poll(folder, [first, second], now=0)
+    assert watcher.poll(folder, [first, second], now=1) == ([first, second], True)
+    watcher.mark_processed(folder, [first, second])
+
+    restarted = FolderWatcher(str(tmp_path), settle_seconds=1)
+    assert restarted.poll(folder, [first, second], now=0) == ([first, second], False)
+    os.remove(second)
+    assert restarted.poll(folder, [first], now=1) == ([first], True)
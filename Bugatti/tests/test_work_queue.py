@@ -0,0 +1,92 @@
+# Shared work queue: concurrent workers claim every task exactly once, stale claims come back,
+# budgets apply to queued forms and workers pick up a changed customer mapping
+import os
+import sys
+import time
+import subprocess
+from collections import Counter
+
+import pandas as pd
+
+from conftest import pet_form_rows, write_pet_form
+from etl import work_queue
+from etl.work_queue import WorkQueue, TaskWorker
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_CODE = """
+import sys, time
+from etl.work_queue import WorkQueue
+queue = WorkQueue(sys.argv[1], lease_seconds=30)
+while True:
+    task = queue.claim()
+    if task is None:
+        break
+    print(task['task_id'], flush=True)
+    queue.run(task, lambda task: (time.sleep(0.01), {'result': None})[1])
+"""
+
+def _task(name):
+    return {'task_id': name, 'file_path': f"{name}.xlsx"}
+
+def test_concurrent_workers_claim_each_task_once(tmp_path):
+    queue = WorkQueue(str(tmp_path), lease_seconds=30, worker_id='coordinator')
+    names = [f"task{i:03d}" for i in range(40)]
+    for name in names:
+        queue.enqueue(_task(name))
+
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER_CODE, str(tmp_path)], cwd=SCRIPTS_DIR,
+                                stdout=subprocess.PIPE, text=True) for _ in range(4)]
+    claimed = Counter(line.strip() for worker in workers for line in worker.communicate()[0].splitlines())
+
+    assert all(worker.returncode == 0 for worker in workers)
+    assert claimed == Counter(names)
+    assert os.listdir(tmp_path / 'pending') == [] and os.listdir(tmp_path / 'claimed') == []
+    assert all(queue.result(name)[0] == 'ok' for name in names)
+
+def test_stale_claim_is_put_back(tmp_path):
+    crashed = WorkQueue(str(tmp_path), lease_seconds=0.2, worker_id='crashed')
+    crashed.enqueue(_task('form'))
+    assert crashed.claim()['task_id'] == 'form'
+
+    other = WorkQueue(str(tmp_path), lease_seconds=0.2, worker_id='other')
+    assert other.claim() is None
+    assert other.expire_stale() == 0  # First sight of the claim starts its lease
+    time.sleep(0.3)
+    assert other.expire_stale() == 1
+    assert other.claim()['task_id'] == 'form'
+
+def _form_task(paths, name, **budgets):
+    file_path = write_pet_form(os.path.join(paths['pet_forms'], name), pet_form_rows(10))
+    return dict({'task_id': name, 'file_path': file_path, 'engine': 'optimized', 'base_dir': paths['base_dir'],
+                 'quarantine_dir': paths['quarantine']}, **budgets)
+
+def test_form_over_the_time_budget_is_quarantined(member_paths, tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue"), lease_seconds=30)
+    worker = TaskWorker()
+    try:
+        queue.enqueue(_form_task(member_paths, "slow.xlsx", time_budget=0.01))
+        queue.enqueue(_form_task(member_paths, "fine.xlsx", time_budget=120))
+        queue.run(queue.claim(), worker)
+        queue.run(queue.claim(), worker)
+    finally:
+        worker.close()
+
+    status, note = queue.result("slow.xlsx")
+    assert status == 'quarantined' and "time budget" in note
+    assert sorted(os.listdir(member_paths['quarantine'])) == ["slow.txt", "slow.xlsx"]
+    status, payload = queue.result("fine.xlsx")
+    assert status == 'ok' and len(payload['result']) >= 10
+
+def test_changed_customer_mapping_is_reloaded(member_paths):
+    task = _form_task(member_paths, "form.xlsx")
+    mapping_file = os.path.join(member_paths['base_dir'], "CustomerMapping.xlsx")
+    work_queue.process_task(task)
+    assert set(work_queue._mapping_cache[mapping_file][1]['Requestor']) == {'Bob'}
+
+    mapping = pd.read_excel(mapping_file)
+    mapping['Requestor'] = 'Alice'
+    mapping.to_excel(mapping_file, index=False)
+    os.utime(mapping_file, (time.time() + 5, time.time() + 5))
+    work_queue.process_task(task)
+    assert set(work_queue._mapping_cache[mapping_file][1]['Requestor']) == {'Alice'}
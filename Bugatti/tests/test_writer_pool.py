@@ -0,0 +1,55 @@
+# Writer processes: an output written from the sealed spool in another process is the same file,
+# and a failed write is raised from the writer process
+import pandas as pd
+import pytest
+
+from writers.excel_writer import CombinedWriter, MassUploadWriter
+from writers.writer_pool import WriterPool
+
+def _chunk(start):
+    return pd.DataFrame({
+        'PromotionName': [f"PROMO {i}" for i in range(start, start + 3)],
+        'Customer Code': ['GB1001', 'NA', 'IE2002'],
+        'Model Code': ['OLED55C4', 'SC9', 'GLT'],
+        'Start Date': ['20261201'] * 3,
+        'End Date': ['20270115'] * 3,
+        'Additional SOA': [1.5, 2.25, 3.0],
+    })
+
+def _write(writer_class, path, pool=None):
+    writer = writer_class(str(path))
+    writer.append(_chunk(3), order=1)
+    writer.append(_chunk(0), order=0)
+    if pool is None:
+        writer.close()
+    else:
+        return pool.submit(writer)
+
+def test_outputs_written_in_writer_processes(tmp_path):
+    pool = WriterPool(processes=2)
+    try:
+        futures = [_write(writer_class, tmp_path / f"pool_{writer_class.__name__}.xlsx", pool)
+                   for writer_class in (CombinedWriter, MassUploadWriter)]
+        assert all(future.result(timeout=120) >= 0 for future in futures)
+    finally:
+        pool.close()
+
+    for writer_class in (CombinedWriter, MassUploadWriter):
+        _write(writer_class, tmp_path / f"local_{writer_class.__name__}.xlsx")
+        written = pd.read_excel(tmp_path / f"pool_{writer_class.__name__}.xlsx", header=None)
+        assert written.equals(pd.read_excel(tmp_path / f"local_{writer_class.__name__}.xlsx", header=None))
+        assert len(written) == 7
+    assert not list(tmp_path.glob("*.spool"))
+
+def test_failed_write_is_raised_from_the_writer_process(tmp_path):
+    # A folder in the way of the workbook makes the save fail in the child
+    output_file = tmp_path / "CombinedExtractedColumns.xlsx"
+    output_file.mkdir()
+    pool = WriterPool(processes=1)
+    try:
+        future = _write(CombinedWriter, output_file, pool)
+        with pytest.raises(OSError):
+            future.result(timeout=120)
+    finally:
+        pool.close()
+    assert not list(tmp_path.glob("*.spool"))
@@ -45,6 +45,17 @@ def find_header_row(df, expected_keywords, max_rows_to_check=13):
     
     return best_index if best_score > 0 else None
 
+def _variation_index(column_mapping_df):
+    """Cleaned variation -> standard column (built once and kept on the mapping DataFrame)."""
+    index = column_mapping_df.attrs.get('variation_index')
+    if index is None:
+        index = {}
+        for std_col, variations in zip(column_mapping_df['Standard Column'], column_mapping_df['Possible Variations']):
+            for variation in variations:
+                index.setdefault(variation, std_col)
+        column_mapping_df.attrs['variation_index'] = index
+    return index
+
 def get_single_fuzzy_match(test_value, column_mapping_df, threshold=85):
     """
     Check if a value matches any of the expected column variations.
@@ -62,15 +73,11 @@ def get_single_fuzzy_match(test_value, column_mapping_df, threshold=85):
         
     test_value_cleaned = clean_column_name(test_value)
 
-    for variations in column_mapping_df['Possible Variations']:
-        if test_value_cleaned in variations:
-            return True
-
-    all_possible_names = []
-    for variations in column_mapping_df['Possible Variations']:
-        all_possible_names.extend(variations)
+    variation_index = _variation_index(column_mapping_df)
+    if test_value_cleaned in variation_index:
+        return True
 
-    result = process.extractOne(test_value_cleaned, all_possible_names)
+    result = process.extractOne(test_value_cleaned, list(variation_index))
     if result:
         if isinstance(result, tuple):
             # Handle different return formats from different libraries
@@ -0,0 +1,44 @@
+# Run report: wall time of a run and the time spent waiting on I/O
+import time
+from contextlib import contextmanager
+
+class RunReport:
+    """Accumulates named timings (seconds and counts) for one run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = {}
+        self.counts = {}
+        self.stamps = {}
+
+    def add(self, name, seconds, count=1):
+        """Add a duration to a named timing."""
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def stamp(self, name, value):
+        """Record a version stamp (e.g. of the rules) shown with the timings."""
+        self.stamps[name] = value
+
+    @contextmanager
+    def measure(self, name):
+        """Time the enclosed block under the given name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def elapsed(self):
+        """Seconds since the report was created."""
+        return time.perf_counter() - self.started
+
+    def print_summary(self):
+        """Print the wall time and every named timing."""
+        total = self.elapsed()
+        print(f"Run report: {total:.2f}s total")
+        for name, value in self.stamps.items():
+            print(f"  {name:<28} {value}")
+        for name, seconds in self.seconds.items():
+            share = 100 * seconds / total if total > 0 else 0.0
+            print(f"  {name:<28} {seconds:>8.2f}s ({share:.1f}%) over {self.counts[name]} item(s)")
@@ -0,0 +1,253 @@
+# Safe file access for runs proceeding in parallel
+#
+# Several people (or a watcher, queue workers and a manual run) may work on the
+# J: share at the same time. Outputs are written to temporary files and renamed
+# into place, a file held open by Excel is retried with a growing delay, each
+# member's outputs are guarded by a lock file, and CustomerMapping.xlsx is read
+# from a local snapshot so a colleague saving it mid-run cannot change it under us.
+#
+# Locks are plain files created with O_CREAT | O_EXCL, which works from every
+# machine that can see the share (OS byte-range locks are not reliable on SMB).
+# The holder touches its lock while it works; a lock whose modification time has
+# not moved for the stale time is taken over by whoever notices, judged by the
+# observer's own clock like the leases of the work queue.
+import os
+import json
+import time
+import shutil
+import socket
+import hashlib
+import threading
+from datetime import datetime
+
+from config.constants import (
+    MEMBER_LOCK_TIMEOUT_SECONDS, MEMBER_LOCK_STALE_SECONDS,
+    IO_RETRY_ATTEMPTS, IO_RETRY_DELAY_SECONDS, IO_RETRY_MAX_DELAY_SECONDS
+)
+
+# Snapshots of another version of a file are removed once they are this old
+SNAPSHOT_KEEP_SECONDS = 3600
+
+def retry_io(action, description, attempts=IO_RETRY_ATTEMPTS, delay=IO_RETRY_DELAY_SECONDS,
+             max_delay=IO_RETRY_MAX_DELAY_SECONDS):
+    """
+    Run a file operation, retrying with a doubling delay while the file is locked.
+
+    Args:
+        action: Function taking no arguments
+        description: What is being done, for the retry messages
+        attempts: Number of attempts before the error is raised
+        delay: Seconds before the second attempt
+        max_delay: Longest delay between two attempts
+
+    Returns:
+        Result of the action
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return action()
+        except FileNotFoundError:
+            raise
+        except OSError as e:
+            # PermissionError on Windows when the target is open in Excel
+            if attempt == attempts:
+                raise
+            print(f"⏳ {description} failed ({e}); retrying in {delay:g}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+def replace_file(source, target):
+    """Rename a file over its target atomically, retrying while the target is locked."""
+    retry_io(lambda: os.replace(source, target), f"Replacing {os.path.basename(target)}")
+
+def remove_file(path):
+    """Remove a file if it exists, retrying while it is locked."""
+    try:
+        retry_io(lambda: os.remove(path), f"Removing {os.path.basename(path)}")
+        return True
+    except FileNotFoundError:
+        return False
+
+def _temp_name(path):
+    return f"{path}.{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}.tmp"
+
+def snapshot_file(source, snapshot_dir):
+    """
+    Local read-only copy of a shared file, taken while the file is not changing.
+
+    Snapshots are named after the size and modification time of the source, so
+    runs on the same machine share one snapshot per version of the file and a
+    snapshot never changes once it exists.
+
+    Args:
+        source: Shared file (e.g. CustomerMapping.xlsx)
+        snapshot_dir: Local directory holding the snapshots
+
+    Returns:
+        Path of the snapshot, or the source itself if it does not exist or
+        cannot be copied
+    """
+    def take():
+        before = os.stat(source)
+        stamp = hashlib.sha1(f"{source}\n{before.st_size}\n{before.st_mtime_ns}".encode()).hexdigest()[:12]
+        name, extension = os.path.splitext(os.path.basename(source))
+        snapshot = os.path.join(snapshot_dir, f"{name}.{stamp}{extension}")
+        if os.path.exists(snapshot):
+            return snapshot
+        temp_file = _temp_name(snapshot)
+        try:
+            shutil.copyfile(source, temp_file)
+            after = os.stat(source)
+            if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+                raise OSError(f"{os.path.basename(source)} changed while it was copied")
+            os.replace(temp_file, snapshot)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        _prune_snapshots(snapshot_dir, name, extension, keep=snapshot)
+        return snapshot
+
+    if not os.path.exists(source):
+        return source
+    os.makedirs(snapshot_dir, exist_ok=True)
+    try:
+        return retry_io(take, f"Snapshot of {os.path.basename(source)}")
+    except OSError as e:
+        print(f"⚠️ Could not snapshot {os.path.basename(source)} ({e}); reading the shared file")
+        return source
+
+def _prune_snapshots(snapshot_dir, name, extension, keep):
+    """Remove old snapshots of earlier versions of a file (other runs may still read recent ones)."""
+    now = time.time()
+    for entry in os.scandir(snapshot_dir):
+        if entry.path == keep or not (entry.name.startswith(f"{name}.") and entry.name.endswith(extension)):
+            continue
+        try:
+            if now - entry.stat().st_mtime > SNAPSHOT_KEEP_SECONDS:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+class LockTimeout(Exception):
+    """Another run kept the lock for longer than the timeout."""
+
+class FileLock:
+    """Lock file shared by processes on any machine that can see its folder."""
+
+    def __init__(self, path, timeout=MEMBER_LOCK_TIMEOUT_SECONDS, stale_seconds=MEMBER_LOCK_STALE_SECONDS):
+        """
+        Args:
+            path: Lock file
+            timeout: Seconds to wait for the lock (None waits forever)
+            stale_seconds: Seconds a lock may go untouched before it is taken over
+        """
+        self.path = path
+        self.timeout = timeout
+        self.stale_seconds = stale_seconds
+        self.owner = {'host': socket.gethostname(), 'pid': os.getpid()}
+        self.done = None
+        self.heartbeat = None
+
+    def _holder(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _try_create(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding="utf-8") as f:
+            json.dump(dict(self.owner, acquired=datetime.now().isoformat(timespec='seconds')), f)
+        return True
+
+    def _break_stale(self, holder):
+        """Take a stale lock away (the rename makes sure only one waiter does)."""
+        stale_file = _temp_name(self.path)
+        try:
+            os.rename(self.path, stale_file)
+        except OSError:
+            return
+        # Another waiter may have broken it and locked again in the meantime
+        with open(stale_file, encoding="utf-8") as f:
+            try:
+                moved = json.load(f)
+            except ValueError:
+                moved = {}
+        if moved != holder:
+            if os.path.exists(self.path):
+                os.remove(stale_file)
+            else:
+                os.rename(stale_file, self.path)
+            return
+        os.remove(stale_file)
+        print(f"🔓 Lock of {holder.get('host')} (pid {holder.get('pid')}) untouched for "
+              f"{self.stale_seconds}s; taking it over")
+
+    def acquire(self):
+        """
+        Wait for the lock.
+
+        Raises:
+            LockTimeout: If another run holds it for longer than the timeout
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        start = time.monotonic()
+        seen = None
+        delay = IO_RETRY_DELAY_SECONDS
+        while not self._try_create():
+            now = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue  # Released meanwhile
+            holder = self._holder()
+            if seen is None or seen[0] != mtime:
+                if seen is None:
+                    print(f"⏳ {os.path.dirname(self.path)} is in use by {holder.get('host')} "
+                          f"(pid {holder.get('pid')}); waiting")
+                seen = (mtime, now)
+            elif now - seen[1] >= self.stale_seconds:
+                self._break_stale(holder)
+                seen = None
+                continue
+            if self.timeout is not None and now - start >= self.timeout:
+                raise LockTimeout(f"{self.path} held by {holder.get('host')} (pid {holder.get('pid')})")
+            time.sleep(delay)
+            delay = min(delay * 2, IO_RETRY_MAX_DELAY_SECONDS)
+
+        self.done = threading.Event()
+        self.heartbeat = threading.Thread(target=self._keep_alive, args=(self.done,), daemon=True)
+        self.heartbeat.start()
+        return self
+
+    def _keep_alive(self, done):
+        while not done.wait(self.stale_seconds / 3):
+            try:
+                os.utime(self.path)
+            except OSError:
+                return
+
+    def release(self):
+        """Release the lock (does nothing if it is not held)."""
+        if self.done is None:
+            return
+        self.done.set()
+        self.heartbeat.join()
+        self.done = self.heartbeat = None
+        holder = self._holder()
+        # A lock taken over after a long pause belongs to someone else now
+        if all(holder.get(key) == value for key, value in self.owner.items()):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
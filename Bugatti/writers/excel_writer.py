@@ -1,24 +1,86 @@
 # Functions for saving Excel files and formatting
 import os
+import re
+import copy
+import pickle
+import shutil
+import socket
+import zipfile
+import tempfile
+import posixpath
+import xml.etree.ElementTree as ET
 import pandas as pd
 import openpyxl
-from openpyxl.styles import PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
 from openpyxl.utils import get_column_letter
 
+from etl.schema import to_output
+
 # Define yellow highlight style for error cells
 yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
 
+# Header style pandas uses in to_excel (kept so streamed files look the same)
+_thin = Side(style="thin")
+header_font = Font(bold=True)
+header_border = Border(left=_thin, right=_thin, top=_thin, bottom=_thin)
+header_alignment = Alignment(horizontal="center", vertical="top")
+
+def reset_outputs(combined_file, mass_upload_file):
+    """
+    Clean the previous run's outputs: remove the combined file and keep only the
+    header row of the MassUpload template.
+    
+    The cleaned MassUpload is saved under a temporary name and renamed over the
+    old one, so other readers never see a half-written workbook.
+    
+    Args:
+        combined_file: Path to CombinedExtractedColumns.xlsx
+        mass_upload_file: Path to MassUpload.xlsx
+    """
+    from utils.safe_io import remove_file, replace_file
+    
+    # 1. Remove CombinedExtractedColumns file completely
+    try:
+        if remove_file(combined_file):
+            print("Removed old CombinedExtractedColumns.xlsx")
+    except OSError as e:
+        print(f"Could not remove CombinedExtractedColumns.xlsx: {e}")
+
+    # 2. Clean all MassUpload content except header row
+    if os.path.exists(mass_upload_file):
+        temp_file = f"{mass_upload_file}.{socket.gethostname()}-{os.getpid()}.tmp"
+        try:
+            wb = openpyxl.load_workbook(mass_upload_file)
+            ws = wb.active
+            ws.delete_rows(2, ws.max_row)  # remove everything below the first row
+            for row in ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=ws.max_column):
+                for cell in row:
+                    cell.fill = PatternFill()  # clear fill color
+            wb.save(temp_file)
+            replace_file(temp_file, mass_upload_file)
+            print("Cleaned MassUpload.xlsx (kept only header row)")
+        except Exception as e:
+            print(f"Could not clean MassUpload.xlsx: {e}")
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
 def save_with_highlighting(df, output_file, highlight_na=True):
     """
     Save DataFrame to Excel and highlight cells containing 'NA' values.
     
+    Whole-frame writer of the original pipeline, no longer called by the run: it
+    is kept as the reference CombinedWriter is tested against (tests/test_excel_writer.py).
+    
     Args:
         df: DataFrame to save
         output_file: Output file path
         highlight_na: Whether to highlight NA values
     """
     try:
-        # First save the DataFrame
+        # First save the DataFrame (compact dtypes back to their output values)
+        df = to_output(df)
         df.to_excel(output_file, index=False, engine="openpyxl")
         print(f"File saved to: {output_file}")
         
@@ -41,10 +103,60 @@ def save_with_highlighting(df, output_file, highlight_na=True):
     except Exception as e:
         print(f"Failed to save file: {e}")
 
+def has_na_value(values):
+    """Check whether any value of a row starts with 'NA' (case-insensitive)."""
+    return any(str(value).strip().upper().startswith("NA") for value in values)
+
+# MassUpload column holding the apply month formula (E)
+FORMULA_COLUMN = 5
+
+def mass_upload_formula(excel_row):
+    """Formula giving the month three months after the end date of a MassUpload row."""
+    return f'=TEXT(DATE(LEFT(D{excel_row},4),MID(D{excel_row},5,2)+3,1),"YYYYMM")'
+
+def mass_upload_row(row, excel_row):
+    """
+    Build the MassUpload values (columns A to U) for one combined row.
+    
+    Args:
+        row: Combined row (Series or dictionary)
+        excel_row: Worksheet row number the values are written to
+        
+    Returns:
+        List of 21 cell values (None for empty cells)
+    """
+    promotion_name = row["PromotionName"]
+    return [
+        promotion_name,
+        row.get("Requestor", "NA"),
+        row.get("Start Date", "NA"),
+        row.get("End Date", "NA"),
+        mass_upload_formula(excel_row),
+        row.get("Currency", "NA"),
+        "SAL",
+        promotion_name,
+        row.get("Mapped Sales PGM Reason Code", "NA"),
+        "LUMPSUM",
+        row.get("Customer Type", "NA"),
+        row.get("Customer Code", "NA"),
+        row.get("Product Type", "NA"),
+        row.get("Model Code", "NA"),
+        None,
+        "AMT",
+        row.get("Additional SOA", "NA"),
+        row.get("Expected Sell-Out", "NA"),
+        row.get("Expected Cost", "NA"),
+        row.get("Apply Month", "NA"),
+        promotion_name,
+    ]
+
 def create_mass_upload(combined_df, output_file):
     """
     Create a Mass Upload Excel file based on the combined data.
     
+    Whole-frame writer of the original pipeline, no longer called by the run: it
+    is kept as the reference MassUploadWriter is tested against (tests/test_excel_writer.py).
+    
     Args:
         combined_df: DataFrame with combined data
         output_file: Output file path
@@ -58,40 +170,21 @@ def create_mass_upload(combined_df, output_file):
             wb = openpyxl.Workbook()
             
         ws = wb.active
+        combined_df = to_output(combined_df)
         
         # Iterate through the DataFrame and populate the Excel file
         for idx, row in combined_df.iterrows():
             excel_row = idx + 2  # Start at row 2 (after headers)
             
-            # Set values for each column
-            ws[f"A{excel_row}"] = row["PromotionName"]
-            ws[f"B{excel_row}"] = row.get("Requestor", "NA")
-            ws[f"C{excel_row}"] = row.get("Start Date", "NA")
-            ws[f"D{excel_row}"] = row.get("End Date", "NA")
-            ws[f"E{excel_row}"] = f'=TEXT(DATE(LEFT(D{excel_row},4),MID(D{excel_row},5,2)+3,1),"YYYYMM")'
-            ws[f"F{excel_row}"] = row.get("Currency", "NA")
-            ws[f"G{excel_row}"] = "SAL"
-            ws[f"H{excel_row}"] = ws[f"A{excel_row}"].value
-            ws[f"I{excel_row}"] = row.get("Mapped Sales PGM Reason Code", "NA")
-            ws[f"J{excel_row}"] = "LUMPSUM"
-            ws[f"K{excel_row}"] = row.get("Customer Type", "NA")
-            ws[f"L{excel_row}"] = row.get("Customer Code", "NA")
-            ws[f"M{excel_row}"] = row.get("Product Type", "NA")
-            ws[f"N{excel_row}"] = row.get("Model Code", "NA")
-            ws[f"P{excel_row}"] = "AMT"
-            ws[f"Q{excel_row}"] = row.get("Additional SOA", "NA")
-            ws[f"R{excel_row}"] = row.get("Expected Sell-Out", "NA")
-            ws[f"S{excel_row}"] = row.get("Expected Cost", "NA")
-            ws[f"T{excel_row}"] = row.get("Apply Month", "NA")
-            ws[f"U{excel_row}"] = ws[f"A{excel_row}"].value
+            # Set values for each column (A to U)
+            values = mass_upload_row(row, excel_row)
+            for col, value in enumerate(values, start=1):
+                if value is not None:
+                    ws.cell(row=excel_row, column=col, value=value)
 
             # Highlight rows with NA values
-            highlight_yellow = any(
-                str(ws.cell(row=excel_row, column=col).value).strip().upper().startswith("NA")
-                for col in range(1, 22)
-            )
-            if highlight_yellow:
-                for col in range(1, 22):
+            if has_na_value(values):
+                for col in range(1, len(values) + 1):
                     ws.cell(row=excel_row, column=col).fill = yellow_fill
 
         # Auto-adjust column widths
@@ -108,4 +201,494 @@ def create_mass_upload(combined_df, output_file):
         print(f"✅ Mass Upload file created at: {output_file}")
         
     except Exception as e:
-        print(f"Failed to create Mass Upload file: {e}")
\ No newline at end of file
+        print(f"Failed to create Mass Upload file: {e}")
+
+class _ChunkSpool:
+    """
+    Temporary file holding pickled chunks until the workbook is written.
+    
+    Chunks are read back ordered by the key given to add() (then in arrival
+    order), so the output order does not depend on the order files finished in.
+    Once sealed the file is only read: the spool can then be sent to a writer
+    process (writers.writer_pool), which reads the same file.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(suffix=".spool", dir=directory)
+        self.file = os.fdopen(fd, 'w+b')
+        self.index = []
+
+    def __getstate__(self):
+        # Only a sealed spool is sent to another process; it reopens the file by path
+        return {'path': self.path, 'index': self.index, 'file': None}
+
+    def add(self, chunk, order=None):
+        self.file.seek(0, os.SEEK_END)
+        self.index.append((float('inf') if order is None else order, len(self.index), self.file.tell(), len(chunk)))
+        pickle.dump(chunk, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def discard(self, order):
+        """Drop every chunk added with the given key and return their row count."""
+        dropped = sum(rows for key, _, _, rows in self.index if key == order)
+        self.index = [entry for entry in self.index if entry[0] != order]
+        return dropped
+
+    def seal(self):
+        """Stop writing to the spool (chunks can still be read)."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __iter__(self):
+        self.seal()
+        with open(self.path, 'rb') as f:
+            for _, _, offset, _ in sorted(self.index):
+                f.seek(offset)
+                yield pickle.load(f)
+
+    def close(self):
+        """Remove the spool file."""
+        self.seal()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def _cell_value(value):
+    """Convert a DataFrame value to what openpyxl writes (empty cell for missing values)."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+def _remove_partial(output_file):
+    """Remove what a failed write left of an output, so it cannot be published."""
+    try:
+        os.remove(output_file)
+    except OSError:
+        pass
+
+def _header_cells(ws, columns):
+    """Header row of a write-only sheet in the style of to_excel."""
+    header = []
+    for col in columns:
+        cell = WriteOnlyCell(ws, value=col)
+        cell.font, cell.border, cell.alignment = header_font, header_border, header_alignment
+        header.append(cell)
+    return header
+
+class CombinedWriter:
+    """
+    Write CombinedExtractedColumns.xlsx from chunks of rows.
+    
+    append() only pickles each chunk to a spool file on local disk, so memory does
+    not grow with the inbox; the whole workbook is serialized in close(), in file
+    order, into a write-only workbook with the same header style and NA
+    highlighting as save_with_highlighting. The writer pool (writers.writer_pool)
+    relies on this split: a writer whose spool is sealed is sent to a writer
+    process, which runs close().
+    """
+
+    def __init__(self, output_file, highlight_na=True):
+        self.output_file = output_file
+        self.highlight_na = highlight_na
+        self.columns = []
+        self.rows = 0
+        self.spool = _ChunkSpool(os.path.dirname(os.path.abspath(output_file)))
+        self.sheets = []
+
+    def add_sheet(self, sheet_name, df):
+        """Add a sheet written after the combined rows (e.g. a report on them)."""
+        self.sheets.append((sheet_name, df))
+
+    def append(self, df, order=None):
+        """
+        Add a chunk of combined rows.
+        
+        Args:
+            df: Chunk of enriched and named rows
+            order: Position of the chunk's source file in the output (None for last)
+        """
+        for col in df.columns:
+            if col not in self.columns:
+                self.columns.append(col)
+        self.spool.add(df, order)
+        self.rows += len(df)
+
+    def discard(self, order):
+        """Drop the rows appended with the given order (a file found to be a duplicate)."""
+        self.rows -= self.spool.discard(order)
+
+    def close(self):
+        """
+        Write the workbook and release the spool.
+        
+        Raises:
+            Exception: If the workbook could not be written (nothing is left at output_file)
+        """
+        try:
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet("Sheet1")
+
+            ws.append(_header_cells(ws, self.columns))
+
+            highlighted = 0
+            for chunk in self.spool:
+                chunk = to_output(chunk).reindex(columns=self.columns).astype(object)
+                for values in chunk.itertuples(index=False, name=None):
+                    values = [_cell_value(v) for v in values]
+                    if self.highlight_na and has_na_value(v for v in values if v is not None):
+                        row = []
+                        for value in values:
+                            cell = WriteOnlyCell(ws, value=value)
+                            cell.fill = yellow_fill
+                            row.append(cell)
+                        ws.append(row)
+                        highlighted += 1
+                    else:
+                        ws.append(values)
+
+            for sheet_name, df in self.sheets:
+                ws = wb.create_sheet(sheet_name)
+                ws.append(_header_cells(ws, df.columns))
+                for values in df.astype(object).itertuples(index=False, name=None):
+                    ws.append([_cell_value(v) for v in values])
+
+            wb.save(self.output_file)
+            print(f"File saved to: {self.output_file}")
+            if self.highlight_na:
+                print(f"{highlighted} rows containing 'NA' have been highlighted in yellow.")
+        except Exception as e:
+            print(f"Failed to save file: {e}")
+            _remove_partial(self.output_file)
+            raise
+        finally:
+            self.spool.close()
+
+def csv_sheet_file(output_file, sheet_name):
+    """File holding an added sheet of a CSV output (a CSV file has a single sheet)."""
+    stem, extension = os.path.splitext(output_file)
+    return f"{stem} - {sheet_name}{extension}"
+
+class CombinedCsvWriter(CombinedWriter):
+    """
+    Write the combined rows as CSV (--output-format csv): same columns, order
+    and values as CombinedWriter, without the highlighting, and much faster to
+    write for large runs. Added sheets go to files named by csv_sheet_file.
+    Like CombinedWriter, the chunks are spooled and the files written in close().
+    """
+
+    def close(self):
+        """
+        Write the CSV files and release the spool.
+        
+        Raises:
+            Exception: If a file could not be written (nothing is left at its path)
+        """
+        try:
+            with open(self.output_file, 'w', newline='', encoding='utf-8-sig') as f:
+                pd.DataFrame(columns=self.columns).to_csv(f, index=False)
+                for chunk in self.spool:
+                    to_output(chunk).reindex(columns=self.columns).to_csv(f, index=False, header=False)
+            for sheet_name, df in self.sheets:
+                df.to_csv(csv_sheet_file(self.output_file, sheet_name), index=False, encoding='utf-8-sig')
+            print(f"File saved to: {self.output_file}")
+        except Exception as e:
+            print(f"Failed to save file: {e}")
+            _remove_partial(self.output_file)
+            for sheet_name, _ in self.sheets:
+                _remove_partial(csv_sheet_file(self.output_file, sheet_name))
+            raise
+        finally:
+            self.spool.close()
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+SHEET_DATA_PATTERN = re.compile(rb'(<((?:\w+:)?)sheetData\b[^>]*?)(?:/>|>.*?</\2sheetData>)', re.S)
+FIRST_ROW_PATTERN = re.compile(rb'<(?:\w+:)?row\b[^>]*?\br="1"[^>]*?(?:/>|>.*?</(?:\w+:)?row>)', re.S)
+
+def _active_sheet_part(zf):
+    """Zip member holding the active worksheet of an xlsx file."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels')).iter(f'{PKG_REL_NS}Relationship')
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels}
+    view = workbook.find(f'{MAIN_NS}bookViews/{MAIN_NS}workbookView')
+    sheets = list(workbook.iter(f'{MAIN_NS}sheet'))
+    target = targets[sheets[int(view.get('activeTab', 0)) if view is not None else 0].get(f'{REL_NS}id')]
+    return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+def header_only_copy(template_file, directory=None):
+    """
+    Copy an xlsx template keeping only the first row of its active sheet.
+    
+    The MassUpload template is the previous MassUpload with all of its rows;
+    dropping them from the sheet XML means loading the template does not
+    parse rows that are thrown away. Everything else in the file is copied
+    as it is.
+    
+    Args:
+        template_file: Path to the template
+        directory: Folder of the copy (defaults to the temporary folder)
+        
+    Returns:
+        Path of the copy (the caller removes it)
+    """
+    fd, copy_file = tempfile.mkstemp(suffix=".xlsx", dir=directory)
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(template_file) as source, \
+                zipfile.ZipFile(copy_file, 'w', zipfile.ZIP_DEFLATED) as target:
+            sheet_part = _active_sheet_part(source)
+            for item in source.infolist():
+                data = source.read(item.filename)
+                if item.filename == sheet_part:
+                    header = FIRST_ROW_PATTERN.search(data)
+                    data = SHEET_DATA_PATTERN.sub(
+                        lambda m: m.group(1) + b'>' + (header.group(0) if header else b'') +
+                        b'</' + m.group(2) + b'sheetData>', data, count=1)
+                target.writestr(item, data)
+    except Exception:
+        os.remove(copy_file)
+        raise
+    return copy_file
+
+class MassUploadWriter:
+    """
+    Write MassUpload.xlsx chunk by chunk below the template's header row.
+    
+    Rows are built and spooled as chunks arrive while the column widths are
+    tracked; close() fills them into the template workbook, numbering the rows
+    (and the row references of the month formula) in output order. The
+    template's other sheets, data validations, formats and defined names are
+    kept, as when the previous rows were cleaned and the new ones written into
+    it. Without a template the rows go to a new write-only workbook.
+    """
+
+    def __init__(self, output_file, template_file=None, skip_previously_uploaded=False):
+        """
+        Args:
+            output_file: Path of the workbook to write
+            template_file: MassUpload template whose header row and other
+                contents are kept (defaults to output_file)
+            skip_previously_uploaded: Leave out rows flagged 'Previously Uploaded'
+                by the history store
+        """
+        self.output_file = output_file
+        self.template_file = template_file or output_file
+        self.skip_previously_uploaded = skip_previously_uploaded
+        self.rows = 0
+        self.skipped = 0
+        self.spool = _ChunkSpool(os.path.dirname(os.path.abspath(output_file)))
+        self.widths = {}
+
+    def _track_widths(self, values, skip=()):
+        for col, value in enumerate(values, start=1):
+            if col in skip:
+                continue
+            if value:
+                self.widths[col] = max(self.widths.get(col, 0), len(str(value)))
+            else:
+                self.widths.setdefault(col, 0)
+
+    def _load_template(self):
+        """The template workbook with the rows below its header removed, or None without a template."""
+        if not os.path.exists(self.template_file):
+            return None
+        copy_file = None
+        try:
+            copy_file = header_only_copy(self.template_file, os.path.dirname(os.path.abspath(self.output_file)))
+            wb = openpyxl.load_workbook(copy_file)
+        except Exception as e:
+            print(f"Could not read MassUpload template: {e}")
+            return None
+        finally:
+            if copy_file is not None:
+                os.remove(copy_file)
+        ws = wb.active
+        if ws.max_row > 1:
+            ws.delete_rows(2, ws.max_row)
+        return wb
+
+    def append(self, df, order=None):
+        """
+        Add a chunk of combined rows.
+        
+        Args:
+            df: Chunk of enriched and named rows
+            order: Position of the chunk's source file in the output (None for last)
+        """
+        if self.skip_previously_uploaded and 'Previously Uploaded' in df.columns:
+            uploaded = df['Previously Uploaded'].astype(bool)
+            self.skipped += int(uploaded.sum())
+            df = df[~uploaded]
+        rows = []
+        for record in to_output(df).to_dict("records"):
+            # The formula depends on the final row number and is set in close()
+            values = mass_upload_row(record, 0)
+            self._track_widths(values, skip=(FORMULA_COLUMN,))
+            rows.append((values, has_na_value(values)))
+            self.rows += 1
+        self.spool.add(rows, order)
+
+    def discard(self, order):
+        """
+        Drop the rows appended with the given order (a file found to be a duplicate).
+        Column widths already tracked for them are kept.
+        """
+        self.rows -= self.spool.discard(order)
+
+    def _rows(self):
+        """Spooled rows in output order with their worksheet row and formula set."""
+        excel_row = 1
+        for rows in self.spool:
+            for values, highlight in rows:
+                excel_row += 1
+                values[FORMULA_COLUMN - 1] = mass_upload_formula(excel_row)
+                yield excel_row, values, highlight
+
+    def close(self):
+        """
+        Write the workbook and release the spool.
+        
+        Raises:
+            Exception: If the workbook could not be written (nothing is left at output_file)
+        """
+        try:
+            wb = self._load_template()
+            if wb is not None:
+                ws = wb.active
+                self._track_widths([cell.value for cell in ws[1]] if ws.max_row else [])
+            else:
+                wb = openpyxl.Workbook(write_only=True)
+                ws = wb.create_sheet("Sheet")
+
+            # Auto-adjust column widths (the longest formula is the one on the last row)
+            if self.rows:
+                self._track_widths([None] * (FORMULA_COLUMN - 1) + [mass_upload_formula(self.rows + 1)])
+            for col, max_len in self.widths.items():
+                ws.column_dimensions[get_column_letter(col)].width = max_len + 2
+
+            # Highlight rows with NA values
+            if wb.write_only:
+                ws.append([])
+                for _, values, highlight in self._rows():
+                    if highlight:
+                        row = []
+                        for value in values:
+                            cell = WriteOnlyCell(ws, value=value)
+                            cell.fill = yellow_fill
+                            row.append(cell)
+                        ws.append(row)
+                    else:
+                        ws.append(values)
+            else:
+                highlighted = None  # Style of a highlighted cell, shared by the others
+                for excel_row, values, highlight in self._rows():
+                    for col, value in enumerate(values, start=1):
+                        if highlight:
+                            cell = ws.cell(row=excel_row, column=col, value=value)
+                            if highlighted is None:
+                                cell.fill = yellow_fill
+                                highlighted = cell._style
+                            else:
+                                cell._style = copy.copy(highlighted)
+                        elif value is not None:
+                            ws.cell(row=excel_row, column=col, value=value)
+
+            wb.save(self.output_file)
+            print(f"✅ Mass Upload file created at: {self.output_file}")
+        except Exception as e:
+            print(f"Failed to create Mass Upload file: {e}")
+            _remove_partial(self.output_file)
+            raise
+        finally:
+            self.spool.close()
+
+def publish_output(local_file, output_file):
+    """
+    Copy a locally written output to its final location atomically.
+    
+    The file is copied next to the target under a temporary name and then renamed
+    over it, so readers of the share never see a half-written workbook. The
+    rename is retried with a growing delay while the target is locked (open in
+    Excel on Windows).
+    
+    Args:
+        local_file: Output written in the local scratch directory
+        output_file: Final path (usually on the share)
+        
+    Returns:
+        True if the output was published
+    """
+    from utils.safe_io import replace_file
+    
+    if not os.path.exists(local_file):
+        return False
+    temp_file = f"{output_file}.{socket.gethostname()}-{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        shutil.copyfile(local_file, temp_file)
+        replace_file(temp_file, output_file)
+        return True
+    except OSError as e:
+        print(f"Failed to publish {os.path.basename(output_file)}: {e} (local copy kept at {local_file})")
+        if os.path.exists(temp_file):
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+        return False
+
+def save_shadow_report(timings_df, mismatches_df, output_file):
+    """
+    Save the shadow mode report with stage timings and mismatching cells.
+    
+    Args:
+        timings_df: DataFrame with per-stage legacy/optimized timings
+        mismatches_df: DataFrame with one row per mismatching cell
+        output_file: Output file path
+    """
+    try:
+        with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+            timings_df.to_excel(writer, sheet_name="Stage Timings", index=False)
+            mismatches_df.to_excel(writer, sheet_name="Mismatches", index=False)
+        print(f"Shadow report saved to: {output_file}")
+    except Exception as e:
+        print(f"Failed to save shadow report: {e}")
+
+def save_duplicate_report(duplicates_df, near_duplicates_df, output_file):
+    """
+    Save the duplicate forms report.
+    
+    Args:
+        duplicates_df: DataFrame with one row per form dropped as a duplicate
+        near_duplicates_df: DataFrame with one row per differing row of near-identical forms
+        output_file: Output file path
+    """
+    try:
+        with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+            duplicates_df.to_excel(writer, sheet_name="Duplicates", index=False)
+            near_duplicates_df.to_excel(writer, sheet_name="Near Duplicates", index=False)
+        print(f"Duplicate forms report saved to: {output_file}")
+    except Exception as e:
+        print(f"Failed to save duplicate forms report: {e}")
+
+def save_delta_report(summary_df, removed_df, output_file):
+    """
+    Save the delta report of revised PET forms.
+    
+    Args:
+        summary_df: DataFrame with the new/changed/unchanged/removed line counts per form
+        removed_df: DataFrame with the previous lines no longer in their new version
+        output_file: Output file path
+    """
+    try:
+        with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+            summary_df.to_excel(writer, sheet_name="Delta Summary", index=False)
+            removed_df.to_excel(writer, sheet_name="Removed Lines", index=False)
+        print(f"Delta report saved to: {output_file}")
+    except Exception as e:
+        print(f"Failed to save delta report: {e}")
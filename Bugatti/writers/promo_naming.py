@@ -1,6 +1,6 @@
 # Functions for building and formatting promotion names
 import re
-from config.constants import ABBREVIATIONS, REMOVE_WORDS, HS_CODES
+from config.rules import get_rules
 from etl.validation import safe_get
 
 def format_title_case(text):
@@ -13,16 +13,17 @@ def format_title_case(text):
     Returns:
         Text in title case with abbreviations preserved
     """
+    rules = get_rules()
     words = re.split(r'(\s+)', text)
     formatted_words = []
     
     for word in words:
         clean_word = word.strip().upper()
         
-        if clean_word in REMOVE_WORDS:
+        if clean_word in rules['remove_words']:
             continue
             
-        if clean_word in ABBREVIATIONS:
+        if clean_word in rules['abbreviations']:
             formatted_words.append(word.upper())
         else:
             formatted_words.append(word.capitalize())
@@ -51,10 +52,11 @@ def build_name_of_promotion(row):
     support_type = safe_get(row, "Type of Support")
 
     # Clean promo name by removing unwanted words
-    promo_clean = " ".join(word for word in str(promo).split() if word.upper() not in REMOVE_WORDS)
+    rules = get_rules()
+    promo_clean = " ".join(word for word in str(promo).split() if word.upper() not in rules['remove_words'])
 
     # Format differently based on budget allocation
-    if budget_alloc in HS_CODES:
+    if budget_alloc in rules['hs_codes']:
         if "PRM" not in str(promo).upper():
             full_promo = f"HS - PET - {budget_alloc} - {promo_clean} - {support_type} - {customer} - {start} TO {end}"
         else:
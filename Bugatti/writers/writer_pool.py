@@ -0,0 +1,59 @@
+# Writer processes: the outputs of a member are written concurrently with each other
+# and with the processing of the next member
+#
+# Serializing an xlsx file is CPU-bound and single-threaded, so closing the writers
+# one after the other in the main process leaves a long tail at the end of every
+# member. Once a member's rows are collected its writers are sealed: their spools
+# (the pickled chunks or MassUpload rows on local disk) are no longer written to,
+# and each writer is sent to its own process, which reads the spool file and
+# writes the workbook. Meanwhile the main process goes on with the next member.
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+def _close_writer(writer):
+    """
+    Write one output in a writer process.
+
+    Returns:
+        Seconds spent writing
+
+    Raises:
+        Exception: If the output could not be written (the error of the writer
+            is raised again from the future's result())
+    """
+    start = time.perf_counter()
+    writer.close()
+    if not os.path.exists(writer.output_file):
+        raise OSError(f"{os.path.basename(writer.output_file)} was not written")
+    return time.perf_counter() - start
+
+class WriterPool:
+    """Processes closing the writers of sealed members (started on first use)."""
+
+    def __init__(self, processes=2):
+        self.processes = processes
+        self.executor = None
+
+    def submit(self, writer):
+        """
+        Start writing one output.
+
+        Args:
+            writer: CombinedWriter, CombinedCsvWriter or MassUploadWriter with all rows appended
+
+        Returns:
+            Future giving the seconds spent writing, or raising the error of a failed write
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        writer.spool.seal()
+        return self.executor.submit(_close_writer, writer)
+
+    def close(self):
+        """Stop the writer processes (outputs being written are finished first)."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None